@@ -7,10 +7,11 @@ echo.
 echo Este terminal deve ficar aberto para que a automacao funcione.
 echo Você pode minimizar esta janela.
 echo.
-echo Iniciando scheduler_service.py...
+echo Iniciando worker_analise.py e scheduler_service.py...
 echo.
 
 cd /d "%~dp0"
+start "Worker de Analise" python worker_analise.py
 python scheduler_service.py
 
 pause
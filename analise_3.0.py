@@ -1,27 +1,31 @@
 import streamlit as st
 import pandas as pd
-import io
+import numpy as np
 import re
-import json
 from difflib import SequenceMatcher
 from datetime import datetime, timedelta
-from pathlib import Path
-import altair as alt
-import plotly.express as px
-import plotly.graph_objects as go
-import pickle
 import os
 import analise_core  # Biblioteca de lógica central
-import schedule
 import time
-import threading
-import auto_analise
+import worker_analise
 import auth_manager
+import resultado_store
+import cubo_resultado
+import exportacao
+import filtros_resultado
+import graficos_cache
+import paginacao
+import historico_store
+import metricas_analise
 import base64
 
 # --- Agendador em Background (Cron Job Simulado) ---
+# Iniciado no carregamento do app, antes do login (servidor sem ninguém logado também
+# agenda). schedule/threading são importados aqui dentro e o fluxo de automação só
+# quando o job roda (worker_analise só importa o execucao_unica se rodar aqui).
 def run_pending_jobs():
     """Função rodada pela thread em background."""
+    import schedule
     print("🕒 Iniciando loop do agendador em background...")
     while True:
         schedule.run_pending()
@@ -34,7 +38,7 @@ def job_atualizacao():
         # Usa um container vazio pois não estamos no contexto da UI principal aqui
         # Apenas roda o fluxo backend
         sys.stdout = sys.__stdout__ # Garante log no console do servidor
-        auto_analise.executar_fluxo_diario(baixar_email=True)
+        worker_analise.executar_fluxo(baixar_email=True, incremental=worker_analise.INCREMENTAL)
         print("✅ [Auto-Update] Concluído com sucesso.")
     except Exception as e:
         print(f"❌ [Auto-Update] Erro: {e}")
@@ -42,6 +46,8 @@ def job_atualizacao():
 @st.cache_resource
 def start_background_scheduler():
     """Inicia o agendador apenas uma vez (Singleton)."""
+    import schedule
+    import threading
     # Agenda para rodar diariamente às 07:00
     schedule.every().day.at("07:00").do(job_atualizacao)
     # Também roda uma vez logo no início para garantir (opcional, já temos o run-on-load)
@@ -288,64 +294,13 @@ st.markdown("""
 # (Funções movidas para biblioteca externa para permitir automação)
 
 
-def gerar_excel_bytes(df_in):
-    # Cria cópia para não alterar o original da sessão
-    df = df_in.copy()
-    
-    # Remove coluna auxiliar de data objeto se existir
-    if 'Data_Obj' in df.columns:
-        df = df.drop(columns=['Data_Obj'])
-        
-    # Remove timezones de colunas datetime (Excel não suporta)
-    for col in df.columns:
-        if pd.api.types.is_datetime64_any_dtype(df[col]):
-            try:
-                df[col] = df[col].dt.tz_localize(None)
-            except:
-                pass
-        
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name="Análise Completa")
-        df[df['Status'].str.contains('Não Conforme', na=False)].to_excel(writer, index=False, sheet_name="Não Conformes")
-        df[df['Status'].str.contains('Conforme', na=False) & ~df['Status'].str.contains('Não', na=False)].to_excel(writer, index=False, sheet_name="Conformes")
-    return output.getvalue()
-
 # --- Funções de Histórico ---
-
-def get_history_dir():
-    """Retorna o diretório de histórico, criando se não existir."""
-    history_dir = Path("historico_analises")
-    history_dir.mkdir(exist_ok=True)
-    return history_dir
+# Backend em historico_store: Parquet por análise + catálogo SQLite
 
 def save_analysis_to_history(df_resultado, stats, file_saida_name, file_entrada_name):
     """Salva uma análise no histórico."""
     try:
-        history_dir = get_history_dir()
-        timestamp = datetime.now()
-        analysis_id = timestamp.strftime("%Y%m%d_%H%M%S")
-        
-        # Salva o DataFrame como CSV (mais leve que Excel)
-        csv_path = history_dir / f"{analysis_id}_dados.csv"
-        df_resultado.to_csv(csv_path, index=False, encoding='utf-8-sig')
-        
-        # Salva metadados
-        metadata = {
-            'id': analysis_id,
-            'timestamp': timestamp.isoformat(),
-            'data_formatada': timestamp.strftime("%d/%m/%Y %H:%M:%S"),
-            'arquivo_saida': file_saida_name,
-            'arquivo_entrada': file_entrada_name,
-            'total_itens': len(df_resultado),
-            'stats': stats
-        }
-        
-        metadata_path = history_dir / f"{analysis_id}_metadata.json"
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
-        
-        return analysis_id
+        return historico_store.salvar_analise(df_resultado, stats, file_saida_name, file_entrada_name)
     except Exception as e:
         st.error(f"Erro ao salvar histórico: {e}")
         return None
@@ -353,60 +308,15 @@ def save_analysis_to_history(df_resultado, stats, file_saida_name, file_entrada_
 def load_history_list():
     """Carrega lista de análises do histórico."""
     try:
-        history_dir = get_history_dir()
-        metadata_files = sorted(history_dir.glob("*_metadata.json"), reverse=True)
-        
-        history_list = []
-        for metadata_file in metadata_files:
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-                history_list.append(metadata)
-        
-        return history_list
+        return historico_store.listar_analises()
     except Exception as e:
         st.error(f"Erro ao carregar histórico: {e}")
         return []
 
 def load_analysis_from_history(analysis_id):
-    """Carrega uma análise específica do histórico."""
+    """Carrega uma análise específica do histórico (colunas já tipadas)."""
     try:
-        history_dir = get_history_dir()
-        csv_path = history_dir / f"{analysis_id}_dados.csv"
-        metadata_path = history_dir / f"{analysis_id}_metadata.json"
-        
-        if csv_path.exists() and metadata_path.exists():
-            df = pd.read_csv(csv_path, encoding='utf-8-sig')
-            
-            # Garante que Data_Obj exista (para filtros) e Data esteja formatada
-            if 'Data' in df.columns:
-                # Converte para datetime primeiro para garantir normalização
-                dt_series = pd.to_datetime(df['Data'], errors='coerce')
-                
-                # Se Data_Obj não existir (histórico antigo), cria
-                if 'Data_Obj' not in df.columns:
-                    df['Data_Obj'] = dt_series
-                else:
-                    df['Data_Obj'] = pd.to_datetime(df['Data_Obj'], errors='coerce')
-                
-                # Formata Data para string YYYY-MM-DD HH:MM:SS
-                def _format_dt_str(x):
-                    if pd.isna(x): return ""
-                    try:
-                        return x.strftime('%Y-%m-%d %H:%M:%S')
-                    except:
-                        return str(x)
-                        
-                df['Data'] = dt_series.apply(_format_dt_str)
-
-            if 'Data Entrada' in df.columns:
-                 df['Data Entrada'] = pd.to_datetime(df['Data Entrada'], errors='coerce').apply(lambda x: x.strftime('%Y-%m-%d %H:%M:%S') if pd.notna(x) else x)
-            
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            
-            return df, metadata
-        else:
-            return None, None
+        return historico_store.carregar_analise(analysis_id)
     except Exception as e:
         st.error(f"Erro ao carregar análise: {e}")
         return None, None
@@ -414,15 +324,7 @@ def load_analysis_from_history(analysis_id):
 def delete_analysis_from_history(analysis_id):
     """Remove uma análise do histórico."""
     try:
-        history_dir = get_history_dir()
-        csv_path = history_dir / f"{analysis_id}_dados.csv"
-        metadata_path = history_dir / f"{analysis_id}_metadata.json"
-        
-        if csv_path.exists():
-            csv_path.unlink()
-        if metadata_path.exists():
-            metadata_path.unlink()
-        
+        historico_store.remover_analise(analysis_id)
         return True
     except Exception as e:
         st.error(f"Erro ao deletar análise: {e}")
@@ -440,6 +342,48 @@ if 'df_resultado' not in st.session_state:
 if 'current_metadata' not in st.session_state:
     st.session_state.current_metadata = None
 
+# --- Cache Compartilhado do Resultado Diário ---
+# Um único DataFrame (somente leitura) por processo, em vez de uma cópia por sessão.
+# A chave inclui o mtime do arquivo: quando o robô regrava o resultado, a próxima
+# leitura carrega a versão nova e a antiga sai do cache.
+
+def chave_resultado_diario():
+    """(caminho, mtime) do resultado diário, ou None se o arquivo não existir."""
+    try:
+        return (resultado_store.RESULT_FILE, os.path.getmtime(resultado_store.RESULT_FILE))
+    except OSError:
+        return None
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def carregar_resultado_compartilhado(caminho, mtime):
+    """Carrega o resultado uma vez por versão do arquivo e pré-calcula as posições por unidade de destino."""
+    df = analise_core.adicionar_codigos_status(resultado_store.carregar_resultado(caminho=caminho))
+    posicoes_unidade = {u: np.asarray(p) for u, p in df.groupby('Unidade Destino', sort=False, observed=True).indices.items()}
+    return {'df': df, 'posicoes_unidade': posicoes_unidade}
+
+@st.cache_resource(max_entries=256, show_spinner=False)
+def fatia_unidade(caminho, mtime, unidade):
+    """Recorte da unidade (RLS), compartilhado entre todos os usuários da mesma unidade."""
+    compartilhado = carregar_resultado_compartilhado(caminho, mtime)
+    posicoes = compartilhado['posicoes_unidade'].get(unidade, np.array([], dtype=np.intp))
+    return compartilhado['df'].take(posicoes)
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def carregar_cubo_compartilhado(caminho, mtime):
+    """Cubo diário gravado com o resultado (ou montado na hora, se o resultado for anterior ao cubo)."""
+    cubo = resultado_store.carregar_cubo(caminho)
+    if cubo is None:
+        cubo = cubo_resultado.construir_cubo(carregar_resultado_compartilhado(caminho, mtime)['df'])
+    return cubo
+
+if 'resultado_chave' not in st.session_state:
+    st.session_state.resultado_chave = None
+
+# Arquivo regravado (agendador ou outra sessão): solta a referência antiga e recarrega
+if st.session_state.resultado_chave is not None and chave_resultado_diario() != st.session_state.resultado_chave:
+    st.session_state.df_resultado = None
+    st.session_state.resultado_chave = None
+
 # --- Carregamento Automático da Análise Diária ---
 import sys
 from io import StringIO
@@ -481,26 +425,39 @@ class ToastNotifier:
     def flush(self):
         self.original_stdout.flush()
 
+aviso_execucao = st.empty()
+
+def barra_progresso_fluxo():
+    """Barra de progresso da análise rodada por esta sessão (callback p/ worker_analise.executar_fluxo)."""
+    barra = st.progress(0.0, text="Iniciando...")
+    return lambda p, msg: barra.progress(min(max(p, 0.0), 1.0), text=msg)
+
+def mostrar_execucao_em_curso(status):
+    """Mostra o progresso de uma atualização iniciada por outra sessão (ou pelo agendador)."""
+    progresso = status.get('progresso') or 0.0
+    aviso_execucao.info(f"⏳ Atualização em andamento em outra sessão ({progresso*100:.0f}%): {status.get('mensagem', '')}")
+
 if st.session_state.df_resultado is None:
     try:
-        daily_pkl = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "resultado_diario.pkl")
-        if os.path.exists(daily_pkl):
+        # Só o JSON de metadados é lido para decidir se os dados são de hoje
+        meta_auto = resultado_store.carregar_metadata()
+        chave = chave_resultado_diario()
+        if meta_auto is not None and chave is not None:
             try:
-                with open(daily_pkl, "rb") as f:
-                    dados_auto = pickle.load(f)
-                
                 # Verifica data do arquivo
-                data_proc = dados_auto['metadata']['data_processamento']
+                data_proc = meta_auto['data_processamento']
                 is_today = data_proc.date() == datetime.now().date()
                 
                 if not is_today:
                      raise Exception("Dados desatualizados (não são de hoje)")
                      
-                st.session_state.df_resultado = dados_auto['df']
+                st.session_state.df_resultado = carregar_resultado_compartilhado(*chave)['df']
+                st.session_state.resultado_chave = chave
                 st.session_state.current_metadata = {
-                    'arquivo_saida': dados_auto['metadata']['arquivo_saida'],
-                    'arquivo_entrada': dados_auto['metadata']['arquivo_entrada'],
+                    'arquivo_saida': meta_auto['arquivo_saida'],
+                    'arquivo_entrada': meta_auto['arquivo_entrada'],
                     'data_formatada': data_proc.strftime("%d/%m/%Y %H:%M:%S"),
+                    'data_analise': data_proc.date(),
                     'modo': 'Automático 🤖'
                 }
             except Exception:
@@ -515,22 +472,26 @@ if st.session_state.df_resultado is None:
         # log_container = st.empty() # Não precisa mais disso
         
         try:
-            import auto_analise
             with ToastNotifier():
                 with st.spinner("Executando robô de análise..."):
-                    sucesso = auto_analise.executar_fluxo_diario(baixar_email=True)
+                    sucesso, _ = worker_analise.executar_fluxo(
+                        baixar_email=True, incremental=worker_analise.INCREMENTAL,
+                        ao_aguardar=mostrar_execucao_em_curso,
+                        progress_callback=barra_progresso_fluxo()
+                    )
             
             if sucesso:
                 # Tenta carregar novamente
-                if os.path.exists(daily_pkl):
-                    with open(daily_pkl, "rb") as f:
-                        dados_auto = pickle.load(f)
-                    
-                    st.session_state.df_resultado = dados_auto['df']
+                meta_auto = resultado_store.carregar_metadata()
+                chave = chave_resultado_diario()
+                if meta_auto is not None and chave is not None:
+                    st.session_state.df_resultado = carregar_resultado_compartilhado(*chave)['df']
+                    st.session_state.resultado_chave = chave
                     st.session_state.current_metadata = {
-                        'arquivo_saida': dados_auto['metadata']['arquivo_saida'],
-                        'arquivo_entrada': dados_auto['metadata']['arquivo_entrada'],
-                        'data_formatada': dados_auto['metadata']['data_processamento'].strftime("%d/%m/%Y %H:%M:%S"),
+                        'arquivo_saida': meta_auto['arquivo_saida'],
+                        'arquivo_entrada': meta_auto['arquivo_entrada'],
+                        'data_formatada': meta_auto['data_processamento'].strftime("%d/%m/%Y %H:%M:%S"),
+                        'data_analise': meta_auto['data_processamento'].date(),
                         'modo': 'Automático (Sob Demanda) 🤖'
                     }
                     st.rerun() # Recarrega a página com os dados novos
@@ -551,7 +512,11 @@ with col_opts:
             # Intercepta prints e transforma em Toasts
             with ToastNotifier():
                 with st.spinner("Processando atualização..."):
-                    sucesso = auto_analise.executar_fluxo_diario(baixar_email=True)
+                    sucesso, _ = worker_analise.executar_fluxo(
+                        baixar_email=True, incremental=worker_analise.INCREMENTAL,
+                        ao_aguardar=mostrar_execucao_em_curso,
+                        progress_callback=barra_progresso_fluxo()
+                    )
             
             if sucesso:
                 st.toast("Atualização Concluída com Sucesso!")
@@ -587,23 +552,228 @@ if st.session_state.df_resultado is None:
 
 
 # --- Dashboard ---
-if st.session_state.df_resultado is not None:
+# O painel roda como fragmento (st.fragment): mudar um filtro reexecuta só o painel,
+# sem repetir login, sidebar, CSS e carregamento do resultado; busca e paginação da
+# tabela reexecutam só a tabela. Posições filtradas e cubo filtrado ficam em cache
+# por versão do resultado + unidade do usuário + filtros.
+
+def coluna_data_ref(df):
+    """Usa Data_Obj se existir (pois 'Data' virou string)."""
+    return df['Data_Obj'] if 'Data_Obj' in df.columns else (pd.to_datetime(df['Data'], errors='coerce') if 'Data' in df.columns else None)
+
+def indice_datas(col_data_ref):
+    return filtros_resultado.indice_datas(col_data_ref) if col_data_ref is not None else None
+
+def filtrar_cubo(cubo, unidade, status_filter, unidade_filter, date_range):
+    return cubo_resultado.filtrar(
+        cubo, status=list(status_filter), unidades=list(unidade_filter),
+        data_inicio=date_range[0] if len(date_range) == 2 else None,
+        data_fim=date_range[1] if len(date_range) == 2 else None,
+        unidade_destino=unidade
+    )
+
+def _df_compartilhado(chave, unidade):
+    return fatia_unidade(*chave, unidade) if unidade else carregar_resultado_compartilhado(*chave)['df']
+
+@st.cache_resource(max_entries=256, show_spinner=False)
+def indice_datas_compartilhado(chave, unidade):
+    """Índice ordenado das datas (filtro de período), um por versão do resultado e unidade."""
+    return indice_datas(coluna_data_ref(_df_compartilhado(chave, unidade)))
+
+@st.cache_resource(max_entries=256, show_spinner=False)
+def dimensoes_compartilhadas(chave, unidade):
+    """Tabelas de dimensão gravadas com o resultado (montadas do cubo se o resultado for anterior a elas)."""
+    dimensoes = resultado_store.carregar_dimensoes(unidade)
+    if dimensoes is None:
+        cubo = carregar_cubo_compartilhado(*chave)
+        dimensoes = cubo_resultado.dimensoes(cubo[cubo['Unidade Destino'] == unidade] if unidade else cubo)
+    return dimensoes
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def posicoes_filtradas(chave, unidade, status_filter, unidade_filter, date_range):
+    """Filtros sobre o resultado compartilhado (ou o recorte da unidade)."""
+    return filtros_resultado.filtrar_posicoes(
+        _df_compartilhado(chave, unidade), indice_datas_compartilhado(chave, unidade),
+        status_filter, unidade_filter, date_range
+    )
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cubo_filtrado_compartilhado(chave, unidade, status_filter, unidade_filter, date_range):
+    return filtrar_cubo(carregar_cubo_compartilhado(*chave), unidade, status_filter, unidade_filter, date_range)
+
+def formatar_horas_hms(h):
+    """Horas decimais -> HH:MM:SS (só para exibição)."""
+    if pd.isna(h): return "-"
+    try:
+        total_seconds = int(h * 3600)
+        sign = "-" if total_seconds < 0 else ""
+        total_seconds = abs(total_seconds)
+        hours, remainder = divmod(total_seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        return f"{sign}{hours:02d}:{minutes:02d}:{seconds:02d}"
+    except:
+        return h
+
+# --- Figuras do Dashboard ---
+# Montadas via graficos_cache: rerun com os mesmos agregados e cores reaproveita o JSON da figura.
+# O Plotly é importado só aqui, quando há gráfico para montar.
+
+def figura_status(status_counts, chart_text_color, chart_grid_color):
+    import plotly.graph_objects as go
+    # Remove emojis das labels e define cores
+    clean_labels = [label.replace('✅ ', '').replace('❌ ', '').replace('⚠️ ', '') for label in status_counts.index]
+
+    # Mapeamento de cores fixo
+    color_map = {
+        'Conforme': '#00C853',      # Verde
+        'Não Conforme': '#FF4444',  # Vermelho
+        'Não Recebido': '#FF9800'   # Laranja
+    }
+
+    # Gera lista de cores na ordem dos dados
+    chart_colors = [color_map.get(label, '#999999') for label in clean_labels]
+
+    # Gráfico de rosca com Plotly - texto otimizado
+    fig_status = go.Figure(data=[go.Pie(
+        labels=clean_labels,
+        values=status_counts.values,
+        hole=0.6,
+        marker=dict(
+            colors=chart_colors,
+            line=dict(color='white', width=3)
+        ),
+        textposition='outside',
+        textinfo='percent', # Apenas percentual no gráfico
+        textfont=dict(size=12, family="Arial", color=chart_text_color),
+        insidetextorientation='radial',
+        pull=[0.05] * len(status_counts),  # Separa levemente todas as fatias
+        hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
+    )])
+
+    fig_status.update_layout(
+        showlegend=True,  # Exibe legenda com ícones (bolinhas/quadrados)
+        legend=dict(
+            orientation="v",
+            yanchor="bottom",
+            y=0,
+            xanchor="right",
+            x=1,
+            font=dict(size=11, color=chart_text_color),
+            bgcolor="rgba(0,0,0,0)" # Fundo transparente
+        ),
+        height=380,
+        margin=dict(t=20, b=20, l=40, r=40), # Margens maiores para não cortar texto
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Arial", size=12, color=chart_text_color)
+    )
+    return fig_status
+
+@st.fragment
+def tabela_detalhada(df_filtered, chave_download):
+    """Tabela paginada + downloads; busca e paginação reexecutam só este fragmento."""
+    tempos = metricas_analise.TemposRender("tabela")
+    st.subheader("Detalhamento dos Dados")
+    
+    # Só a página visível vai para o navegador (busca/ordenação no servidor, ver paginacao)
+    colunas_ordem = [c for c in df_filtered.columns if c != 'Data_Obj' and c not in analise_core.COLUNAS_CODIGOS]
+    col_busca, col_ordem, col_sentido, col_tamanho = st.columns([3, 2, 1, 1])
+    with col_busca:
+        busca_detalhe = st.text_input("🔎 Buscar na tabela", key="busca_detalhe", placeholder="Documento, produto, unidade...")
+    with col_ordem:
+        ordem_detalhe = st.selectbox("Ordenar por", colunas_ordem, key="ordem_detalhe")
+    with col_sentido:
+        crescente_detalhe = st.radio("Ordem", ["Crescente", "Decrescente"], key="sentido_detalhe") == "Crescente"
+    with col_tamanho:
+        tamanho_detalhe = st.selectbox("Linhas por página", paginacao.TAMANHOS_PAGINA, index=1, key="tamanho_detalhe")
+    
+    df_pagina, total_detalhe, paginas_detalhe = paginacao.pagina(
+        df_filtered, st.session_state.get('pagina_detalhe', 1), tamanho_detalhe,
+        busca_detalhe, ordem_detalhe, crescente_detalhe
+    )
+    # Filtro/busca novos podem encolher o total: a página volta para dentro do limite antes do widget
+    if st.session_state.get('pagina_detalhe', 1) > paginas_detalhe:
+        st.session_state.pagina_detalhe = paginas_detalhe
+    if 'Tempo Recebimento (Horas)' in df_pagina.columns:
+        # Formata visualmente para HH:MM:SS
+        df_pagina = df_pagina.assign(**{'Tempo Recebimento (Horas)': df_pagina['Tempo Recebimento (Horas)'].apply(formatar_horas_hms)})
+    
+    st.dataframe(
+        df_pagina,
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.TextColumn("Data"),
+            "Valor Saída (R$)": st.column_config.NumberColumn("Valor Saída", format="R$ %.2f"),
+            "Valor Entrada (R$)": st.column_config.NumberColumn("Valor Entrada", format="R$ %.2f"),
+            "Diferença (R$)": st.column_config.NumberColumn("Diferença", format="R$ %.2f"),
+            "Status": st.column_config.TextColumn("Status"),
+            "Código Status": None,  # códigos internos ficam ocultos
+            "Flags Divergência": None,
+        },
+        hide_index=True
+    )
+    col_pagina, col_info = st.columns([1, 3])
+    with col_pagina:
+        st.number_input("Página", min_value=1, max_value=paginas_detalhe, step=1, key="pagina_detalhe")
+    with col_info:
+        inicio_pagina = (st.session_state.pagina_detalhe - 1) * tamanho_detalhe
+        st.caption(
+            f"Linhas {min(inicio_pagina + 1, total_detalhe)}–{inicio_pagina + len(df_pagina)} de {total_detalhe} "
+            f"(página {st.session_state.pagina_detalhe} de {paginas_detalhe}). "
+            "Os downloads abaixo trazem todas as linhas filtradas."
+        )
+    
+    tempos.marcar("página")
+    
+    data_analise = (st.session_state.current_metadata or {}).get('data_analise')
+    col_xlsx, col_parquet, col_arrow, col_csv = st.columns(4)
+    with col_xlsx:
+        st.download_button(
+            label="Baixar Dados Filtrados (Excel)",
+            data=exportacao.download(df_filtered, chave_download),
+            file_name="analise_dashboard.xlsx",
+            mime=exportacao.MIMES['xlsx'],
+            type="primary"
+        )
+    # Formatos colunares para BI / sistemas externos (esquema tipado fixo, ver exportacao.ESQUEMA)
+    for coluna, formato, rotulo in ((col_parquet, 'parquet', "Parquet"), (col_arrow, 'arrow', "Arrow IPC"), (col_csv, 'csv.gz', "CSV (gzip)")):
+        with coluna:
+            st.download_button(
+                label=f"Baixar {rotulo}",
+                data=exportacao.download(df_filtered, chave_download, formato, data_analise),
+                file_name=f"analise_dashboard{exportacao.FORMATOS[formato]}",
+                mime=exportacao.MIMES[formato],
+                key=f"download_{formato}"
+            )
+    tempos.marcar("downloads")
+    tempos.fim()
+
+@st.fragment
+def painel_dashboard():
+    import altair as alt  # só o dashboard usa (a tela de login abre sem carregá-lo)
+    tempos = metricas_analise.TemposRender("dashboard")
     df = st.session_state.df_resultado
+    unidade_rls = st.session_state.user_unit if st.session_state.user_role == 'unidade' else None
     # Aplica Row-Level Security (RLS) para Unidades
-    if st.session_state.user_role == 'unidade' and st.session_state.user_unit:
-        df = df[df['Unidade Destino'] == st.session_state.user_unit]
-        st.warning(f"🔒 Visualizando apenas dados de: **{st.session_state.user_unit}**")
+    if unidade_rls:
+        if st.session_state.resultado_chave is not None:
+            df = fatia_unidade(*st.session_state.resultado_chave, unidade_rls)
+        else:
+            df = df[df['Unidade Destino'] == unidade_rls]
+        st.warning(f"🔒 Visualizando apenas dados de: **{unidade_rls}**")
+
+    # Opções dos filtros e período vêm das tabelas de dimensão (não das linhas)
+    if st.session_state.resultado_chave is not None:
+        dimensoes = dimensoes_compartilhadas(st.session_state.resultado_chave, unidade_rls)
+    else:
+        cubo_sessao = cubo_resultado.construir_cubo(df)
+        dimensoes = cubo_resultado.dimensoes(cubo_sessao)
 
-    # Mostra informações da análise atual
-    # Mostra informações da análise atual
     # Mostra informações do período apurado
-    # Usa Data_Obj se existir (pois 'Data' virou string)
-    col_data_ref = df['Data_Obj'] if 'Data_Obj' in df.columns else (pd.to_datetime(df['Data'], errors='coerce') if 'Data' in df.columns else None)
-    
-    min_date_apurado = col_data_ref.min() if col_data_ref is not None else None
-    max_date_apurado = col_data_ref.max() if col_data_ref is not None else None
+    min_date_apurado = dimensoes['data_min']
+    max_date_apurado = dimensoes['data_max']
     
-    if pd.notna(min_date_apurado) and pd.notna(max_date_apurado):
+    if min_date_apurado is not None and max_date_apurado is not None:
         periodo_str = f"{min_date_apurado.strftime('%d/%m/%Y')} até {max_date_apurado.strftime('%d/%m/%Y')}"
     else:
         periodo_str = "-"
@@ -615,94 +785,34 @@ if st.session_state.df_resultado is not None:
         c_filt1, c_filt2, c_filt3 = st.columns(3)
         with c_filt1:
             # Filtro de Status
-            status_options = df['Status'].unique()
+            status_options = dimensoes['status']
             status_filter = st.multiselect("Status", status_options, default=status_options)
         
         with c_filt2:
             # Filtro de Unidade
-            unidades = sorted(list(set(df['Unidade Origem'].unique()) | set(df['Unidade Destino'].unique())))
+            unidades = dimensoes['unidades']
             unidade_filter = st.multiselect("Unidade (Origem/Destino)", unidades)
             
         with c_filt3:
             # Filtro de Data
-            if col_data_ref is not None:
-                min_date = col_data_ref.min()
-                max_date = col_data_ref.max()
-                date_range = st.date_input("Período", [min_date, max_date])
+            if min_date_apurado is not None:
+                date_range = st.date_input("Período", [min_date_apurado, max_date_apurado])
             else:
                 date_range = []
     
-    # Aplica Filtros
-    df_filtered = df[df['Status'].isin(status_filter)]
-    
-    if unidade_filter:
-        df_filtered = df_filtered[
-            df_filtered['Unidade Origem'].isin(unidade_filter) | 
-            df_filtered['Unidade Destino'].isin(unidade_filter)
-        ]
-        
-    if len(date_range) == 2 and col_data_ref is not None:
-        # Recupera índices que estão no range
-        mask_data = (col_data_ref.dt.date >= date_range[0]) & (col_data_ref.dt.date <= date_range[1])
-        df_filtered = df_filtered[mask_data]
-    
-    # --- Custom CSS & Helper for KPIs (Shared) ---
-    st.markdown("""
-    <style>
-    .kpi-card {
-        background-color: white;
-        border-radius: 8px;
-        padding: 15px;
-        box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-        border-left: 5px solid #4A90E2;
-        margin-bottom: 15px;
-        min-height: 110px;
-        display: flex;
-        flex-direction: column;
-        justify-content: center;
-        transition: transform 0.2s;
-    }
-    .kpi-card:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-    }
-    .kpi-title {
-        color: #666;
-        font-size: 0.9em;
-        font-weight: 600;
-        margin-bottom: 5px;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-        white-space: normal;
-        line-height: 1.2;
-    }
-    .kpi-value {
-        color: #2C3E50;
-        font-size: 1.5em;
-        font-weight: 700;
-        margin-bottom: 5px;
-    }
-    .kpi-subtitle {
-        color: #888;
-        font-size: 0.8em;
-        line-height: 1.2;
-    }
-    .kpi-trend {
-        font-weight: 600;
-        padding: 1px 4px;
-        border-radius: 3px;
-        font-size: 0.85em;
-    }
-    .trend-up { color: #27ae60; background-color: #e8f8f0; }
-    .trend-down { color: #e74c3c; background-color: #fdedec; }
-    
-    .b-blue { border-left-color: #3498db; }
-    .b-green { border-left-color: #2ecc71; }
-    .b-red { border-left-color: #e74c3c; }
-    .b-orange { border-left-color: #f39c12; }
-    .b-purple { border-left-color: #9b59b6; }
-    </style>
-    """, unsafe_allow_html=True)
+    # Aplica Filtros (a sessão guarda só as posições filtradas; o DataFrame base é compartilhado)
+    # KPIs e gráficos saem do cubo diário (mesmos filtros); df_filtered só alimenta tabela e exportação
+    filtros = (tuple(status_filter), tuple(unidade_filter), tuple(date_range))
+    if st.session_state.resultado_chave is not None:
+        posicoes = posicoes_filtradas(st.session_state.resultado_chave, unidade_rls, *filtros)
+        cubo_filtrado = cubo_filtrado_compartilhado(st.session_state.resultado_chave, unidade_rls, *filtros)
+    else:
+        posicoes = filtros_resultado.filtrar_posicoes(df, indice_datas(coluna_data_ref(df)), *filtros)
+        cubo_filtrado = filtrar_cubo(cubo_sessao, unidade_rls, *filtros)
+    st.session_state.posicoes_filtradas = posicoes
+    df_filtered = df.take(posicoes)
+    indicadores = cubo_resultado.indicadores(cubo_filtrado)
+    tempos.marcar("filtros")
     
     def kpi_card(title, value, subtitle=None, icon=None, color="b-blue", help_text=None):
         icon_html = f'<span style="margin-right:4px; font-size:1.1em">{icon}</span>' if icon else ''
@@ -725,10 +835,10 @@ if st.session_state.df_resultado is not None:
     # --- Balanço Financeiro do Período ---
     st.markdown("### Balanço Financeiro do Período")
     
-    total_saida_periodo = df_filtered['Valor Saída (R$)'].sum()
-    total_entrada_periodo = df_filtered[df_filtered['Valor Saída (R$)'].notna()]['Valor Entrada (R$)'].sum()
-    valor_pendente = df_filtered[df_filtered['Status'].str.contains('Não Recebido')]['Valor Saída (R$)'].sum()
-    valor_divergente_nc = df_filtered[df_filtered['Status'].str.contains('Não Conforme')]['Diferença (R$)'].abs().sum()
+    total_saida_periodo = indicadores['valor_saida']
+    total_entrada_periodo = indicadores['valor_entrada_com_saida']
+    valor_pendente = indicadores['valor_pendente']
+    valor_divergente_nc = indicadores['valor_divergente']
     
     col_balanco1, col_balanco2, col_balanco3, col_balanco4 = st.columns(4)
     
@@ -745,6 +855,7 @@ if st.session_state.df_resultado is not None:
     with col_balanco4:
         p_div = fmt_perc(valor_divergente_nc, total_entrada_periodo)
         st.markdown(kpi_card("Divergência Itens Recebidos", fmt_moeda(valor_divergente_nc), f"<span class='kpi-trend trend-down'>⚠️ {p_div:.1f}% da entrada</span>", "≠", "b-red", help_text="Soma absoluta das diferenças dos itens recebidos com divergência"), unsafe_allow_html=True)
+    tempos.marcar("balanço")
     
     st.divider()
 
@@ -753,47 +864,23 @@ if st.session_state.df_resultado is not None:
 
     # --- Cálculos Operacionais ---
     
-    total_analisado = len(df_filtered)
+    total_analisado = indicadores['total_itens']
     
-    total_conforme = len(df_filtered[df_filtered['Status'].str.contains('Conforme') & ~df_filtered['Status'].str.contains('Não')])
-    total_nao_conforme = len(df_filtered[df_filtered['Status'].str.contains('Não Conforme')])
-    total_pendente = len(df_filtered[df_filtered['Status'].str.contains('Não Recebido')])
+    total_conforme = indicadores['conformes']
+    total_nao_conforme = indicadores['nao_conformes']
+    total_pendente = indicadores['pendentes']
     
-    # Conta itens com divergência de quantidade (excluindo não encontrados/nulos)
-    qtd_divergente_count = len(df_filtered[
-        (df_filtered['Diferença Qtd'].notna()) & 
-        (df_filtered['Diferença Qtd'] != 0)
-    ])
+    # Itens com divergência de quantidade (excluindo não encontrados/nulos)
+    qtd_divergente_count = indicadores['qtd_divergente']
     
-    # Conta itens com entrada anterior à saída (Tempo Recebimento negativo)
-    entradas_anteriores_count = len(df_filtered[
-        (df_filtered['Tempo Recebimento (Horas)'].notna()) & 
-        (df_filtered['Tempo Recebimento (Horas)'] < 0)
-    ])
+    # Itens com entrada anterior à saída (Tempo Recebimento negativo)
+    entradas_anteriores_count = indicadores['entradas_anteriores']
     
-    # Cálculo Média Tempo Recebimento
+    # Média Tempo Recebimento (itens recebidos, tempo >= 0)
+    # (o HH:MM:SS da tabela é aplicado só na página exibida, ver tabela_detalhada)
     if 'Tempo Recebimento (Horas)' in df_filtered.columns:
-        df_tempo_calc = df_filtered[
-            ~df_filtered['Status'].str.contains('Não Recebido') & 
-            df_filtered['Tempo Recebimento (Horas)'].notna() &
-            (df_filtered['Tempo Recebimento (Horas)'] >= 0)
-        ]
-        media_tempo = df_tempo_calc['Tempo Recebimento (Horas)'].mean()
+        media_tempo = indicadores['tempo_medio']
         media_tempo_str = f"{media_tempo:.1f} horas" if pd.notna(media_tempo) else "-"
-        
-        # Formata visualmente para HH:MM:SS
-        def _format_hours_hms(h):
-            if pd.isna(h): return "-"
-            try:
-                total_seconds = int(h * 3600)
-                sign = "-" if total_seconds < 0 else ""
-                total_seconds = abs(total_seconds)
-                hours, remainder = divmod(total_seconds, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                return f"{sign}{hours:02d}:{minutes:02d}:{seconds:02d}"
-            except:
-                return h
-        df_filtered['Tempo Recebimento (Horas)'] = df_filtered['Tempo Recebimento (Horas)'].apply(_format_hours_hms)
     else:
         media_tempo_str = "-"
 
@@ -859,18 +946,18 @@ if st.session_state.df_resultado is not None:
                          delta=f"+{total_sobra:.0f} unidades", delta_color="off")
             with col_res3:
                 st.metric("Divergência Total", f"{abs(total_falta) + total_sobra:.0f} unidades")
+    tempos.marcar("indicadores operacionais")
                 
     st.divider()
     
     # --- Gráfico Top 5 Hospitais com Pendências ---
     st.markdown("### Top 5 Hospitais com Pendências de Entrada (Envios não Recebidos)")
     
-    # Filtra itens pendentes (Não Recebido)
-    df_pendentes = df_filtered[df_filtered['Status'].str.contains('Não Recebido', na=False)]
+    # Itens pendentes (Não Recebido) por hospital (Unidade Destino do envio)
+    pendentes_por_hospital = cubo_resultado.top_unidades(cubo_filtrado, [analise_core.STATUS_NAO_RECEBIDO])
     
-    if not df_pendentes.empty:
-        # Agrupa por hospital (Unidade Destino do envio) e conta
-        top5_pendentes = df_pendentes['Unidade Destino'].value_counts().head(5).reset_index()
+    if not pendentes_por_hospital.empty:
+        top5_pendentes = pendentes_por_hospital.reset_index()
         top5_pendentes.columns = ['Hospital', 'Quantidade']
         
         # Cria gráfico horizontal com Altair para customização
@@ -893,10 +980,12 @@ if st.session_state.df_resultado is not None:
         st.altair_chart((bars + text).properties(height=300), use_container_width=True)
     else:
         st.info("Não há pendências de entrada registradas no período selecionado.")
+    tempos.marcar("top 5 pendências")
     
     # Define cor do texto dos gráficos (sempre claro)
     chart_text_color = '#001A72'
     chart_grid_color = 'rgba(128,128,128,0.2)'
+    tema_graficos = dict(chart_text_color=chart_text_color, chart_grid_color=chart_grid_color)
 
     # --- Gráficos Premium ---
     col_chart1, col_chart2 = st.columns(2)
@@ -905,68 +994,20 @@ if st.session_state.df_resultado is not None:
         st.markdown("#### Status de Recebimento")
         
         # Conta status
-        status_counts = df_filtered['Status'].value_counts()
-        
-        # Remove emojis das labels e define cores
-        clean_labels = [label.replace('✅ ', '').replace('❌ ', '').replace('⚠️ ', '') for label in status_counts.index]
-        
-        # Mapeamento de cores fixo
-        color_map = {
-            'Conforme': '#00C853',      # Verde
-            'Não Conforme': '#FF4444',  # Vermelho
-            'Não Recebido': '#FF9800'   # Laranja
-        }
-        
-        # Gera lista de cores na ordem dos dados
-        chart_colors = [color_map.get(label, '#999999') for label in clean_labels]
+        status_counts = cubo_resultado.contagem_por(cubo_filtrado, 'Status')
         
-        # Gráfico de rosca com Plotly - texto otimizado
-        fig_status = go.Figure(data=[go.Pie(
-            labels=clean_labels,
-            values=status_counts.values,
-            hole=0.6,
-            marker=dict(
-                colors=chart_colors,
-                line=dict(color='white', width=3)
-            ),
-            textposition='outside',
-            textinfo='percent', # Apenas percentual no gráfico
-            textfont=dict(size=12, family="Arial", color=chart_text_color),
-            insidetextorientation='radial',
-            pull=[0.05] * len(status_counts),  # Separa levemente todas as fatias
-            hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
-        )])
-        
-        fig_status.update_layout(
-            showlegend=True,  # Exibe legenda com ícones (bolinhas/quadrados)
-            legend=dict(
-                orientation="v",
-                yanchor="bottom",
-                y=0,
-                xanchor="right",
-                x=1,
-                font=dict(size=11, color=chart_text_color),
-                bgcolor="rgba(0,0,0,0)" # Fundo transparente
-            ),
-            height=380,
-            margin=dict(t=20, b=20, l=40, r=40), # Margens maiores para não cortar texto
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(family="Arial", size=12, color=chart_text_color)
-        )
+        fig_status = graficos_cache.figura('status', figura_status, status_counts, **tema_graficos)
         
         st.plotly_chart(fig_status, use_container_width=True)
         
     with col_chart2:
         st.markdown("#### Top 5 Hospitais com Divergências nas Quantidades Recebidas")
         
-        df_div = df_filtered[df_filtered['Status'].str.contains('Não Conforme')]
-        if not df_div.empty:
-            # Combina origem e destino
-            hospitais_div = pd.concat([
-                df_div['Unidade Origem'].value_counts(),
-                df_div['Unidade Destino'].value_counts()
-            ]).groupby(level=0).sum().sort_values(ascending=False).head(5).reset_index()
+        # Combina origem e destino
+        hospitais_div = cubo_resultado.top_unidades(
+            cubo_filtrado, analise_core.STATUS_NAO_CONFORMES, ('Unidade Origem', 'Unidade Destino')
+        ).reset_index()
+        if not hospitais_div.empty:
             hospitais_div.columns = ['Hospital', 'Quantidade']
             
             # Cria gráfico Altair (consistente com o gráfico de Pendências)
@@ -989,32 +1030,77 @@ if st.session_state.df_resultado is not None:
             st.altair_chart((bars_div + text_div).properties(height=350), use_container_width=True)
         else:
             st.info("Nenhuma divergência por hospital!")
+    tempos.marcar("gráficos")
     
     st.divider()
 
     # --- Tabela Detalhada ---
-    st.subheader("Detalhamento dos Dados")
-    
-    st.dataframe(
-        df_filtered,
-        use_container_width=True,
-        column_config={
-            "Data": st.column_config.TextColumn("Data"),
-            "Valor Saída (R$)": st.column_config.NumberColumn("Valor Saída", format="R$ %.2f"),
-            "Valor Entrada (R$)": st.column_config.NumberColumn("Valor Entrada", format="R$ %.2f"),
-            "Diferença (R$)": st.column_config.NumberColumn("Diferença", format="R$ %.2f"),
-            "Status": st.column_config.TextColumn("Status"),
-        },
-        hide_index=True
-    )
-    
-    # Download
-    excel_data = gerar_excel_bytes(df_filtered)
-    st.download_button(
-        label="Baixar Dados Filtrados (Excel)",
-        data=excel_data,
-        file_name="analise_dashboard.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        type="primary"
+    # Download: os arquivos só são gerados no clique e ficam em cache por versão do resultado + filtros
+    chave_download = exportacao.chave_exportacao(
+        st.session_state.resultado_chave,
+        status=sorted(map(str, status_filter)), unidades=sorted(unidade_filter),
+        periodo=[str(d) for d in date_range],
+        unidade=unidade_rls
     )
+    tabela_detalhada(df_filtered, chave_download)
+    tempos.fim()
 
+if st.session_state.df_resultado is not None:
+    # CSS dos cards de KPI fica fora do fragmento: é injetado só nas execuções completas
+    st.markdown("""
+    <style>
+    .kpi-card {
+        background-color: white;
+        border-radius: 8px;
+        padding: 15px;
+        box-shadow: 0 2px 5px rgba(0,0,0,0.05);
+        border-left: 5px solid #4A90E2;
+        margin-bottom: 15px;
+        min-height: 110px;
+        display: flex;
+        flex-direction: column;
+        justify-content: center;
+        transition: transform 0.2s;
+    }
+    .kpi-card:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 4px 8px rgba(0,0,0,0.1);
+    }
+    .kpi-title {
+        color: #666;
+        font-size: 0.9em;
+        font-weight: 600;
+        margin-bottom: 5px;
+        text-transform: uppercase;
+        letter-spacing: 0.5px;
+        white-space: normal;
+        line-height: 1.2;
+    }
+    .kpi-value {
+        color: #2C3E50;
+        font-size: 1.5em;
+        font-weight: 700;
+        margin-bottom: 5px;
+    }
+    .kpi-subtitle {
+        color: #888;
+        font-size: 0.8em;
+        line-height: 1.2;
+    }
+    .kpi-trend {
+        font-weight: 600;
+        padding: 1px 4px;
+        border-radius: 3px;
+        font-size: 0.85em;
+    }
+    .trend-up { color: #27ae60; background-color: #e8f8f0; }
+    .trend-down { color: #e74c3c; background-color: #fdedec; }
+    
+    .b-blue { border-left-color: #3498db; }
+    .b-green { border-left-color: #2ecc71; }
+    .b-red { border-left-color: #e74c3c; }
+    .b-orange { border-left-color: #f39c12; }
+    .b-purple { border-left-color: #9b59b6; }
+    </style>
+    """, unsafe_allow_html=True)
+    painel_dashboard()
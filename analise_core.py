@@ -2,7 +2,13 @@ import pandas as pd
 import re
 from difflib import SequenceMatcher
 from datetime import datetime
+import hashlib
+import os
+import pickle
+import threading
+import time
 import numpy as np
+from metricas_analise import MetricasAnalise
 
 # --- Funções Auxiliares de Tratamento de Dados ---
 
@@ -309,53 +315,284 @@ def eh_casa_portugal(unidade):
     unidade_norm = str(unidade).upper().strip()
     return 'CASA' in unidade_norm and 'PORTUGAL' in unidade_norm
 
-def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callback=None):
+# Máximo de candidatos avaliados por saída quando a busca é por janela de data
+LIMITE_CANDIDATOS = 100
+
+COLUNAS_RESULTADO = [
+    "Data", "Unidade Origem", "Unidade Destino", "Documento",
+    "Produto (Saída)", "Produto (Entrada)", "Espécie", 
+    "Valor Saída (R$)", "Valor Entrada (R$)", "Diferença (R$)",
+    "Qtd Saída", "Qtd Entrada", "Diferença Qtd",
+    "Data Entrada", "Tempo Recebimento (Horas)",
+    "Status", "Tipo de Divergência", "Código Status", "Flags Divergência",
+    "Qualidade Match", "Observações", "Detalhes Produto"
+]
+
+# --- Códigos de Status ---
+# Ao lado dos rótulos exibidos, cada linha leva o status como inteiro e as divergências
+# como bits: filtros, KPIs e exportações comparam números em vez de procurar texto.
+# O código segue o rótulo: "❌ Não Conforme" é NAO_CONFORME ou ORFA, "⚠️ Não Recebido" é NAO_RECEBIDO.
+
+STATUS_CONFORME = 0
+STATUS_NAO_CONFORME = 1
+STATUS_NAO_RECEBIDO = 2
+STATUS_ORFA = 3
+STATUS_NAO_CONFORMES = (STATUS_NAO_CONFORME, STATUS_ORFA)  # exibidos como "Não Conforme"
+
+DIV_VALOR = 1
+DIV_QTD = 2
+DIV_NAO_ENCONTRADO = 4  # saída sem entrada (ou entrada sem saída)
+
+COLUNAS_CODIGOS = ["Código Status", "Flags Divergência"]
+
+def montar_resultado(linhas):
+    """DataFrame de resultado a partir das linhas (Status categórico, códigos em int8)."""
+    df = pd.DataFrame(linhas, columns=COLUNAS_RESULTADO)
+    df['Status'] = df['Status'].astype('category')
+    df[COLUNAS_CODIGOS] = df[COLUNAS_CODIGOS].astype('int8')
+    return df
+
+def adicionar_codigos_status(df):
+    """
+    Garante as colunas de código e o Status categórico (resultados gravados antes deles
+    são derivados dos rótulos). Retorna o próprio df se já estiver no formato; senão uma cópia.
+    """
+    if isinstance(df['Status'].dtype, pd.CategoricalDtype) and all(c in df.columns for c in COLUNAS_CODIGOS):
+        return df
+    if all(c in df.columns for c in COLUNAS_CODIGOS):
+        df = df.copy()
+        df['Status'] = df['Status'].astype('category')
+        return df
+    status = df['Status'].astype(str)
+    tipo = df['Tipo de Divergência'].astype(str) if 'Tipo de Divergência' in df.columns else pd.Series('', index=df.index)
+    orfa = df['Observações'].eq("Entrada órfã") if 'Observações' in df.columns else pd.Series(False, index=df.index)
+    codigo = np.select(
+        [status.str.contains('Não Recebido').to_numpy(), orfa.to_numpy(), status.str.contains('Não Conforme').to_numpy()],
+        [STATUS_NAO_RECEBIDO, STATUS_ORFA, STATUS_NAO_CONFORME], STATUS_CONFORME
+    ).astype('int8')
+    nao_encontrado = (codigo == STATUS_NAO_RECEBIDO) | (codigo == STATUS_ORFA) | tipo.str.contains('não encontrado', case=False).to_numpy()
+    flags = (
+        np.where(tipo.str.contains('valor', case=False).to_numpy(), DIV_VALOR, 0)
+        | np.where(tipo.str.contains('Divergência Qtd').to_numpy(), DIV_QTD, 0)
+        | np.where(nao_encontrado, DIV_NAO_ENCONTRADO, 0)
+    ).astype('int8')
+    df = df.copy()
+    df['Status'] = df['Status'].astype('category')
+    posicao = df.columns.get_loc('Tipo de Divergência') + 1 if 'Tipo de Divergência' in df.columns else len(df.columns)
+    df.insert(posicao, "Código Status", codigo)
+    df.insert(posicao + 1, "Flags Divergência", flags)
+    return df
+
+def normalizar_colunas_texto(df):
+    """Normaliza (str + strip) as colunas de texto usadas no matching."""
+    df['documento'] = df['documento'].astype(str).str.strip()
+    df['ds_produto'] = df['ds_produto'].astype(str).str.strip()
+    df['unidade_origem'] = df['unidade_origem'].astype(str).str.strip()
+    df['unidade_destino'] = df['unidade_destino'].astype(str).str.strip()
+    return df
+
+def linha_entrada_orfa(row_e):
+    """Monta a linha de resultado de uma entrada sem saída correspondente."""
+    return [
+        row_e['data'], row_e['unidade_origem'], row_e['unidade_destino'],
+        row_e['doc_num'], "-", row_e['ds_produto'], row_e.get('especie', ''),
+        None, float(row_e['valor_total']), None, 
+        None, float(row_e.get('qt_entrada', 0)), None,
+        row_e['data'], None, 
+        "❌ Não Conforme", "Item recebido sem saída", STATUS_ORFA, DIV_NAO_ENCONTRADO, "-",
+        "Entrada órfã", "-"
+    ]
+
+# --- Progresso ---
+
+INTERVALO_PROGRESSO = 0.25  # segundos entre chamadas do progress_callback no laço principal
+
+def _formatar_duracao(segundos):
+    minutos, segundos = divmod(int(round(segundos)), 60)
+    horas, minutos = divmod(minutos, 60)
+    return f"{horas}h{minutos:02d}m" if horas else f"{minutos:02d}:{segundos:02d}"
+
+class ReporterProgresso:
+    """Limita as chamadas de progress_callback por tempo e acrescenta linhas/s e ETA à mensagem.
+
+    Custa uma leitura de relógio por linha; o callback só é chamado a cada `intervalo` segundos.
+    """
+
+    def __init__(self, progress_callback, total, inicio_linha=0, intervalo=INTERVALO_PROGRESSO, base=0.05, faixa=0.9):
+        self.progress_callback = progress_callback
+        self.total = total
+        self.inicio_linha = inicio_linha
+        self.intervalo = intervalo
+        self.base = base
+        self.faixa = faixa
+        self.inicio = time.perf_counter()
+        self.ultimo = float('-inf')
+
+    def linha(self, i):
+        """Chamado antes de processar a linha i (posição 0-based)."""
+        agora = time.perf_counter()
+        if agora - self.ultimo < self.intervalo:
+            return
+        self.ultimo = agora
+        feitas = i - self.inicio_linha
+        decorrido = agora - self.inicio
+        mensagem = f"Analisando {i + 1}/{self.total}"
+        if feitas > 0 and decorrido > 0:
+            taxa = feitas / decorrido
+            mensagem += f" | {taxa:.0f} linhas/s | ETA {_formatar_duracao((self.total - i) / taxa)}"
+        self.progress_callback(self.base + (i / self.total) * self.faixa, mensagem)
+
+# --- Caches do Processo ---
+# Componentes e similaridades dependem só das descrições, então valem de uma análise
+# para a outra: num processo de vida longa (worker_analise, servidor do Streamlit)
+# a reanálise reaproveita o que já foi calculado. Passando do limite, as entradas
+# mais antigas saem primeiro. Os valores são compartilhados: não devem ser alterados.
+
+MAX_CACHE_COMPONENTES = 100_000
+MAX_CACHE_SIMILARIDADE = 500_000
+
+_cache_componentes = {}
+_cache_similaridade = {}
+_lock_caches = threading.Lock()
+
+def _guardar_cache(cache, chave, valor, limite):
+    with _lock_caches:
+        while len(cache) >= limite:
+            cache.pop(next(iter(cache)))
+        cache[chave] = valor
+
+def componentes_produto(descricao):
+    """extrair_componentes_produto com o cache do processo."""
+    comps = _cache_componentes.get(descricao)
+    if comps is None:
+        comps = extrair_componentes_produto(descricao)
+        _guardar_cache(_cache_componentes, descricao, comps, MAX_CACHE_COMPONENTES)
+    return comps
+
+def tamanho_caches():
+    return {'componentes': len(_cache_componentes), 'similaridade': len(_cache_similaridade)}
+
+def limpar_caches():
+    with _lock_caches:
+        _cache_componentes.clear()
+        _cache_similaridade.clear()
+
+# --- Cancelamento e Checkpoints ---
+
+VERSAO_CHECKPOINT = 2
+INTERVALO_CHECKPOINT = 30.0  # segundos entre checkpoints do laço principal
+
+class AnaliseCancelada(Exception):
+    """Levantada pelo analisar_itens quando o token de cancelamento é acionado."""
+
+def _chave_checkpoint(df_saida, df_entrada, limiar_similaridade):
+    """Identifica a execução: mesmas linhas, na mesma ordem, com os mesmos parâmetros."""
+    h = hashlib.sha1(f"{VERSAO_CHECKPOINT}|{limiar_similaridade}|{LIMITE_CANDIDATOS}".encode())
+    for df in (df_saida, df_entrada):
+        h.update(pd.util.hash_pandas_object(df.astype(str), index=True).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+def _salvar_checkpoint(caminho, estado):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    tmp = caminho + ".tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(estado, f)
+    os.replace(tmp, caminho)
+
+def _carregar_checkpoint(caminho):
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, 'rb') as f:
+            estado = pickle.load(f)
+    except Exception as e:
+        print(f"   ⚠️ Checkpoint ilegível, análise recomeça do início: {e}")
+        return None
+    return estado if estado.get('versao') == VERSAO_CHECKPOINT else None
+
+def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callback=None, pares=None, metricas=None,
+                   cancelamento=None, checkpoint_dir=None, intervalo_checkpoint=INTERVALO_CHECKPOINT):
     """
     Executa a análise entre dataframes de saída e entrada.
     progress_callback: função que recebe (float, str) para reportar progresso.
+    pares: dict opcional preenchido com {índice da saída: [índices de entrada conciliados]}.
+    metricas: MetricasAnalise opcional; o resumo por etapa é devolvido em stats['etapas'].
+    cancelamento: objeto com is_set() (ex: threading.Event), verificado entre as linhas de saída;
+        quando acionado, levanta AnaliseCancelada.
+    checkpoint_dir: se informado, o estado do laço é gravado a cada intervalo_checkpoint segundos
+        (e no cancelamento); uma nova execução com as mesmas entradas retoma do último checkpoint.
     """
+    if metricas is None:
+        metricas = MetricasAnalise()
+    inicio_analise = time.perf_counter()
+    
     analise = []
     entradas_processadas = set()
     
+    # Cache de similaridade (do processo): os componentes são função apenas da descrição normalizada
+    def similaridade(comp1, comp2, ignore_penalties, etapa):
+        chave = (comp1['original'], comp2['original'], ignore_penalties)
+        metricas.contar(etapa, 'chamadas_similaridade')
+        resultado = _cache_similaridade.get(chave)
+        if resultado is not None:
+            metricas.contar(etapa, 'cache_hits')
+            return resultado
+        resultado = calcular_similaridade_precalc(comp1, comp2, ignore_penalties=ignore_penalties)
+        _guardar_cache(_cache_similaridade, chave, resultado, MAX_CACHE_SIMILARIDADE)
+        return resultado
+    
     periodo_inicio = df_saida['data'].min() if 'data' in df_saida.columns else None
     periodo_fim = df_saida['data'].max() if 'data' in df_saida.columns else None
     
     # Normalização
     for df in [df_saida, df_entrada]:
-        df['documento'] = df['documento'].astype(str).str.strip()
-        df['ds_produto'] = df['ds_produto'].astype(str).str.strip()
-        df['unidade_origem'] = df['unidade_origem'].astype(str).str.strip()
-        df['unidade_destino'] = df['unidade_destino'].astype(str).str.strip()
+        normalizar_colunas_texto(df)
+    
+    caminho_checkpoint = None
+    if checkpoint_dir:
+        chave = _chave_checkpoint(df_saida, df_entrada, limiar_similaridade)
+        caminho_checkpoint = os.path.join(checkpoint_dir, f"analise_{chave}.pkl")
+        if pares is None:
+            pares = {}  # O checkpoint guarda os pares mesmo se o chamador não pediu
     
     if progress_callback:
         progress_callback(0.05, "Pré-processando dados...")
     
-    # Pré-cálculos
-    df_saida['comps'] = df_saida['ds_produto'].apply(extrair_componentes_produto)
-    df_entrada['comps'] = df_entrada['ds_produto'].apply(extrair_componentes_produto)
-    
-    df_saida['doc_num'] = df_saida['documento'].apply(extrair_numeros)
-    df_entrada['doc_num'] = df_entrada['documento'].apply(extrair_numeros)
-    
-    df_saida['destino_cp'] = df_saida['unidade_destino'].apply(eh_casa_portugal)
+    # Pré-cálculos (componentes extraídos uma vez por descrição distinta)
+    with metricas.medir('componentes', len(df_saida) + len(df_entrada)) as etapa:
+        descricoes = pd.concat([df_saida['ds_produto'], df_entrada['ds_produto']]).unique()
+        extracoes = sum(1 for d in descricoes if d not in _cache_componentes)
+        cache_comps = {d: componentes_produto(d) for d in descricoes}
+        df_saida['comps'] = df_saida['ds_produto'].map(cache_comps.__getitem__)
+        df_entrada['comps'] = df_entrada['ds_produto'].map(cache_comps.__getitem__)
+        etapa['linhas_saida'] += len(df_saida) + len(df_entrada)
+        metricas.contar('componentes', 'extracoes', extracoes)
+        metricas.contar('componentes', 'cache_hits', len(df_saida) + len(df_entrada) - extracoes)
     
-    df_saida['origem_norm'] = df_saida['unidade_origem'].str.upper().str.strip()
-    df_saida['destino_norm'] = df_saida['unidade_destino'].str.upper().str.strip()
-    df_entrada['origem_norm'] = df_entrada['unidade_origem'].str.upper().str.strip()
-    df_entrada['destino_norm'] = df_entrada['unidade_destino'].str.upper().str.strip()
+        df_saida['doc_num'] = df_saida['documento'].apply(extrair_numeros)
+        df_entrada['doc_num'] = df_entrada['documento'].apply(extrair_numeros)
+        
+        df_saida['destino_cp'] = df_saida['unidade_destino'].apply(eh_casa_portugal)
+        
+        df_saida['origem_norm'] = df_saida['unidade_origem'].str.upper().str.strip()
+        df_saida['destino_norm'] = df_saida['unidade_destino'].str.upper().str.strip()
+        df_entrada['origem_norm'] = df_entrada['unidade_origem'].str.upper().str.strip()
+        df_entrada['destino_norm'] = df_entrada['unidade_destino'].str.upper().str.strip()
     
     # Índice
-    doc_index = {}
-    for idx, row in df_entrada.iterrows():
-        doc = row['doc_num']
-        if doc and doc != '':
-            if doc not in doc_index:
-                doc_index[doc] = []
-            doc_index[doc].append(idx)
+    with metricas.medir('indexacao', len(df_entrada)) as etapa:
+        doc_index = {}
+        for idx, doc in df_entrada['doc_num'].items():
+            if doc and doc != '':
+                if doc not in doc_index:
+                    doc_index[doc] = []
+                doc_index[doc].append(idx)
+        etapa['linhas_saida'] += sum(len(v) for v in doc_index.values())
             
     matches_agrupados = {}
     
     # Agrupamento
+    inicio_grupos = time.perf_counter()
     df_saida_validos = df_saida[df_saida['doc_num'] != ''].copy()
     if not df_saida_validos.empty:
         df_saida_validos['chave_grupo'] = df_saida_validos['doc_num'] + "_" + df_saida_validos['ds_produto']
@@ -378,7 +615,8 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
                         qtd_match_soma = abs(qtd_e - qtd_total_saida) < 0.1
                         limiar_grupo = 70 if qtd_match_soma else 85
                         
-                        score_prod, _ = calcular_similaridade_precalc(comp_grupo, row_e['comps'], ignore_penalties=True)
+                        metricas.contar('grupos', 'pares_candidatos')
+                        score_prod, _ = similaridade(comp_grupo, row_e['comps'], True, 'grupos')
                         
                         if score_prod >= limiar_grupo:
                             if qtd_match_soma:
@@ -395,6 +633,9 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
                                         'qtd_entrada_proporcional': qtd_s
                                     }
                                 break
+    metricas.adicionar_tempo('grupos', time.perf_counter() - inicio_grupos)
+    metricas.etapas['grupos']['linhas_entrada'] += len(df_saida_validos)
+    metricas.etapas['grupos']['linhas_saida'] += len(matches_agrupados)
 
     stats = {
         'conformes': 0, 'nao_conformes': 0, 'nao_encontrados': 0,
@@ -404,9 +645,47 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
     
     total_items = len(df_saida)
     
-    for i, (idx_s, row_s) in enumerate(df_saida.iterrows()):
-        if progress_callback and i % 20 == 0:
-            progress_callback(0.05 + (i / total_items) * 0.9, f"Analisando {i + 1}/{total_items}")
+    # Retomada: o checkpoint substitui o estado do laço até a linha em que parou
+    inicio_linha = 0
+    estado = _carregar_checkpoint(caminho_checkpoint) if caminho_checkpoint else None
+    if estado:
+        inicio_linha = estado['proxima_linha']
+        analise = estado['analise']
+        stats = estado['stats']
+        entradas_processadas = set(df_entrada.index[estado['entradas_consumidas']])
+        pares.update(estado['pares'])
+        metricas.contar('classificacao', 'linhas_retomadas', inicio_linha)
+        print(f"   Checkpoint encontrado: retomando da linha {inicio_linha + 1}/{total_items}")
+    
+    def salvar_checkpoint(proxima_linha):
+        _salvar_checkpoint(caminho_checkpoint, {
+            'versao': VERSAO_CHECKPOINT,
+            'proxima_linha': proxima_linha,
+            'analise': analise,
+            'stats': stats,
+            'entradas_consumidas': df_entrada.index.isin(list(entradas_processadas)),
+            'pares': pares,
+        })
+        metricas.contar('classificacao', 'checkpoints')
+    
+    for nome in ('documentos', 'fuzzy'):
+        metricas.adicionar_tempo(nome, 0.0)
+    tempo_busca_antes = metricas.etapas['documentos']['tempo_s'] + metricas.etapas['fuzzy']['tempo_s']
+    inicio_laco = time.perf_counter()
+    ultimo_checkpoint = inicio_laco
+    progresso = ReporterProgresso(progress_callback, total_items, inicio_linha) if progress_callback else None
+    
+    for i, (idx_s, row_s) in enumerate(df_saida.iloc[inicio_linha:].iterrows(), start=inicio_linha):
+        if cancelamento is not None and cancelamento.is_set():
+            if caminho_checkpoint:
+                salvar_checkpoint(i)
+            raise AnaliseCancelada(f"Análise cancelada na linha {i + 1}/{total_items}")
+        if caminho_checkpoint and time.perf_counter() - ultimo_checkpoint >= intervalo_checkpoint:
+            salvar_checkpoint(i)
+            ultimo_checkpoint = time.perf_counter()
+        
+        if progresso:
+            progresso.linha(i)
 
         doc_num = row_s['doc_num']
         produto_s = row_s['ds_produto']
@@ -428,6 +707,8 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
             
             stats['conformes'] += 1
             stats['matches_perfeitos'] += 1
+            if pares is not None:
+                pares[idx_s] = [match_info['index']]
             
             data_e = row_e['data']
             tempo_recebimento = (data_e - data_s).total_seconds() / 3600 if pd.notna(data_s) and pd.notna(data_e) else None
@@ -440,7 +721,7 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
                 row_s.get('especie', ''), valor_s, valor_e, diferenca_valor, 
                 qtd_s, qtd_e, diferenca_qtd,
                 data_e, tempo_recebimento, 
-                "✅ Conforme", "-", "⭐⭐⭐ Excelente", obs, match_info['detalhes_produto']
+                "✅ Conforme", "-", STATUS_CONFORME, 0, "⭐⭐⭐ Excelente", obs, match_info['detalhes_produto']
             ])
             continue
         
@@ -449,8 +730,10 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
         candidatos_idx = []
         match_agregado = None
         documento_nao_encontrado = False
+        inicio_busca = time.perf_counter()
         
         if doc_num and doc_num != '':
+            metricas.etapas['documentos']['linhas_entrada'] += 1
             if doc_num in doc_index:
                 candidatos_idx = doc_index[doc_num]
                 candidatos_disponiveis = [i for i in candidatos_idx if i not in entradas_processadas]
@@ -459,12 +742,13 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
                 matches_doc_prod = []
                 match_exato = None
                 
+                metricas.contar('documentos', 'pares_candidatos', len(candidatos_disponiveis))
                 for idx_e in candidatos_disponiveis:
                     row_e = df_entrada.loc[idx_e]
                     qtd_e = float(row_e.get('qt_entrada', 0))
                     qtd_match_exato = abs(qtd_e - qtd_s) < 0.01
                     limiar_doc = 70 if qtd_match_exato else 85
-                    score_prod, _ = calcular_similaridade_precalc(comp_s, row_e['comps'], ignore_penalties=True)
+                    score_prod, _ = similaridade(comp_s, row_e['comps'], True, 'documentos')
                     if score_prod >= limiar_doc:
                         if qtd_match_exato:
                             match_exato = {
@@ -513,12 +797,17 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
                 else:
                     candidatos = df_entrada
         
-        if len(candidatos) > 100: candidatos = candidatos.head(100)
+        if len(candidatos) > LIMITE_CANDIDATOS: candidatos = candidatos.head(LIMITE_CANDIDATOS)
+        
+        inicio_fuzzy = time.perf_counter()
+        metricas.adicionar_tempo('documentos' if doc_num else 'fuzzy', inicio_fuzzy - inicio_busca)
         
         if match_agregado:
             matches.append(match_agregado)
             best_score = 100
+            metricas.etapas['documentos']['linhas_saida'] += 1
         else:
+            metricas.etapas['fuzzy']['linhas_entrada'] += 1
             for idx_e, row_e in candidatos.iterrows():
                 if idx_e in entradas_processadas: continue
                 if best_score >= 95: break
@@ -548,7 +837,8 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
                     score_total += 15
                     detalhes_match.append("Doc:N/A(entrada)")
                 
-                score_produto, detalhes_produto = calcular_similaridade_precalc(comp_s, row_e['comps'], ignore_penalties=doc_match)
+                metricas.contar('fuzzy', 'pares_candidatos')
+                score_produto, detalhes_produto = similaridade(comp_s, row_e['comps'], doc_match, 'fuzzy')
                 
                 if doc_match:
                     qtd_e = float(row_e.get('qt_entrada', 0))
@@ -595,6 +885,10 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
                         'detalhes_produto': detalhes_produto
                     })
                     if score_total > best_score: best_score = score_total
+            
+            metricas.adicionar_tempo('fuzzy', time.perf_counter() - inicio_fuzzy)
+            if matches:
+                metricas.etapas['fuzzy']['linhas_saida'] += 1
         
         if matches:
             matches.sort(key=lambda x: (x['score'], x['score_produto']), reverse=True)
@@ -613,16 +907,17 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
                 analise.append([
                     data_s, row_s['unidade_origem'], row_s['unidade_destino'], doc_num, produto_s, "-",
                     row_s.get('especie', ''), valor_s, None, None, qtd_s, None, None,
-                    None, None, "❌ Não Conforme", "Item não encontrado (Qtd divergente)", "-", 
+                    None, None, "❌ Não Conforme", "Item não encontrado (Qtd divergente)",
+                    STATUS_NAO_CONFORME, DIV_NAO_ENCONTRADO, "-", 
                     f"Match rejeitado: {qtd_s} vs {qtd_e}", "-"
                 ])
                 continue
             
             diferenca_qtd = diferenca_qtd_validada
-            if 'indices' in best_match:
-                for idx in best_match['indices']: entradas_processadas.add(idx)
-            else:
-                entradas_processadas.add(best_match['index'])
+            indices_match = best_match['indices'] if 'indices' in best_match else [best_match['index']]
+            for idx in indices_match: entradas_processadas.add(idx)
+            if pares is not None:
+                pares[idx_s] = list(indices_match)
             
             diferenca_valor = round(valor_s - valor_e, 2)
             perc_diff_valor = abs(diferenca_valor / valor_s * 100) if valor_s > 0 else 0
@@ -647,19 +942,24 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
             else:
                 conforme_valor = abs(diferenca_valor) <= 10
             
+            flags_div = 0
             if conforme_valor and conforme_qtd:
                 status = "✅ Conforme"
+                codigo_status = STATUS_CONFORME
                 tipo_div = "-"
                 stats['conformes'] += 1
             else:
                 status = "❌ Não Conforme"
+                codigo_status = STATUS_NAO_CONFORME
                 stats['nao_conformes'] += 1
                 tipos_div = []
                 if not conforme_valor:
                     stats['valor_divergente'] += 1
+                    flags_div |= DIV_VALOR
                     tipos_div.append(f"Divergência Valor")
                 if not conforme_qtd:
                     stats['qtd_divergente'] += 1
+                    flags_div |= DIV_QTD
                     tipos_div.append(f"Divergência Qtd")
                 tipo_div = " | ".join(tipos_div)
             
@@ -672,7 +972,7 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
                 row_s.get('especie', ''), valor_s, valor_e, diferenca_valor, 
                 qtd_s, qtd_e, diferenca_qtd,
                 data_e, tempo_recebimento, 
-                status, tipo_div, qualidade_match, obs, best_match['detalhes_produto']
+                status, tipo_div, codigo_status, flags_div, qualidade_match, obs, best_match['detalhes_produto']
             ])
         else:
             stats['nao_encontrados'] += 1
@@ -683,39 +983,41 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_callba
                 row_s.get('especie', ''), valor_s, None, None, 
                 qtd_s, None, None,
                 None, None, 
-                "⚠️ Não Recebido", motivo, "-", "Sem correspondência", "-"
+                "⚠️ Não Recebido", motivo, STATUS_NAO_RECEBIDO, DIV_NAO_ENCONTRADO, "-", "Sem correspondência", "-"
             ])
             
+    # Tempo do laço que não é busca/pontuação (classificação e montagem das linhas)
+    tempo_laco = time.perf_counter() - inicio_laco
+    tempo_busca = metricas.etapas['documentos']['tempo_s'] + metricas.etapas['fuzzy']['tempo_s'] - tempo_busca_antes
+    metricas.adicionar_tempo('classificacao', tempo_laco - tempo_busca)
+    metricas.etapas['classificacao']['linhas_entrada'] += len(df_saida) - inicio_linha
+    metricas.etapas['classificacao']['linhas_saida'] += len(analise) - inicio_linha
+    
     if progress_callback:
         progress_callback(0.95, "Finalizando...")
+    
+    with metricas.medir('orfas', len(df_entrada)) as etapa:
+        n_antes = len(analise)
+        for idx_e, row_e in df_entrada.iterrows():
+            if idx_e in entradas_processadas: continue
+            
+            data_e = row_e['data']
+            if pd.notna(periodo_inicio) and pd.notna(periodo_fim) and pd.notna(data_e):
+                if data_e < periodo_inicio or data_e > periodo_fim:
+                    continue
+            
+            analise.append(linha_entrada_orfa(row_e))
+        etapa['linhas_saida'] += len(analise) - n_antes
         
-    for idx_e, row_e in df_entrada.iterrows():
-        if idx_e in entradas_processadas: continue
-        
-        data_e = row_e['data']
-        if pd.notna(periodo_inicio) and pd.notna(periodo_fim) and pd.notna(data_e):
-            if data_e < periodo_inicio or data_e > periodo_fim:
-                continue
-        
-        analise.append([
-            row_e['data'], row_e['unidade_origem'], row_e['unidade_destino'],
-            row_e['doc_num'], "-", row_e['ds_produto'], row_e.get('especie', ''),
-            None, float(row_e['valor_total']), None, 
-            None, float(row_e.get('qt_entrada', 0)), None,
-            row_e['data'], None, 
-            "❌ Não Conforme", "Item recebido sem saída", "-",
-            "Entrada órfã", "-"
-        ])
-        
-    df_resultado = pd.DataFrame(analise, columns=[
-        "Data", "Unidade Origem", "Unidade Destino", "Documento",
-        "Produto (Saída)", "Produto (Entrada)", "Espécie", 
-        "Valor Saída (R$)", "Valor Entrada (R$)", "Diferença (R$)",
-        "Qtd Saída", "Qtd Entrada", "Diferença Qtd",
-        "Data Entrada", "Tempo Recebimento (Horas)",
-        "Status", "Tipo de Divergência", 
-        "Qualidade Match", "Observações", "Detalhes Produto"
-    ])
+    df_resultado = montar_resultado(analise)
+    
+    metricas.adicionar_tempo('analisar_itens', time.perf_counter() - inicio_analise)
+    metricas.etapas['analisar_itens']['linhas_entrada'] += len(df_saida) + len(df_entrada)
+    metricas.etapas['analisar_itens']['linhas_saida'] += len(df_resultado)
+    stats['etapas'] = metricas.resumo()
+    
+    if caminho_checkpoint and os.path.exists(caminho_checkpoint):
+        os.remove(caminho_checkpoint)
     
     if progress_callback:
         progress_callback(1.0, "Concluído!")
@@ -819,7 +1121,15 @@ def mapear_colunas(df):
             if 'hora' not in mapeamento.values(): mapeamento[col] = 'hora'
     return mapeamento
 
-def preparar_dataframe(df):
+def preparar_dataframe(df, metricas=None):
+    if metricas is None:
+        metricas = MetricasAnalise()
+    with metricas.medir('preparar_dataframe', len(df)) as etapa:
+        df = _preparar_dataframe(df)
+        etapa['linhas_saida'] += len(df)
+    return df
+
+def _preparar_dataframe(df):
     df.columns = [c.strip().lower() for c in df.columns]
     map_cols = mapear_colunas(df)
     df.rename(columns=map_cols, inplace=True)
@@ -844,3 +1154,48 @@ def preparar_dataframe(df):
         df = df[~mask]
         
     return df
+
+# --- Consolidação de Arquivos ---
+
+# Chave de negócio de uma linha (colunas já mapeadas por preparar_dataframe)
+COLUNAS_CHAVE = [
+    'documento', 'ds_produto', 'qt_entrada', 'valor_total', 'data',
+    'unidade_origem', 'unidade_destino', 'especie'
+]
+
+def calcular_fingerprints(df):
+    """Fingerprint estável (uint64) por linha: hash da chave de negócio + ordinal de ocorrência.
+
+    Linhas idênticas recebem ordinais diferentes (0, 1, 2...) para continuarem distintas.
+    """
+    chave = pd.DataFrame(index=df.index)
+    for col in COLUNAS_CHAVE:
+        if col not in df.columns:
+            continue
+        if col in ('qt_entrada', 'valor_total', 'data'):
+            chave[col] = df[col]
+        else:
+            chave[col] = df[col].astype(str).str.strip()
+
+    hash_chave = pd.util.hash_pandas_object(chave, index=False)
+    ocorrencia = hash_chave.groupby(hash_chave).cumcount()
+    return pd.util.hash_pandas_object(
+        pd.DataFrame({'chave': hash_chave.values, 'ocorrencia': ocorrencia.values}, index=df.index),
+        index=False
+    )
+
+def consolidar_dataframes(arquivos):
+    """Concatena os DataFrames preparados [(nome, df), ...] removendo linhas repetidas entre arquivos.
+
+    Uma linha que aparece N vezes num arquivo e M vezes em outro entra max(N, M) vezes:
+    repetições dentro do mesmo arquivo são preservadas, sobreposições entre exportações não.
+    """
+    partes = []
+    vistos = np.array([], dtype=np.uint64)
+    for nome, df in arquivos:
+        fps = calcular_fingerprints(df).to_numpy()
+        duplicadas = np.isin(fps, vistos)
+        print(f"   {nome}: {int(duplicadas.sum())} linha(s) duplicada(s) removida(s) de {len(df)}")
+        partes.append(df[~duplicadas])
+        vistos = np.union1d(vistos, fps)
+    return pd.concat(partes, ignore_index=True)
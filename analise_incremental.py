@@ -0,0 +1,237 @@
+import os
+import pickle
+import time
+import numpy as np
+import pandas as pd
+import analise_core
+from metricas_analise import MetricasAnalise
+
+# --- Análise Incremental (Ledger de Itens em Aberto) ---
+#
+# O matching do analise_core é fechado por documento: uma saída com número de
+# documento só é comparada com entradas do mesmo documento. A única exceção são
+# as saídas SEM documento, que buscam candidatos numa janela de +-30 dias sobre
+# todas as entradas. Por isso o ledger guarda o resultado por documento e, a cada
+# execução, só reanalisa os documentos "sujos":
+#   - documentos cujas linhas de saída ou entrada mudaram (fingerprint novo/removido);
+#   - documentos com entradas entre os candidatos de alguma saída sem documento
+#     (hoje ou na execução anterior).
+# Os demais documentos reaproveitam as linhas de resultado e os pares do ledger,
+# o que produz exatamente o mesmo resultado de uma execução completa.
+
+LEDGER_VERSAO = 3  # 3: especie entrou na chave das linhas (fingerprint)
+JANELA_SEM_DOCUMENTO = pd.Timedelta(days=30)
+
+def carregar_ledger(caminho):
+    """Carrega o ledger salvo; retorna None se não existir ou for de outra versão."""
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, 'rb') as f:
+            ledger = pickle.load(f)
+    except Exception as e:
+        print(f"   ⚠️ Ledger ilegível, análise completa será executada: {e}")
+        return None
+    if ledger.get('versao') != LEDGER_VERSAO:
+        return None
+    return ledger
+
+def salvar_ledger(ledger, caminho):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    tmp = caminho + ".tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(ledger, f)
+    os.replace(tmp, caminho)
+
+def calcular_stats(linhas_saida):
+    """Recalcula o dicionário de stats do analisar_itens a partir das linhas de saída."""
+    stats = {
+        'conformes': 0, 'nao_conformes': 0, 'nao_encontrados': 0,
+        'valor_divergente': 0, 'qtd_divergente': 0,
+        'matches_perfeitos': 0, 'matches_bons': 0, 'matches_razoaveis': 0
+    }
+    i_codigo = analise_core.COLUNAS_RESULTADO.index("Código Status")
+    i_flags = analise_core.COLUNAS_RESULTADO.index("Flags Divergência")
+    i_qualidade = analise_core.COLUNAS_RESULTADO.index("Qualidade Match")
+
+    for linha in linhas_saida:
+        codigo, flags, qualidade = linha[i_codigo], linha[i_flags], linha[i_qualidade]
+        if codigo == analise_core.STATUS_CONFORME:
+            stats['conformes'] += 1
+        else:
+            stats['nao_conformes'] += 1
+        if flags & analise_core.DIV_NAO_ENCONTRADO:
+            stats['nao_encontrados'] += 1
+            continue
+        if flags & analise_core.DIV_VALOR:
+            stats['valor_divergente'] += 1
+        if flags & analise_core.DIV_QTD:
+            stats['qtd_divergente'] += 1
+        if qualidade == "⭐⭐⭐ Excelente":
+            stats['matches_perfeitos'] += 1
+        elif qualidade == "⭐⭐ Bom":
+            stats['matches_bons'] += 1
+        elif qualidade == "⭐ Razoável":
+            stats['matches_razoaveis'] += 1
+    return stats
+
+def _docs_na_janela_sem_documento(df_saida, df_entrada):
+    """Documentos de entrada alcançáveis pelas saídas sem documento.
+
+    Cada saída sem documento avalia só as primeiras LIMITE_CANDIDATOS entradas (na ordem
+    original) da sua janela de data, ou do arquivo inteiro se a saída não tiver data.
+    """
+    datas_sem_doc = df_saida.loc[df_saida['doc_num'] == '', 'data']
+    if datas_sem_doc.empty:
+        return set()
+
+    limite = analise_core.LIMITE_CANDIDATOS
+    docs_e = df_entrada['doc_num'].to_numpy()
+    docs = set()
+
+    if datas_sem_doc.isna().any():
+        docs.update(docs_e[:limite])
+
+    # Posições originais das entradas com data, ordenadas por data
+    datas_e = df_entrada['data']
+    com_data = np.flatnonzero(datas_e.notna().to_numpy())
+    ordem = np.argsort(datas_e.iloc[com_data].to_numpy(), kind='stable')
+    posicoes = com_data[ordem]
+    datas_ordenadas = pd.Series(datas_e.iloc[posicoes].to_numpy())
+
+    for data_s in datas_sem_doc.dropna():
+        ini = datas_ordenadas.searchsorted(data_s - JANELA_SEM_DOCUMENTO, side='left')
+        fim = datas_ordenadas.searchsorted(data_s + JANELA_SEM_DOCUMENTO, side='right')
+        janela = posicoes[ini:fim]
+        if len(janela) > limite:
+            janela = np.partition(janela, limite - 1)[:limite]
+        docs.update(docs_e[janela])
+    docs.discard('')
+    return docs
+
+def _docs_sujos(ledger, fp_s, fp_e, docs_s, docs_e):
+    """Documentos cujas linhas mudaram em relação ao ledger."""
+    atuais_s = pd.Series(fp_s.values, index=docs_s.values).groupby(level=0).apply(frozenset).to_dict()
+    atuais_e = pd.Series(fp_e.values, index=docs_e.values).groupby(level=0).apply(frozenset).to_dict()
+
+    anteriores_s, anteriores_e = {}, {}
+    for fp, info in ledger['saidas'].items():
+        anteriores_s.setdefault(info['doc'], set()).add(fp)
+    for fp, info in ledger['entradas'].items():
+        anteriores_e.setdefault(info['doc'], set()).add(fp)
+
+    sujos = set()
+    for doc in set(atuais_s) | set(atuais_e):
+        if atuais_s.get(doc, frozenset()) != anteriores_s.get(doc, set()):
+            sujos.add(doc)
+        elif atuais_e.get(doc, frozenset()) != anteriores_e.get(doc, set()):
+            sujos.add(doc)
+    return sujos
+
+def analisar_incremental(df_saida, df_entrada, ledger=None, limiar_similaridade=65, progress_callback=None, metricas=None,
+                         cancelamento=None, checkpoint_dir=None):
+    """
+    Executa a análise reaproveitando o ledger da execução anterior.
+    Retorna (df_resultado, stats, novo_ledger). Sem ledger válido, faz a análise completa.
+    cancelamento/checkpoint_dir são repassados ao analisar_itens do subconjunto reanalisado.
+    """
+    if metricas is None:
+        metricas = MetricasAnalise()
+    inicio_selecao = time.perf_counter()
+    
+    df_saida = analise_core.normalizar_colunas_texto(df_saida.copy())
+    df_entrada = analise_core.normalizar_colunas_texto(df_entrada.copy())
+    df_saida['doc_num'] = df_saida['documento'].apply(analise_core.extrair_numeros)
+    df_entrada['doc_num'] = df_entrada['documento'].apply(analise_core.extrair_numeros)
+
+    fp_s = analise_core.calcular_fingerprints(df_saida)
+    fp_e = analise_core.calcular_fingerprints(df_entrada)
+
+    docs_janela = _docs_na_janela_sem_documento(df_saida, df_entrada)
+
+    if ledger is None or ledger.get('limiar') != limiar_similaridade:
+        sujos = None  # Análise completa
+    else:
+        sujos = _docs_sujos(ledger, fp_s, fp_e, df_saida['doc_num'], df_entrada['doc_num'])
+        sujos |= docs_janela | ledger['docs_janela']
+
+    if sujos is None:
+        mask_s = pd.Series(True, index=df_saida.index)
+        mask_e = pd.Series(True, index=df_entrada.index)
+    else:
+        sujos.add('')  # Linhas sem documento são sempre reanalisadas
+        mask_s = df_saida['doc_num'].isin(sujos)
+        mask_e = df_entrada['doc_num'].isin(sujos)
+
+    metricas.adicionar_tempo('selecao_incremental', time.perf_counter() - inicio_selecao)
+    metricas.etapas['selecao_incremental']['linhas_entrada'] += len(df_saida) + len(df_entrada)
+    metricas.etapas['selecao_incremental']['linhas_saida'] += int(mask_s.sum() + mask_e.sum())
+    
+    print(f"   Incremental: reanalisando {mask_s.sum()}/{len(df_saida)} saídas e "
+          f"{mask_e.sum()}/{len(df_entrada)} entradas")
+
+    # Análise apenas do subconjunto sujo (mantém a ordem original das linhas)
+    linhas_sub = []
+    pares_sub = {}
+    if mask_s.any():
+        sub_s = df_saida[mask_s].drop(columns=['doc_num']).copy()
+        sub_e = df_entrada[mask_e].drop(columns=['doc_num']).copy()
+        df_sub, _ = analise_core.analisar_itens(
+            sub_s, sub_e, limiar_similaridade=limiar_similaridade,
+            progress_callback=progress_callback, pares=pares_sub, metricas=metricas,
+            cancelamento=cancelamento, checkpoint_dir=checkpoint_dir
+        )
+        # As primeiras len(sub_s) linhas são das saídas; o restante são entradas órfãs do subconjunto
+        linhas_sub = df_sub.iloc[:len(sub_s)].astype(object).where(df_sub.iloc[:len(sub_s)].notna(), None).values.tolist()
+    linhas_sub_por_idx = dict(zip(df_saida.index[mask_s], linhas_sub))
+
+    # Remonta as linhas de saída na ordem original
+    inicio_remontagem = time.perf_counter()
+    linhas_saida = []
+    pares_fp = {}
+    for idx_s, fp in zip(df_saida.index, fp_s.values):
+        if mask_s[idx_s]:
+            linhas_saida.append(linhas_sub_por_idx[idx_s])
+            if idx_s in pares_sub:
+                pares_fp[fp] = [fp_e[idx_e] for idx_e in pares_sub[idx_s]]
+        else:
+            linhas_saida.append(ledger['saidas'][fp]['linha'])
+            if fp in ledger['pares']:
+                pares_fp[fp] = ledger['pares'][fp]
+
+    # Entradas órfãs sobre o conjunto completo (o período depende de todas as saídas)
+    consumidas = {fp for fps in pares_fp.values() for fp in fps}
+    periodo_inicio = df_saida['data'].min()
+    periodo_fim = df_saida['data'].max()
+    linhas_orfas = []
+    for (idx_e, row_e), fp in zip(df_entrada.iterrows(), fp_e.values):
+        if fp in consumidas: continue
+        data_e = row_e['data']
+        if pd.notna(periodo_inicio) and pd.notna(periodo_fim) and pd.notna(data_e):
+            if data_e < periodo_inicio or data_e > periodo_fim:
+                continue
+        linhas_orfas.append(analise_core.linha_entrada_orfa(row_e))
+
+    df_resultado = analise_core.montar_resultado(linhas_saida + linhas_orfas)
+    stats = calcular_stats(linhas_saida)
+    metricas.adicionar_tempo('remontagem_incremental', time.perf_counter() - inicio_remontagem)
+    metricas.etapas['remontagem_incremental']['linhas_entrada'] += len(df_saida) + len(df_entrada)
+    metricas.etapas['remontagem_incremental']['linhas_saida'] += len(df_resultado)
+    stats['etapas'] = metricas.resumo()
+
+    novo_ledger = {
+        'versao': LEDGER_VERSAO,
+        'limiar': limiar_similaridade,
+        'saidas': {
+            fp: {'doc': doc, 'linha': linha}
+            for fp, doc, linha in zip(fp_s.values, df_saida['doc_num'].values, linhas_saida)
+        },
+        'entradas': {fp: {'doc': doc} for fp, doc in zip(fp_e.values, df_entrada['doc_num'].values)},
+        'pares': pares_fp,
+        'docs_janela': docs_janela,
+    }
+
+    if progress_callback:
+        progress_callback(1.0, "Concluído!")
+
+    return df_resultado, stats, novo_ledger
@@ -1,18 +1,28 @@
 import pandas as pd
 import os
 import glob
-import pickle
+import json
+import time
 import sys
 from datetime import datetime
 import analise_core
+import analise_incremental
+import resultado_store
+import exportacao
 import download_gmail
+from metricas_analise import MetricasAnalise
 
 # Diretórios
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 INPUT_DIR = os.path.join(BASE_DIR, "dados", "input")
 DATA_DIR = os.path.join(BASE_DIR, "dados")
-RESULT_FILE = os.path.join(DATA_DIR, "resultado_diario.pkl")
-METADATA_FILE = os.path.join(DATA_DIR, "resultado_diario_metadata.json")
+RESULT_FILE = resultado_store.RESULT_FILE
+METADATA_FILE = resultado_store.METADATA_FILE
+LEDGER_FILE = os.path.join(DATA_DIR, "ledger_incremental.pkl")
+METRICS_DIR = os.path.join(DATA_DIR, "metrics")
+METRICS_FILE = os.path.join(METRICS_DIR, "execucoes.jsonl")
+CHECKPOINT_DIR = os.path.join(DATA_DIR, "checkpoints")
+EXPORT_DIR = os.path.join(DATA_DIR, "exportacoes")
 
 def pontuar_arquivo(df, nome_arquivo, termos_saida, termos_entrada):
     """Identifica se é arquivo de saída ou entrada baseado no nome."""
@@ -21,8 +31,19 @@ def pontuar_arquivo(df, nome_arquivo, termos_saida, termos_entrada):
     score_entrada = sum(1 for t in termos_entrada if t in nome_arquivo)
     return score_saida, score_entrada
 
-def executar_fluxo_diario(baixar_email=True):
+def registrar_metricas(registro):
+    """Acrescenta uma linha JSON por execução em dados/metrics/execucoes.jsonl."""
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(METRICS_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+    except Exception as e:
+        print(f"⚠️ Erro ao registrar métricas: {e}")
+
+def executar_fluxo_diario(baixar_email=True, incremental=False, progress_callback=None):
     print(f"=== Iniciando Fluxo Diário: {datetime.now()} ===")
+    inicio_execucao = time.perf_counter()
+    metricas = MetricasAnalise()
     
     # 1. Baixar Arquivos (Etapa 06:30)
     if baixar_email:
@@ -38,7 +59,7 @@ def executar_fluxo_diario(baixar_email=True):
     # 2. Processar Arquivos (Etapa 07:00)
     print(">> Etapa 2: Processando arquivos...")
     
-    arquivos = glob.glob(os.path.join(INPUT_DIR, "*.xls*"))
+    arquivos = sorted(glob.glob(os.path.join(INPUT_DIR, "*.xls*")))
     if len(arquivos) < 2:
         print(f"❌ Número insuficiente de arquivos em {INPUT_DIR}. Encontrados: {len(arquivos)}")
         return False
@@ -65,59 +86,102 @@ def executar_fluxo_diario(baixar_email=True):
         print("❌ Não foi possível identificar pares de Saída/Entrada.")
         return False
 
-    # Consolidação
     print(f"   Identificados: {len(arquivos_saida)} Saída, {len(arquivos_entrada)} Entrada")
     
-    df_saida = pd.concat([df for _, df in arquivos_saida], ignore_index=True)
-    df_entrada = pd.concat([df for _, df in arquivos_entrada], ignore_index=True)
-    
     nome_saida_consol = ", ".join([n for n, _ in arquivos_saida])
     nome_entrada_consol = ", ".join([n for n, _ in arquivos_entrada])
     
-    # Preparação usando o Core
+    # Preparação usando o Core (por arquivo, para mapear as colunas de cada exportação)
     print("   Preparando DataFrames...")
-    df_saida = analise_core.preparar_dataframe(df_saida)
-    df_entrada = analise_core.preparar_dataframe(df_entrada)
+    arquivos_saida = [(n, analise_core.preparar_dataframe(df, metricas)) for n, df in arquivos_saida]
+    arquivos_entrada = [(n, analise_core.preparar_dataframe(df, metricas)) for n, df in arquivos_entrada]
+    
+    # Consolidação com remoção de linhas repetidas entre anexos
+    print("   Consolidando arquivos...")
+    with metricas.medir('consolidacao', sum(len(df) for _, df in arquivos_saida + arquivos_entrada)) as etapa:
+        df_saida = analise_core.consolidar_dataframes(arquivos_saida)
+        df_entrada = analise_core.consolidar_dataframes(arquivos_entrada)
+        etapa['linhas_saida'] += len(df_saida) + len(df_entrada)
     
     # Execução da Análise
     print("   Executando algoritmo de análise...")
     
     def progress_wrapper(p, msg):
         print(f"   [{p*100:.0f}%] {msg}")
+        if progress_callback:
+            progress_callback(p, msg)
         
-    df_resultado, stats = analise_core.analisar_itens(df_saida, df_entrada, progress_callback=progress_wrapper)
+    ledger_novo = None
+    if incremental:
+        print("   Modo incremental: reaproveitando ledger da última execução...")
+        ledger = analise_incremental.carregar_ledger(LEDGER_FILE)
+        df_resultado, stats, ledger_novo = analise_incremental.analisar_incremental(
+            df_saida, df_entrada, ledger, progress_callback=progress_wrapper, metricas=metricas,
+            checkpoint_dir=CHECKPOINT_DIR
+        )
+    else:
+        df_resultado, stats = analise_core.analisar_itens(
+            df_saida, df_entrada, progress_callback=progress_wrapper, metricas=metricas,
+            checkpoint_dir=CHECKPOINT_DIR
+        )
     
     # 3. Salvar Resultados para o Dashboard
     print(">> Etapa 3: Salvando resultados...")
     os.makedirs(DATA_DIR, exist_ok=True)
     
-    # Salva pickle para carregamento rápido no Streamlit
+    # Salva Parquet + metadados JSON para carregamento rápido no Streamlit
     try:
-        with open(RESULT_FILE, 'wb') as f:
-            pickle.dump({
-                'df': df_resultado,
-                'metadata': {
-                    'arquivo_saida': nome_saida_consol,
-                    'arquivo_entrada': nome_entrada_consol,
-                    'data_processamento': datetime.now(),
-                    'stats': stats
-                }
-            }, f)
+        resultado_store.salvar_resultado(df_resultado, {
+            'arquivo_saida': nome_saida_consol,
+            'arquivo_entrada': nome_entrada_consol,
+            'data_processamento': datetime.now(),
+            'stats': stats
+        }, RESULT_FILE, METADATA_FILE)
         print(f"✅ Resultado salvo em: {RESULT_FILE}")
     except Exception as e:
         print(f"❌ Erro ao salvar resultado: {e}")
         return False
+    
+    # Ledger só é gravado depois do resultado, para nunca ficar à frente dele
+    if ledger_novo is not None:
+        try:
+            analise_incremental.salvar_ledger(ledger_novo, LEDGER_FILE)
+        except Exception as e:
+            print(f"⚠️ Erro ao salvar ledger incremental (próxima execução será completa): {e}")
+            if os.path.exists(LEDGER_FILE):
+                os.remove(LEDGER_FILE)
+    
+    # Exportação para sistemas externos (Parquet / Arrow / CSV gzip, por data e unidade de destino)
+    try:
+        arquivos = exportacao.exportar_particionado(df_resultado, EXPORT_DIR, datetime.now().date())
+        print(f"✅ Exportação colunar: {len(arquivos)} arquivo(s) em {EXPORT_DIR}")
+    except Exception as e:
+        print(f"⚠️ Erro na exportação colunar (resultado já salvo): {e}")
         
     # (Opcional) Salvar histórico CSV também
     # analise_3.0.py tem função de salvar histórico, podemos replicar ou importar se quisermos persistência de longo prazo
     
+    registrar_metricas({
+        'data_execucao': datetime.now().isoformat(),
+        'modo': 'incremental' if incremental else 'completo',
+        'arquivo_saida': nome_saida_consol,
+        'arquivo_entrada': nome_entrada_consol,
+        'linhas_saida': len(df_saida),
+        'linhas_entrada': len(df_entrada),
+        'linhas_resultado': len(df_resultado),
+        'tempo_total_s': round(time.perf_counter() - inicio_execucao, 3),
+        'stats': {k: v for k, v in stats.items() if k != 'etapas'},
+        'etapas': stats.get('etapas', {})
+    })
+    
     print("=== Processo Concluído com Sucesso ===")
     return True
 
 if __name__ == "__main__":
     # Se passar argumento "download", baixa. Se passar "no-download", só processa.
+    # "incremental" (em qualquer posição) ativa o modo incremental com ledger.
     do_download = True
     if len(sys.argv) > 1 and sys.argv[1] == "no-download":
         do_download = False
         
-    executar_fluxo_diario(baixar_email=do_download)
+    executar_fluxo_diario(baixar_email=do_download, incremental="incremental" in sys.argv[1:])
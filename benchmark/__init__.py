@@ -0,0 +1 @@
+"""Ferramentas de benchmark do matcher (dados sintéticos, escala e regressão)."""
@@ -0,0 +1,50 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from benchmark import escala
+
+# Uso (na raiz do projeto):
+#   python -m benchmark                       -> 1k e 10k linhas, compara com o baseline
+#   python -m benchmark --tamanhos 1000 100000 1000000
+#   python -m benchmark --salvar-baseline     -> grava o resultado como novo baseline
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escala do analise_core.analisar_itens")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=escala.TAMANHOS_PADRAO)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--via-excel', action='store_true', help="Inclui escrita/leitura das planilhas .xlsx")
+    parser.add_argument('--baseline', default=escala.BASELINE_FILE)
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="Regressão aceita (0.2 = 20%%)")
+    parser.add_argument('--salvar-baseline', action='store_true')
+    args = parser.parse_args()
+
+    resultado = escala.executar_escala(args.tamanhos, seed=args.seed, via_excel=args.via_excel)
+
+    caminho = os.path.join(escala.RESULTADOS_DIR, f"escala_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    escala.salvar_json(resultado, caminho)
+    print(f"✅ Resultado salvo em: {caminho}")
+
+    if args.salvar_baseline:
+        escala.salvar_json(resultado, args.baseline)
+        print(f"✅ Baseline atualizado: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("⚠️ Baseline não encontrado. Rode com --salvar-baseline para criar.")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressoes = escala.comparar_com_baseline(resultado, baseline, args.tolerancia)
+    if regressoes:
+        print("❌ Regressões de performance:")
+        for r in regressoes:
+            print(f"   - {r}")
+        return 1
+    print("✅ Sem regressões em relação ao baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+import pandas as pd
+import analise_core
+from metricas_analise import MetricasAnalise
+from benchmark import gerador_sintetico
+
+# --- Benchmark de Escala do Matcher ---
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline_escala.json")
+RESULTADOS_DIR = os.path.join(BENCH_DIR, "resultados")
+TAMANHOS_PADRAO = [1000, 10000]
+
+def pico_rss_mb():
+    """Pico de memória residente do processo atual em MB (None se indisponível)."""
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta em KB, macOS em bytes
+        return round(pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+def executar_cenario(n_linhas, seed=42, via_excel=False):
+    """Gera os dados, executa preparar_dataframe + analisar_itens e mede o cenário."""
+    metricas = MetricasAnalise()
+    df_saida, df_entrada = gerador_sintetico.gerar_dataframes(n_linhas, seed=seed)
+
+    if via_excel:
+        import tempfile
+        with tempfile.TemporaryDirectory() as pasta:
+            with metricas.medir('escrita_excel', len(df_saida) + len(df_entrada)):
+                caminho_s = os.path.join(pasta, "saida.xlsx")
+                caminho_e = os.path.join(pasta, "entrada.xlsx")
+                df_saida.to_excel(caminho_s, index=False)
+                df_entrada.to_excel(caminho_e, index=False)
+            with metricas.medir('leitura_excel', len(df_saida) + len(df_entrada)):
+                df_saida = pd.read_excel(caminho_s)
+                df_entrada = pd.read_excel(caminho_e)
+
+    inicio = time.perf_counter()
+    df_saida = analise_core.preparar_dataframe(df_saida, metricas)
+    df_entrada = analise_core.preparar_dataframe(df_entrada, metricas)
+    df_resultado, stats = analise_core.analisar_itens(df_saida, df_entrada, metricas=metricas)
+    tempo = time.perf_counter() - inicio
+
+    return {
+        'linhas': n_linhas,
+        'linhas_saida': len(df_saida),
+        'linhas_entrada': len(df_entrada),
+        'linhas_resultado': len(df_resultado),
+        'tempo_s': round(tempo, 3),
+        'linhas_por_s': round(len(df_saida) / tempo, 1) if tempo > 0 else None,
+        'pico_rss_mb': pico_rss_mb(),
+        'stats': {k: v for k, v in stats.items() if k != 'etapas'},
+        'etapas': stats['etapas'],
+    }
+
+def executar_escala(tamanhos=TAMANHOS_PADRAO, seed=42, via_excel=False):
+    """Executa cada tamanho num processo novo (para o pico de RSS não se acumular)."""
+    contexto = multiprocessing.get_context('spawn')
+    cenarios = []
+    for n in tamanhos:
+        print(f"⏱️ Cenário {n} linhas...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+            resultado = executor.submit(executar_cenario, n, seed, via_excel).result()
+        print(f"   {resultado['tempo_s']}s | {resultado['linhas_por_s']} linhas/s | pico {resultado['pico_rss_mb']} MB")
+        cenarios.append(resultado)
+    return {
+        'data_execucao': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'seed': seed,
+        'via_excel': via_excel,
+        'cenarios': cenarios,
+    }
+
+def comparar_com_baseline(resultado, baseline, tolerancia=0.2):
+    """Compara throughput e pico de RSS por tamanho. Retorna lista de regressões (texto)."""
+    regressoes = []
+    base_por_tamanho = {c['linhas']: c for c in baseline.get('cenarios', [])}
+    for cenario in resultado['cenarios']:
+        base = base_por_tamanho.get(cenario['linhas'])
+        if not base:
+            continue
+        if base.get('linhas_por_s') and cenario['linhas_por_s'] is not None:
+            if cenario['linhas_por_s'] < base['linhas_por_s'] * (1 - tolerancia):
+                regressoes.append(
+                    f"{cenario['linhas']} linhas: throughput {cenario['linhas_por_s']} < baseline {base['linhas_por_s']} linhas/s"
+                )
+        if base.get('pico_rss_mb') and cenario['pico_rss_mb'] is not None:
+            if cenario['pico_rss_mb'] > base['pico_rss_mb'] * (1 + tolerancia):
+                regressoes.append(
+                    f"{cenario['linhas']} linhas: pico RSS {cenario['pico_rss_mb']} > baseline {base['pico_rss_mb']} MB"
+                )
+        if base.get('stats') and cenario['stats'] != base['stats']:
+            regressoes.append(f"{cenario['linhas']} linhas: stats diferentes do baseline (resultado mudou)")
+    return regressoes
+
+def salvar_json(dados, caminho):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,188 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+import analise_core
+
+# --- Gerador de Dados Sintéticos ---
+# Gera planilhas de saída/entrada com as mesmas colunas das exportações reais,
+# amostrando as distribuições do resultado de referência (teste_correcao_resultado.csv).
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_REFERENCIA = os.path.join(BASE_DIR, "teste_correcao_resultado.csv")
+
+UNIDADE_CP = "CASA DE PORTUGAL - REDE CASA"
+PADRAO_CONCENTRACAO = r'\d+(?:[,.]\d+)?\s*(?:MG|G|ML|MCG|UI|L|%)\b'
+
+def carregar_perfil(caminho_csv=CSV_REFERENCIA):
+    """Extrai do CSV de referência as distribuições usadas pelo gerador."""
+    df = pd.read_csv(caminho_csv, encoding='utf-8-sig')
+    saidas = df[df['Produto (Saída)'] != '-']
+    orfas = df[df['Observações'] == 'Entrada órfã']
+    recebidas = saidas[saidas['Produto (Entrada)'] != '-']
+
+    modelos = pd.DataFrame({
+        'produto': saidas['Produto (Saída)'].astype(str),
+        'especie': saidas['Espécie'].fillna('').astype(str),
+        'origem': saidas['Unidade Origem'].astype(str),
+        'destino': saidas['Unidade Destino'].astype(str),
+        'qtd': saidas['Qtd Saída'].astype(float),
+        'valor_unit': (saidas['Valor Saída (R$)'] / saidas['Qtd Saída'].replace(0, np.nan)).fillna(1.0),
+    }).reset_index(drop=True)
+
+    concentracoes = saidas['Produto (Saída)'].str.findall(PADRAO_CONCENTRACAO).explode().dropna()
+    tipos = recebidas['Tipo de Divergência'].astype(str)
+
+    return {
+        'modelos': modelos,
+        'concentracoes': concentracoes.str.replace(' ', '').to_numpy(),
+        'itens_por_documento': saidas.groupby('Documento').size().to_numpy(),
+        'taxa_sem_documento': float(saidas['Documento'].isna().mean()),
+        'taxa_nao_recebido': float((saidas['Produto (Entrada)'] == '-').mean()),
+        'taxa_div_qtd': float(tipos.str.contains('Qtd').mean()) if len(tipos) else 0.0,
+        'taxa_div_valor': float(tipos.str.contains('Valor').mean()) if len(tipos) else 0.0,
+        'taxa_agrupado': float(saidas['Observações'].str.contains('Agrupado', na=False).mean()),
+        'taxa_agregado': float(saidas['Observações'].str.contains('Agregado', na=False).mean()),
+        'taxa_orfas': len(orfas) / max(len(saidas), 1),
+        'taxa_orfas_sem_documento': float(orfas['Documento'].isna().mean()) if len(orfas) else 0.0,
+        'taxa_cp': float(saidas['Unidade Destino'].apply(analise_core.eh_casa_portugal).mean()),
+    }
+
+def _variantes_descricao(rng, descricoes, concentracoes, quantidade):
+    """Cria descrições novas trocando a concentração (ou acrescentando uma) em descrições reais."""
+    base = rng.choice(descricoes, size=quantidade)
+    novas_conc = rng.choice(concentracoes, size=quantidade) if len(concentracoes) else np.array(['10MG'] * quantidade)
+    variantes = []
+    for desc, conc in zip(base, novas_conc):
+        if re.search(PADRAO_CONCENTRACAO, desc):
+            variantes.append(re.sub(PADRAO_CONCENTRACAO, conc, desc, count=1))
+        else:
+            variantes.append(f"{desc} {conc}")
+    return np.array(variantes, dtype=object)
+
+def gerar_dataframes(n_linhas, seed=42, perfil=None, dias=7, taxa_variante=0.3, taxa_cp=None):
+    """
+    Gera (df_saida, df_entrada) brutos, no formato das planilhas exportadas.
+    n_linhas: número de linhas de saída. taxa_cp sobrescreve a fração de destinos Casa de Portugal.
+    """
+    if perfil is None:
+        perfil = carregar_perfil()
+    rng = np.random.default_rng(seed)
+    modelos = perfil['modelos']
+
+    # Itens de saída a partir de linhas reais
+    base = modelos.iloc[rng.integers(len(modelos), size=n_linhas)].reset_index(drop=True)
+    produtos = base['produto'].to_numpy(dtype=object).copy()
+    usa_variante = rng.random(n_linhas) < taxa_variante
+    if usa_variante.any():
+        pool = _variantes_descricao(rng, modelos['produto'].unique(), perfil['concentracoes'], max(n_linhas // 15, 10))
+        produtos[usa_variante] = rng.choice(pool, size=int(usa_variante.sum()))
+
+    destinos = base['destino'].to_numpy(dtype=object).copy()
+    if taxa_cp is not None:
+        eh_cp = np.array([analise_core.eh_casa_portugal(d) for d in destinos])
+        nao_cp = modelos.loc[~modelos['destino'].apply(analise_core.eh_casa_portugal), 'destino'].to_numpy()
+        sorteio_cp = rng.random(n_linhas) < taxa_cp
+        destinos[sorteio_cp] = UNIDADE_CP
+        trocar = ~sorteio_cp & eh_cp
+        destinos[trocar] = rng.choice(nao_cp, size=int(trocar.sum()))
+
+    # Documentos: reaproveitamento segundo a distribuição de itens por documento
+    tamanhos = rng.choice(perfil['itens_por_documento'], size=n_linhas)
+    tamanhos = tamanhos[:np.searchsorted(np.cumsum(tamanhos), n_linhas) + 1]
+    documentos = np.repeat(5_000_000 + np.arange(len(tamanhos)), tamanhos)[:n_linhas].astype(str).astype(object)
+    documentos[rng.random(n_linhas) < perfil['taxa_sem_documento']] = ""
+
+    inicio = pd.Timestamp("2025-12-01")
+    datas = inicio + pd.to_timedelta(rng.integers(0, dias * 24 * 60, size=n_linhas), unit='m')
+    qtds = base['qtd'].to_numpy()
+    valores = np.round(qtds * base['valor_unit'].to_numpy(), 2)
+
+    df_saida = pd.DataFrame({
+        'Data': datas.normalize(),
+        'Hora': datas.strftime('%H:%M:%S'),
+        'Documento': documentos,
+        'Produto': produtos,
+        'Unidade Origem': base['origem'].to_numpy(),
+        'Unidade Destino': destinos,
+        'Quantidade': qtds,
+        'Valor Total': valores,
+        'Espécie': base['especie'].to_numpy(),
+    })
+
+    # Linhas divididas na saída (várias saídas somadas batem com uma entrada)
+    sorteio = rng.random(n_linhas)
+    agrupado = (sorteio < perfil['taxa_agrupado']) & (qtds >= 2) & (documentos != "")
+    agregado = (sorteio >= perfil['taxa_agrupado']) & (sorteio < perfil['taxa_agrupado'] + perfil['taxa_agregado']) & (qtds >= 2)
+    if agrupado.any():
+        metade = np.floor(qtds[agrupado] / 2)
+        extras = df_saida[agrupado].copy()
+        extras['Quantidade'] = qtds[agrupado] - metade
+        df_saida.loc[agrupado, 'Quantidade'] = metade
+        df_saida = pd.concat([df_saida, extras]).sort_index(kind='stable').reset_index(drop=True)
+    recebido = rng.random(n_linhas) >= perfil['taxa_nao_recebido']
+
+    # Entradas correspondentes (uma por item de saída original)
+    entradas = pd.DataFrame({
+        'Documento': documentos,
+        'Produto': produtos,
+        'Unidade Origem': base['origem'].to_numpy(),
+        'Unidade Destino': destinos,
+        'Quantidade': qtds.astype(float),
+        'Valor Total': valores,
+        'Espécie': base['especie'].to_numpy(),
+    })
+    datas_e = datas + pd.to_timedelta(rng.exponential(24 * 60, size=n_linhas).astype(int), unit='m')
+    entradas.insert(0, 'Data', datas_e.normalize())
+    entradas.insert(1, 'Hora', datas_e.strftime('%H:%M:%S'))
+
+    div_qtd = rng.random(n_linhas) < perfil['taxa_div_qtd']
+    entradas.loc[div_qtd, 'Quantidade'] = np.maximum(qtds[div_qtd] - np.ceil(qtds[div_qtd] * 0.1), 0)
+    div_valor = rng.random(n_linhas) < perfil['taxa_div_valor']
+    entradas.loc[div_valor, 'Valor Total'] = np.round(valores[div_valor] * 1.2 + 15, 2)
+    sufixo = rng.random(n_linhas) < 0.1
+    entradas.loc[sufixo, 'Produto'] = entradas.loc[sufixo, 'Produto'] + " (*.*)"
+    entradas = entradas[recebido]
+
+    # Linhas divididas na entrada (um item de saída recebido em duas linhas)
+    dividir = agregado[recebido]
+    if dividir.any():
+        partes = entradas[dividir].copy()
+        metade = np.floor(partes['Quantidade'] / 2)
+        partes['Quantidade'] = partes['Quantidade'] - metade
+        partes['Valor Total'] = np.round(partes['Valor Total'] / 2, 2)
+        entradas.loc[entradas.index[dividir], 'Quantidade'] = metade.to_numpy()
+        entradas.loc[entradas.index[dividir], 'Valor Total'] = partes['Valor Total'].to_numpy()
+        entradas = pd.concat([entradas, partes]).sort_index(kind='stable')
+
+    # Entradas órfãs (recebidas sem saída)
+    n_orfas = int(round(n_linhas * perfil['taxa_orfas']))
+    if n_orfas:
+        base_o = modelos.iloc[rng.integers(len(modelos), size=n_orfas)].reset_index(drop=True)
+        datas_o = inicio + pd.to_timedelta(rng.integers(0, dias * 24 * 60, size=n_orfas), unit='m')
+        docs_o = (9_000_000 + rng.integers(0, max(n_orfas, 1) * 10, size=n_orfas)).astype(str).astype(object)
+        docs_o[rng.random(n_orfas) < perfil['taxa_orfas_sem_documento']] = ""
+        orfas = pd.DataFrame({
+            'Data': datas_o.normalize(),
+            'Hora': datas_o.strftime('%H:%M:%S'),
+            'Documento': docs_o,
+            'Produto': base_o['produto'].to_numpy(),
+            'Unidade Origem': base_o['origem'].to_numpy(),
+            'Unidade Destino': base_o['destino'].to_numpy(),
+            'Quantidade': base_o['qtd'].to_numpy(),
+            'Valor Total': np.round(base_o['qtd'].to_numpy() * base_o['valor_unit'].to_numpy(), 2),
+            'Espécie': base_o['especie'].to_numpy(),
+        })
+        entradas = pd.concat([entradas, orfas])
+
+    return df_saida.reset_index(drop=True), entradas.reset_index(drop=True)
+
+def gerar_workbooks(n_linhas, pasta, seed=42, perfil=None, **kwargs):
+    """Grava as planilhas sintéticas com nomes reconhecidos pelo auto_analise. Retorna os caminhos."""
+    df_saida, df_entrada = gerar_dataframes(n_linhas, seed=seed, perfil=perfil, **kwargs)
+    os.makedirs(pasta, exist_ok=True)
+    caminho_saida = os.path.join(pasta, f"emprestimo_concedido_sintetico_{n_linhas}.xlsx")
+    caminho_entrada = os.path.join(pasta, f"emprestimo_recebido_sintetico_{n_linhas}.xlsx")
+    df_saida.to_excel(caminho_saida, index=False)
+    df_entrada.to_excel(caminho_entrada, index=False)
+    return caminho_saida, caminho_entrada
@@ -0,0 +1,80 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+import analise_core
+import graficos_cache
+from benchmark import gerador_sintetico
+
+# Latência de rerun do dashboard (streamlit_app.py) com e sem o cache de figuras.
+# Uso (na raiz do projeto):
+#   python -m benchmark.graficos                    -> 5k linhas, 20 reruns por modo
+#   python -m benchmark.graficos --linhas 50000 --reruns 50
+# Os reruns usam os mesmos filtros (agregados iguais), o caso que o cache atende.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(BASE_DIR, "streamlit_app.py")
+
+def gerar_resultado(n_linhas, seed=42):
+    df_saida, df_entrada = gerador_sintetico.gerar_dataframes(n_linhas, seed=seed)
+    df_saida = analise_core.preparar_dataframe(df_saida)
+    df_entrada = analise_core.preparar_dataframe(df_entrada)
+    df_resultado, _ = analise_core.analisar_itens(df_saida, df_entrada)
+    return df_resultado
+
+def medir_reruns(df_resultado, reruns, cache_ativo):
+    """Tempos (s) de cada rerun completo do app, após uma execução de aquecimento."""
+    from streamlit.testing.v1 import AppTest
+    graficos_cache.ATIVO = cache_ativo
+    graficos_cache._cache.clear()
+    at = AppTest.from_file(APP, default_timeout=300)
+    at.session_state.df_resultado = df_resultado
+    at.session_state.cubo = None
+    at.session_state.resultado_versao = f"benchmark-{cache_ativo}"
+    at.session_state.current_metadata = None
+    at.session_state.job_id = None
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    tempos = []
+    for _ in range(reruns):
+        inicio = time.perf_counter()
+        at.run()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+def resumo(tempos):
+    ordenados = sorted(tempos)
+    return {
+        'mediana_ms': round(statistics.median(ordenados) * 1000, 1),
+        'p90_ms': round(ordenados[int(0.9 * (len(ordenados) - 1))] * 1000, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Rerun do dashboard com e sem cache de figuras")
+    parser.add_argument('--linhas', type=int, default=5000)
+    parser.add_argument('--reruns', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    os.chdir(BASE_DIR)
+    print(f">> Gerando resultado sintético ({args.linhas} linhas)...")
+    df_resultado = gerar_resultado(args.linhas, args.seed)
+
+    resultados = {}
+    for cache_ativo in (False, True):
+        modo = "com cache" if cache_ativo else "sem cache"
+        print(f">> {args.reruns} reruns {modo}...")
+        resultados[modo] = resumo(medir_reruns(df_resultado, args.reruns, cache_ativo))
+    graficos_cache.ATIVO = True
+
+    print(f"\n{'Modo':<12}{'Mediana (ms)':>14}{'p90 (ms)':>12}")
+    for modo, r in resultados.items():
+        print(f"{modo:<12}{r['mediana_ms']:>14}{r['p90_ms']:>12}")
+    ganho = resultados['sem cache']['mediana_ms'] - resultados['com cache']['mediana_ms']
+    print(f"\nDiferença na mediana: {ganho:.1f} ms por rerun")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
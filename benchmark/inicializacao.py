@@ -0,0 +1,91 @@
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+# Tempo de inicialização dos apps Streamlit (até a primeira tela: login no
+# analise_3.0, upload no streamlit_app), cada medição num processo novo.
+# Uso (na raiz do projeto):
+#   python -m benchmark.inicializacao                        -> os dois apps, 3 repetições
+#   python -m benchmark.inicializacao --apps analise_3.0.py --repeticoes 5 --top 15
+# Duas medidas por app:
+#   - imports: `python -X importtime` sobre os imports de topo do script, com o
+#     resumo dos pacotes que mais pesam (tempo cumulativo, já incluindo dependências);
+#   - primeira tela: execução do script (AppTest) sem sessão logada.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPS = ["analise_3.0.py", "streamlit_app.py"]
+
+_PRIMEIRA_TELA = """
+import sys, time
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=300)
+at.run()
+if at.exception:
+    raise SystemExit(at.exception[0].value)
+print(time.perf_counter() - inicio)
+"""
+
+def imports_de_topo(app):
+    """Código com os imports de nível de módulo do script (os de dentro de funções ficam de fora)."""
+    with open(os.path.join(BASE_DIR, app), 'r', encoding='utf-8') as f:
+        arvore = ast.parse(f.read())
+    return "\n".join(ast.unparse(n) for n in arvore.body if isinstance(n, (ast.Import, ast.ImportFrom)))
+
+def medir_imports(codigo):
+    """{pacote de topo: ms cumulativos} lido da saída do -X importtime (primeira importação de cada um)."""
+    saida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    pacotes = {}
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, cumulativo, nome = linha[len("import time:"):].split("|")
+        if not nome.startswith(" ") or nome.startswith("  "):
+            continue  # só o nível de topo (as dependências já entram no cumulativo)
+        pacotes[nome.strip()] = int(cumulativo) / 1000
+    return pacotes
+
+def medir_primeira_tela(app):
+    saida = subprocess.run(
+        [sys.executable, "-c", _PRIMEIRA_TELA, app],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return float(saida.strip().splitlines()[-1]) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de inicialização dos apps Streamlit")
+    parser.add_argument('--apps', nargs='+', default=APPS)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10, help="Pacotes mais pesados listados por app")
+    args = parser.parse_args()
+
+    inicio_interpretador = set(medir_imports("pass"))  # site, encodings...: fora da conta dos apps
+    resumo = {}
+    for app in args.apps:
+        print(f">> {app}: {args.repeticoes} medição(ões) em processos novos...")
+        codigo = imports_de_topo(app)
+        medicoes = [medir_imports(codigo) for _ in range(args.repeticoes)]
+        pacotes = {
+            p: statistics.median(m.get(p, 0.0) for m in medicoes) for p in medicoes[0] if p not in inicio_interpretador
+        }
+        telas = [medir_primeira_tela(app) for _ in range(args.repeticoes)]
+        resumo[app] = (sum(pacotes.values()), statistics.median(telas))
+
+        print(f"\n   {'Pacote':<32}{'Cumulativo (ms)':>16}")
+        for nome, ms in sorted(pacotes.items(), key=lambda x: -x[1])[:args.top]:
+            print(f"   {nome:<32}{ms:>16.1f}")
+        print()
+
+    print(f"{'App':<20}{'Imports (ms)':>14}{'Primeira tela (ms)':>20}")
+    for app, (imports_ms, tela_ms) in resumo.items():
+        print(f"{app:<20}{imports_ms:>14.1f}{tela_ms:>20.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
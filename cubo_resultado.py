@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import analise_core
+
+# --- Cubo Diário do Resultado ---
+# Agregado compacto (dia × origem × destino × espécie × status × tipo de divergência)
+# gerado junto com o resultado. KPIs e gráficos do dashboard são calculados sobre ele,
+# então mudar um filtro custa o mesmo com mil ou com um milhão de linhas.
+# Os filtros do dashboard (status, unidade, período, unidade do usuário) são todos
+# dimensões do cubo; só a tabela detalhada e a exportação precisam das linhas.
+
+DIMENSOES = ['dia', 'Unidade Origem', 'Unidade Destino', 'Espécie', 'Status', 'Código Status', 'Tipo de Divergência']
+
+MEDIDAS = [
+    'itens', 'valor_saida', 'valor_entrada', 'valor_entrada_com_saida', 'diferenca_abs',
+    'qtd_saida', 'qtd_entrada', 'qtd_divergente', 'entradas_anteriores', 'tempo_soma', 'tempo_n'
+]
+
+def _dias(df):
+    """Data do item (dia local, sem fuso). Usa Data_Obj quando 'Data' já virou texto."""
+    datas = df['Data_Obj'] if 'Data_Obj' in df.columns else pd.to_datetime(df['Data'], errors='coerce')
+    if getattr(datas.dt, 'tz', None) is not None:
+        datas = datas.dt.tz_localize(None)
+    return datas.dt.normalize()
+
+def _numerica(df, coluna):
+    if coluna not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[coluna], errors='coerce')
+
+def construir_cubo(df_resultado):
+    """Agrega o resultado por dia e dimensões. Colunas ausentes (ex: Tempo) viram medidas zeradas."""
+    df_resultado = analise_core.adicionar_codigos_status(df_resultado)
+    valor_saida = _numerica(df_resultado, 'Valor Saída (R$)')
+    valor_entrada = _numerica(df_resultado, 'Valor Entrada (R$)')
+    diferenca_qtd = _numerica(df_resultado, 'Diferença Qtd')
+    tempo = _numerica(df_resultado, 'Tempo Recebimento (Horas)')
+    tempo_valido = tempo.notna() & (tempo >= 0)
+
+    base = pd.DataFrame({'dia': _dias(df_resultado)}, index=df_resultado.index)
+    for dim in DIMENSOES[1:]:
+        base[dim] = df_resultado[dim] if dim in df_resultado.columns else None
+    base['itens'] = 1
+    base['valor_saida'] = valor_saida.fillna(0)
+    base['valor_entrada'] = valor_entrada.fillna(0)
+    base['valor_entrada_com_saida'] = valor_entrada.where(valor_saida.notna(), 0).fillna(0)
+    base['diferenca_abs'] = _numerica(df_resultado, 'Diferença (R$)').abs().fillna(0)
+    base['qtd_saida'] = _numerica(df_resultado, 'Qtd Saída').fillna(0)
+    base['qtd_entrada'] = _numerica(df_resultado, 'Qtd Entrada').fillna(0)
+    base['qtd_divergente'] = (diferenca_qtd.notna() & (diferenca_qtd != 0)).astype(int)
+    base['entradas_anteriores'] = (tempo.notna() & (tempo < 0)).astype(int)
+    base['tempo_soma'] = tempo.where(tempo_valido, 0)
+    base['tempo_n'] = tempo_valido.astype(int)
+
+    return base.groupby(DIMENSOES, dropna=False, sort=False, observed=True)[MEDIDAS].sum().reset_index()
+
+def filtrar(cubo, status=None, unidades=None, data_inicio=None, data_fim=None, unidade_destino=None):
+    """Mesmos filtros do dashboard, aplicados às linhas do cubo. Datas são `date` (inclusive)."""
+    mask = np.ones(len(cubo), dtype=bool)
+    if status is not None:
+        mask = mask & cubo['Status'].isin(status).to_numpy()
+    if unidades:
+        mask = mask & (cubo['Unidade Origem'].isin(unidades) | cubo['Unidade Destino'].isin(unidades)).to_numpy()
+    if unidade_destino:
+        mask = mask & (cubo['Unidade Destino'] == unidade_destino).to_numpy()
+    if data_inicio is not None:
+        mask = mask & (cubo['dia'] >= pd.Timestamp(data_inicio)).to_numpy()
+    if data_fim is not None:
+        mask = mask & (cubo['dia'] <= pd.Timestamp(data_fim)).to_numpy()
+    return cubo[mask]
+
+def _com_codigo(cubo, codigos):
+    return np.isin(cubo['Código Status'].to_numpy(), codigos)
+
+def indicadores(cubo):
+    """Totais do balanço financeiro e KPIs operacionais do recorte."""
+    nao_conforme = _com_codigo(cubo, analise_core.STATUS_NAO_CONFORMES)
+    nao_recebido = _com_codigo(cubo, [analise_core.STATUS_NAO_RECEBIDO])
+    conforme = _com_codigo(cubo, [analise_core.STATUS_CONFORME])
+    tempo_n = cubo['tempo_n'][~nao_recebido].sum()
+    return {
+        'total_itens': int(cubo['itens'].sum()),
+        'conformes': int(cubo['itens'][conforme].sum()),
+        'nao_conformes': int(cubo['itens'][nao_conforme].sum()),
+        'pendentes': int(cubo['itens'][nao_recebido].sum()),
+        'valor_saida': float(cubo['valor_saida'].sum()),
+        'valor_entrada': float(cubo['valor_entrada'].sum()),
+        'valor_entrada_com_saida': float(cubo['valor_entrada_com_saida'].sum()),
+        'valor_pendente': float(cubo['valor_saida'][nao_recebido].sum()),
+        'valor_divergente': float(cubo['diferenca_abs'][nao_conforme].sum()),
+        'qtd_divergente': int(cubo['qtd_divergente'].sum()),
+        'entradas_anteriores': int(cubo['entradas_anteriores'].sum()),
+        'tempo_medio': cubo['tempo_soma'][~nao_recebido].sum() / tempo_n if tempo_n else np.nan,
+    }
+
+def contagem_por(cubo, coluna, codigos=None):
+    """Itens por valor da coluna (maiores primeiro), como value_counts nas linhas. `codigos` filtra o status."""
+    if codigos is not None:
+        cubo = cubo[_com_codigo(cubo, codigos)]
+    contagem = cubo.groupby(coluna, sort=False, observed=True)['itens'].sum()
+    return contagem[contagem > 0].sort_values(ascending=False, kind='stable')
+
+def top_unidades(cubo, codigos, colunas=('Unidade Destino',), n=5):
+    """Unidades com mais itens nos códigos de status; com duas colunas soma origem e destino."""
+    contagens = [contagem_por(cubo, c, codigos) for c in colunas]
+    total = pd.concat(contagens).groupby(level=0).sum() if len(contagens) > 1 else contagens[0]
+    return total.sort_values(ascending=False, kind='stable').head(n)
+
+def evolucao_temporal(cubo):
+    """Itens por dia e status (DataFrame dia, Status, Quantidade)."""
+    temporal = cubo.groupby(['dia', 'Status'], observed=True)['itens'].sum().reset_index(name='Quantidade')
+    temporal['dia'] = temporal['dia'].dt.date
+    return temporal
+
+# --- Tabelas de Dimensão ---
+# Opções dos filtros do dashboard (status, unidades, espécies, período), calculadas
+# uma vez a partir do cubo quando o resultado é gravado. Ficam nos metadados do
+# resultado, no total e por unidade de destino (recorte dos usuários de unidade).
+
+def _valores(serie):
+    return serie.dropna().unique().tolist()
+
+def dimensoes(cubo):
+    """{status (ordem de aparição), unidades (origem ∪ destino, ordenadas), especies, data_min, data_max}."""
+    dias = cubo['dia'].dropna()
+    return {
+        'status': [str(s) for s in _valores(cubo['Status'])],
+        'unidades': sorted(set(_valores(cubo['Unidade Origem'])) | set(_valores(cubo['Unidade Destino']))),
+        'especies': sorted(str(e) for e in _valores(cubo['Espécie'])),
+        'data_min': dias.min().date() if not dias.empty else None,
+        'data_max': dias.max().date() if not dias.empty else None,
+    }
+
+def dimensoes_por_unidade(cubo):
+    """dimensoes() de cada recorte por Unidade Destino."""
+    return {str(u): dimensoes(parte) for u, parte in cubo.groupby('Unidade Destino', sort=True, observed=True)}
+
+def codificar_unidades(df, unidades):
+    """Unidade Origem/Destino como categóricas com as mesmas categorias (a tabela de unidades):
+    filtros por unidade viram comparação de códigos inteiros. Valores fora da tabela viram
+    categorias extras, nunca NaN: a codificação não altera os dados."""
+    colunas = [c for c in ('Unidade Origem', 'Unidade Destino') if c in df.columns]
+    extras = set()
+    for c in colunas:
+        extras.update(_valores(df[c]))
+    categorias = pd.CategoricalDtype(list(unidades) + sorted(extras - set(unidades), key=str))
+    return df.assign(**{c: df[c].astype(categorias) for c in colunas})
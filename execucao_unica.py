@@ -0,0 +1,123 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import auto_analise
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- Execução Única do Fluxo Diário (Single-Flight) ---
+# Várias sessões do dashboard (e o agendador) podem pedir a atualização ao mesmo
+# tempo. Só o primeiro chamador roda o fluxo; os demais acompanham o progresso pelo
+# arquivo de status e reaproveitam o resultado gravado por ele.
+# A trava é do sistema operacional (flock/msvcrt): se o processo morrer no meio,
+# ela é liberada sozinha e o próximo chamador assume.
+
+LOCK_FILE = os.path.join(auto_analise.DATA_DIR, "execucao.lock")
+STATUS_FILE = os.path.join(auto_analise.DATA_DIR, "execucao_status.json")
+INTERVALO_STATUS = 1.0  # segundos entre gravações de progresso
+
+def _tentar_travar(f):
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+def _destravar(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def _trava():
+    """Abre o arquivo de trava e tenta obtê-la sem bloquear. Produz True se obteve."""
+    os.makedirs(os.path.dirname(LOCK_FILE), exist_ok=True)
+    with open(LOCK_FILE, 'a+') as f:
+        obtida = _tentar_travar(f)
+        try:
+            yield obtida
+        finally:
+            if obtida:
+                _destravar(f)
+
+def em_execucao():
+    """True se algum processo/sessão está rodando o fluxo agora."""
+    with _trava() as obtida:
+        return not obtida
+
+def ler_status():
+    """Último status gravado ({} se nunca rodou)."""
+    try:
+        with open(STATUS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _gravar_status(status):
+    tmp = STATUS_FILE + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(status, f, ensure_ascii=False, default=str)
+    os.replace(tmp, STATUS_FILE)
+
+def executar_fluxo_unico(baixar_email=True, incremental=False, ao_aguardar=None, intervalo_espera=1.0,
+                         progress_callback=None):
+    """
+    Roda auto_analise.executar_fluxo_diario, a menos que outra execução já esteja em curso;
+    nesse caso espera por ela (chamando ao_aguardar(status) a cada consulta) e usa o resultado dela.
+    progress_callback(p, msg) recebe o progresso da execução rodada aqui.
+    Retorna (sucesso, executou_aqui).
+    """
+    with _trava() as obtida:
+        if obtida:
+            status = {
+                'estado': 'executando', 'pid': os.getpid(),
+                'inicio': datetime.now().isoformat(), 'fim': None,
+                'progresso': 0.0, 'mensagem': "Iniciando...", 'sucesso': None
+            }
+            _gravar_status(status)
+            ultima_gravacao = [time.monotonic()]
+
+            def progresso(p, msg):
+                status['progresso'], status['mensagem'] = p, msg
+                if progress_callback:
+                    progress_callback(p, msg)
+                if time.monotonic() - ultima_gravacao[0] >= INTERVALO_STATUS:
+                    _gravar_status(status)
+                    ultima_gravacao[0] = time.monotonic()
+
+            sucesso = False
+            try:
+                sucesso = bool(auto_analise.executar_fluxo_diario(
+                    baixar_email=baixar_email, incremental=incremental, progress_callback=progresso
+                ))
+                status['mensagem'] = "Concluído" if sucesso else "Falha na execução"
+            except Exception as e:
+                status['mensagem'] = f"Erro: {e}"
+                raise
+            finally:
+                status.update({
+                    'estado': 'concluido' if sucesso else 'erro', 'fim': datetime.now().isoformat(),
+                    'progresso': 1.0 if sucesso else status['progresso'], 'sucesso': sucesso
+                })
+                _gravar_status(status)
+            return sucesso, True
+
+    # Outra sessão está rodando: acompanha até a trava ser liberada
+    print("⏳ Atualização já em andamento em outra sessão. Aguardando...")
+    while em_execucao():
+        if ao_aguardar:
+            ao_aguardar(ler_status())
+        time.sleep(intervalo_espera)
+    return bool(ler_status().get('sucesso')), False
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from urllib.parse import quote
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import xlsxwriter
+import analise_core
+
+# --- Exportação dos Resultados ---
+# O Excel só é gerado quando alguém pede o download (o dashboard passa uma função
+# ao st.download_button) e fica em cache em disco, chaveado pela versão do resultado
+# e pelo estado dos filtros: o mesmo recorte pedido de novo (por qualquer sessão)
+# reaproveita o arquivo.
+# A planilha é escrita linha a linha no modo constant_memory do xlsxwriter, direto
+# para um arquivo temporário, sem montar o workbook inteiro em memória.
+# Para sistemas externos (BI) há também Parquet, Arrow IPC e CSV gzip, sempre com o
+# mesmo esquema tipado (ESQUEMA), e a gravação particionada por data da análise e
+# unidade de destino usada pelo auto_analise.
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "analise_exportacoes")
+MAX_ARQUIVOS = 20
+LINHAS_POR_LOTE = 5000
+FORMATO_DATA = 'dd/mm/yyyy hh:mm:ss'
+
+def chave_exportacao(versao_resultado, **filtros):
+    """Hash da versão do resultado + estado dos filtros (inclua a unidade do usuário, se houver RLS)."""
+    estado = json.dumps({'versao': versao_resultado, **filtros}, sort_keys=True, default=str)
+    return hashlib.sha1(estado.encode('utf-8')).hexdigest()[:20]
+
+def _colunas_exportadas(df):
+    return [c for c in df.columns if c != 'Data_Obj' and c not in analise_core.COLUNAS_CODIGOS]
+
+def _valores_coluna(serie):
+    """Lista de valores Python prontos para o xlsxwriter (datas sem fuso, nulos como None)."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        if getattr(serie.dt, 'tz', None) is not None:
+            serie = serie.dt.tz_localize(None)
+        return [None if pd.isna(v) else v.to_pydatetime() for v in serie]
+    valores = serie.astype(object)
+    return valores.where(serie.notna(), None).tolist()
+
+def _escrever_aba(workbook, nome, df, colunas, formato_data):
+    ws = workbook.add_worksheet(nome)
+    ws.write_row(0, 0, colunas)
+    linha = 1
+    for inicio in range(0, len(df), LINHAS_POR_LOTE):
+        lote = df.iloc[inicio:inicio + LINHAS_POR_LOTE]
+        valores = [_valores_coluna(lote[c]) for c in colunas]
+        for registro in zip(*valores):
+            for col, v in enumerate(registro):
+                if v is None:
+                    continue
+                if hasattr(v, 'year'):
+                    ws.write_datetime(linha, col, v, formato_data)
+                else:
+                    ws.write(linha, col, v)
+            linha += 1
+
+def gerar_excel(df, caminho):
+    """Grava as abas Análise Completa / Não Conformes / Conformes (separadas pelo código de status)."""
+    df = analise_core.adicionar_codigos_status(df)
+    colunas = _colunas_exportadas(df)
+    codigos = df['Código Status']
+    workbook = xlsxwriter.Workbook(caminho, {'constant_memory': True, 'tmpdir': CACHE_DIR, 'nan_inf_to_errors': True})
+    formato_data = workbook.add_format({'num_format': FORMATO_DATA})
+    try:
+        _escrever_aba(workbook, "Análise Completa", df, colunas, formato_data)
+        _escrever_aba(workbook, "Não Conformes", df[codigos.isin(analise_core.STATUS_NAO_CONFORMES)], colunas, formato_data)
+        _escrever_aba(workbook, "Conformes", df[codigos == analise_core.STATUS_CONFORME], colunas, formato_data)
+    finally:
+        workbook.close()
+
+# --- Formatos Colunares ---
+
+FORMATOS = {'parquet': '.parquet', 'arrow': '.arrow', 'csv.gz': '.csv.gz'}
+MIMES = {
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    'parquet': "application/vnd.apache.parquet",
+    'arrow': "application/vnd.apache.arrow.file",
+    'csv.gz': "application/gzip",
+}
+VERSAO_ESQUEMA = 1
+
+_TEXTO, _VALOR, _DATA = pa.string(), pa.float64(), pa.timestamp('us')
+
+# Esquema fixo: colunas ausentes no resultado (ex: Tempo no streamlit_app) saem nulas
+ESQUEMA = pa.schema([
+    ('data_analise', pa.date32()),
+    ('Data', _DATA), ('Unidade Origem', _TEXTO), ('Unidade Destino', _TEXTO), ('Documento', _TEXTO),
+    ('Produto (Saída)', _TEXTO), ('Produto (Entrada)', _TEXTO), ('Espécie', _TEXTO),
+    ('Valor Saída (R$)', _VALOR), ('Valor Entrada (R$)', _VALOR), ('Diferença (R$)', _VALOR),
+    ('Qtd Saída', _VALOR), ('Qtd Entrada', _VALOR), ('Diferença Qtd', _VALOR),
+    ('Data Entrada', _DATA), ('Tempo Recebimento (Horas)', _VALOR),
+    ('Status', _TEXTO), ('Tipo de Divergência', _TEXTO), ('Código Status', pa.int8()), ('Flags Divergência', pa.int8()),
+    ('Qualidade Match', _TEXTO), ('Observações', _TEXTO), ('Detalhes Produto', _TEXTO),
+], metadata={'versao_esquema': str(VERSAO_ESQUEMA)})
+
+def _coluna_arrow(serie, tipo):
+    if tipo == _DATA:
+        datas = pd.to_datetime(serie, errors='coerce')
+        if getattr(datas.dt, 'tz', None) is not None:
+            datas = datas.dt.tz_localize(None)
+        return pa.array(datas, type=pa.timestamp('ns'), from_pandas=True).cast(tipo, safe=False)
+    if tipo == _VALOR:
+        return pa.array(pd.to_numeric(serie, errors='coerce'), type=tipo, from_pandas=True)
+    if tipo == _TEXTO:
+        return pa.array(serie.astype('string'), type=tipo, from_pandas=True)
+    return pa.array(serie, type=tipo, from_pandas=True)
+
+def tabela_exportacao(df, data_analise):
+    """Resultado convertido para o ESQUEMA de exportação (data_analise: date da execução)."""
+    df = analise_core.adicionar_codigos_status(df)
+    if 'Data_Obj' in df.columns:  # analise_3.0 guarda a data original em Data_Obj
+        df = df.assign(Data=df['Data_Obj'])
+    colunas = []
+    for campo in ESQUEMA:
+        if campo.name == 'data_analise':
+            colunas.append(pa.array([data_analise] * len(df), type=campo.type))
+        elif campo.name in df.columns:
+            colunas.append(_coluna_arrow(df[campo.name], campo.type))
+        else:
+            colunas.append(pa.nulls(len(df), type=campo.type))
+    return pa.Table.from_arrays(colunas, schema=ESQUEMA)
+
+def escrever_tabela(tabela, caminho, formato):
+    """Grava a tabela em parquet, arrow (IPC em arquivo) ou csv.gz."""
+    if formato == 'parquet':
+        pq.write_table(tabela, caminho, compression='zstd')
+    elif formato == 'arrow':
+        with pa.OSFile(caminho, 'wb') as sink, pa.ipc.new_file(sink, tabela.schema) as writer:
+            writer.write_table(tabela)
+    elif formato == 'csv.gz':
+        with pa.CompressedOutputStream(caminho, 'gzip') as sink:
+            pacsv.write_csv(tabela, sink)
+    else:
+        raise ValueError(f"Formato de exportação inválido: {formato}")
+
+def exportar_particionado(df, destino, data_analise, formatos=tuple(FORMATOS)):
+    """
+    Grava {destino}/{formato}/data_analise=AAAA-MM-DD/unidade_destino=.../parte-0.ext (partições estilo Hive).
+    Reexportar a mesma data substitui a partição inteira dessa data. Retorna os arquivos gravados.
+    """
+    tabela = tabela_exportacao(df, data_analise).drop_columns(['data_analise'])
+    unidades = df['Unidade Destino'].astype(str).to_numpy() if 'Unidade Destino' in df.columns else None
+    grupos = pd.Series(range(len(df))).groupby(unidades if unidades is not None else [''] * len(df)).indices
+    gravados = []
+    for formato in formatos:
+        particao = os.path.join(destino, formato.replace('.', '_'), f"data_analise={data_analise.isoformat()}")
+        tmp = particao + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        for unidade, posicoes in grupos.items():
+            pasta = os.path.join(tmp, f"unidade_destino={quote(unidade, safe='')}")
+            os.makedirs(pasta, exist_ok=True)
+            escrever_tabela(tabela.take(posicoes), os.path.join(pasta, f"parte-0{FORMATOS[formato]}"), formato)
+        os.makedirs(tmp, exist_ok=True)
+        shutil.rmtree(particao, ignore_errors=True)
+        os.replace(tmp, particao)
+        gravados += [os.path.join(r, n) for r, _, ns in os.walk(particao) for n in ns]
+    return gravados
+
+# --- Cache de Arquivos para Download ---
+
+def _limpar_cache():
+    arquivos = sorted(
+        (os.path.join(CACHE_DIR, n) for n in os.listdir(CACHE_DIR) if not n.endswith('.tmp')),
+        key=os.path.getmtime, reverse=True
+    )
+    for caminho in arquivos[MAX_ARQUIVOS:]:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+def arquivo_em_cache(df, chave, formato='xlsx', data_analise=None):
+    """Caminho do arquivo do recorte no formato pedido; gera só se essa chave ainda não estiver em cache."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    extensao = '.xlsx' if formato == 'xlsx' else FORMATOS[formato]
+    caminho = os.path.join(CACHE_DIR, f"{chave}{extensao}")
+    if os.path.exists(caminho):
+        os.utime(caminho)  # marca como usado recentemente
+        return caminho
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=CACHE_DIR)
+    os.close(fd)
+    try:
+        if formato == 'xlsx':
+            gerar_excel(df, tmp)
+        else:
+            escrever_tabela(tabela_exportacao(df, data_analise or pd.Timestamp.now().date()), tmp, formato)
+        os.replace(tmp, caminho)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    _limpar_cache()
+    return caminho
+
+def download(df, chave, formato='xlsx', data_analise=None):
+    """Função sem argumentos para o `data` do st.download_button (só roda no clique)."""
+    def gerar():
+        with open(arquivo_em_cache(df, chave, formato, data_analise), 'rb') as f:
+            return f.read()
+    return gerar
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+# --- Filtros do Dashboard sobre o Resultado ---
+# O filtro de período não converte mais cada linha em `date` do Python: as datas
+# (com fuso) ficam num índice ordenado de int64, montado uma vez por resultado, e
+# o intervalo escolhido vira dois limites int64 no mesmo fuso/unidade. As linhas do
+# período saem de um searchsorted; status e unidades entram na mesma máscara.
+
+def indice_datas(datas):
+    """Índice do filtro de período: posições ordenadas por data + datas int64 (UTC) nessa ordem."""
+    datas = pd.to_datetime(datas, errors='coerce')
+    valores = datas.array.asi8  # NaT vira o menor int64 e fica no começo
+    ordem = np.argsort(valores, kind='stable')
+    return {
+        'ordem': ordem,
+        'ordenadas': valores[ordem],
+        'tz': getattr(datas.dt, 'tz', None),
+        'unidade': datas.dt.unit,
+    }
+
+def limites_int64(indice, data_inicio, data_fim):
+    """[início, fim) em int64 para os dias data_inicio..data_fim (inclusive), à meia-noite local."""
+    limites = pd.DatetimeIndex([pd.Timestamp(data_inicio), pd.Timestamp(data_fim) + pd.Timedelta(days=1)])
+    if indice['tz'] is not None:
+        limites = limites.tz_localize(indice['tz'], ambiguous=False, nonexistent='shift_forward')
+    return limites.as_unit(indice['unidade']).asi8
+
+def posicoes_periodo(indice, data_inicio, data_fim):
+    """Posições (fora de ordem) das linhas com data no período."""
+    inicio, fim = limites_int64(indice, data_inicio, data_fim)
+    lo, hi = np.searchsorted(indice['ordenadas'], [inicio, fim], side='left')
+    return indice['ordem'][lo:hi]
+
+def mascara_valores(serie, valores):
+    """serie.isin(valores) como array; em colunas categóricas compara os códigos."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.categories.get_indexer(list(valores))
+        return np.isin(serie.cat.codes.to_numpy(), codigos[codigos >= 0])
+    return serie.isin(valores).to_numpy()
+
+def filtrar_posicoes(df, indice, status=None, unidades=None, date_range=()):
+    """Posições (em ordem) das linhas que passam em status, unidade (origem ou destino) e período."""
+    if indice is not None and len(date_range) == 2:
+        mask = np.zeros(len(df), dtype=bool)
+        mask[posicoes_periodo(indice, date_range[0], date_range[1])] = True
+    else:
+        mask = np.ones(len(df), dtype=bool)
+    if status is not None:
+        mask &= mascara_valores(df['Status'], status)
+    if unidades:
+        mask &= mascara_valores(df['Unidade Origem'], unidades) | mascara_valores(df['Unidade Destino'], unidades)
+    return np.flatnonzero(mask)
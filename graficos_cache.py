@@ -0,0 +1,52 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+# --- Cache das Figuras do Dashboard ---
+# Montar as figuras Plotly (go.Figure + update_layout) custa alguns ms por gráfico
+# a cada rerun, mesmo quando os agregados não mudaram. Aqui o JSON de cada figura
+# fica em cache, chaveado pelo hash dos dados agregados + cores do tema; num rerun
+# com os mesmos dados a figura é remontada do JSON sem nova validação.
+# Desligue com ATIVO = False (usado pelo benchmark para medir com/sem cache).
+
+ATIVO = True
+MAX_CACHE = 128
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+def hash_dados(*dados):
+    """Hash estável de Series/DataFrames (valores, índice e nomes) e valores simples."""
+    h = hashlib.sha1()
+    for d in dados:
+        if isinstance(d, (pd.Series, pd.DataFrame)):
+            h.update(pd.util.hash_pandas_object(d, index=True).to_numpy().tobytes())
+            nomes = list(d.columns) if isinstance(d, pd.DataFrame) else [d.name]
+            h.update(repr((nomes, d.index.name)).encode('utf-8'))
+        else:
+            h.update(repr(d).encode('utf-8'))
+    return h.hexdigest()
+
+def figura(nome, construtor, *dados, **tema):
+    """
+    construtor(*dados, **tema) -> go.Figure, ou a mesma figura vinda do cache.
+    `nome` separa gráficos diferentes com os mesmos dados; `tema` são as cores (chart_text_color, ...).
+    """
+    if not ATIVO:
+        return construtor(*dados, **tema)
+    chave = (nome, hash_dados(*dados), tuple(sorted(tema.items())))
+    with _lock:
+        spec = _cache.get(chave)
+        if spec is not None:
+            _cache.move_to_end(chave)
+    if spec is None:
+        spec = construtor(*dados, **tema).to_json()
+        with _lock:
+            _cache[chave] = spec
+            while len(_cache) > MAX_CACHE:
+                _cache.popitem(last=False)
+    # O JSON já foi validado quando a figura foi montada
+    import plotly.graph_objects as go
+    return go.Figure(json.loads(spec), _validate=False)
@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import analise_core
+import historico_store
+
+# --- Consultas Analíticas sobre o Histórico ---
+# Agregações (ex: valor divergente por par de unidades por semana nos últimos
+# 6 meses) sem carregar as análises inteiras:
+#   - o catálogo descarta as análises cujo período não cruza o intervalo pedido;
+#   - de cada Parquet só são lidas as colunas usadas na consulta;
+#   - cada arquivo é agregado e descartado antes do próximo.
+# Análises diárias se sobrepõem (o mesmo item aparece em várias execuções). Para não
+# contar o mesmo item duas vezes, a deduplicação é por linha: cada linha recebe o
+# fingerprint da chave de negócio do item (analise_core.calcular_fingerprints) e vale
+# a versão da análise mais recente que o contém. Uma análise parcial (uma unidade, parte
+# dos arquivos) substitui só os itens que ela traz; os demais seguem das anteriores.
+
+GRANULARIDADES = {'dia': 'D', 'semana': 'W-SUN', 'mes': 'M'}
+
+DIMENSOES = ['Unidade Origem', 'Unidade Destino', 'Status', 'Espécie']
+
+METRICAS = {
+    'itens': "Quantidade de linhas",
+    'valor_saida': "Soma do Valor Saída (R$)",
+    'valor_divergente': "Soma absoluta da Diferença (R$) dos itens Não Conformes",
+    'nao_conformes': "Itens Não Conformes",
+    'nao_recebidos': "Itens Não Recebidos",
+}
+
+# Colunas do resultado que formam a chave do item (saída; nas entradas órfãs, o lado da entrada)
+COLUNAS_ITEM = [
+    'Documento', 'Produto (Saída)', 'Produto (Entrada)', 'Qtd Saída', 'Qtd Entrada',
+    'Valor Saída (R$)', 'Valor Entrada (R$)', 'Unidade Origem', 'Unidade Destino', 'Espécie'
+]
+
+MAX_CACHE = 32
+_cache = {}
+
+def versao_historico(history_dir=None):
+    """Muda a cada análise gravada ou removida (usada como chave de cache)."""
+    history_dir = history_dir or historico_store.HISTORY_DIR
+    caminho = os.path.join(history_dir, historico_store.CATALOGO_NOME)
+    if not os.path.exists(caminho):
+        return "vazio"
+    with closing(sqlite3.connect(caminho, timeout=30)) as conn:
+        n, ultimo = conn.execute("SELECT COUNT(*), MAX(timestamp) FROM analises").fetchone()
+    return f"{n}|{ultimo}|{os.path.getmtime(caminho)}"
+
+def _analises_no_intervalo(inicio, fim, history_dir):
+    """Ids das análises cujo período cruza o intervalo, da mais recente para a mais antiga."""
+    selecionadas = []
+    for meta in historico_store.listar_analises(history_dir):
+        if not meta['periodo_inicio']:
+            continue
+        p_ini = pd.Timestamp(meta['periodo_inicio']).tz_localize(None).normalize()
+        p_fim = pd.Timestamp(meta['periodo_fim']).tz_localize(None).normalize()
+        if (fim is not None and p_ini > fim) or (inicio is not None and p_fim < inicio):
+            continue
+        selecionadas.append(meta['id'])
+    return selecionadas
+
+def fingerprints_itens(df, datas):
+    """Fingerprint (uint64) do item de cada linha do resultado, com a mesma chave da consolidação.
+
+    Linhas de saída usam o produto/quantidade/valor da saída; entradas órfãs ("-" na saída), os da entrada.
+    """
+    orfa = (df['Produto (Saída)'] == '-') if 'Produto (Saída)' in df.columns else pd.Series(False, index=df.index)
+    def lado(saida, entrada):
+        if saida not in df.columns:
+            return df[entrada] if entrada in df.columns else None
+        return df[saida].where(~orfa, df[entrada]) if entrada in df.columns else df[saida]
+    chave = pd.DataFrame({'data': datas.astype('datetime64[ns]')}, index=df.index)
+    for coluna, valores in (
+        ('documento', df.get('Documento')),
+        ('ds_produto', lado('Produto (Saída)', 'Produto (Entrada)')),
+        ('qt_entrada', lado('Qtd Saída', 'Qtd Entrada')),
+        ('valor_total', lado('Valor Saída (R$)', 'Valor Entrada (R$)')),
+        ('unidade_origem', df.get('Unidade Origem')),
+        ('unidade_destino', df.get('Unidade Destino')),
+        ('especie', df.get('Espécie')),
+    ):
+        if valores is not None:
+            chave[coluna] = valores.astype(float) if coluna in ('qt_entrada', 'valor_total') else valores.astype(str)
+    return analise_core.calcular_fingerprints(chave).to_numpy()
+
+def _agregar_arquivo(caminho, colunas, vistos, inicio, fim, dims, freq, metricas):
+    """(agregado ou None, fingerprints das linhas no intervalo). Linhas com fingerprint em `vistos` ficam de fora."""
+    df = pq.read_table(caminho, columns=colunas, memory_map=True).to_pandas()
+    if 'Código Status' not in df.columns:
+        df = analise_core.adicionar_codigos_status(df)
+    datas = pd.to_datetime(df['Data'], errors='coerce')
+    if getattr(datas.dt, 'tz', None) is not None:
+        datas = datas.dt.tz_localize(None)
+    dias = datas.dt.normalize()
+
+    mask = dias.notna().to_numpy().copy()
+    if inicio is not None:
+        mask &= (dias >= inicio).to_numpy()
+    if fim is not None:
+        mask &= (dias <= fim).to_numpy()
+    if not mask.any():
+        return None, np.array([], dtype=np.uint64)
+
+    df, datas, dias = df[mask], datas[mask], dias[mask]
+    fps = fingerprints_itens(df, datas)
+    novas = ~np.isin(fps, vistos)
+    if not novas.any():
+        return None, fps
+    df, dias = df[novas], dias[novas]
+    codigo = df['Código Status']
+    base = pd.DataFrame({'periodo': dias.dt.to_period(freq).dt.start_time}, index=df.index)
+    for dim in dims:
+        base[dim] = df[dim].astype(str)
+    if 'itens' in metricas:
+        base['itens'] = 1
+    if 'valor_saida' in metricas:
+        base['valor_saida'] = df['Valor Saída (R$)'].fillna(0)
+    if 'valor_divergente' in metricas:
+        base['valor_divergente'] = df['Diferença (R$)'].abs().where(codigo.isin(analise_core.STATUS_NAO_CONFORMES), 0).fillna(0)
+    if 'nao_conformes' in metricas:
+        base['nao_conformes'] = codigo.isin(analise_core.STATUS_NAO_CONFORMES).astype(int)
+    if 'nao_recebidos' in metricas:
+        base['nao_recebidos'] = (codigo == analise_core.STATUS_NAO_RECEBIDO).astype(int)
+    return base.groupby(['periodo'] + dims, dropna=False)[list(metricas)].sum(), fps
+
+def consultar(granularidade='semana', dimensoes=('Unidade Origem', 'Unidade Destino'),
+              metricas=('itens', 'valor_divergente'), inicio=None, fim=None, history_dir=None):
+    """
+    Agrega o histórico por período (dia/semana/mes) e dimensões.
+    inicio/fim: datas (inclusive) do item, não da execução. Retorna DataFrame com
+    colunas ['periodo', *dimensoes, *metricas]. Resultado em cache por consulta + versão do histórico.
+    """
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida: {granularidade}")
+    dims = [d for d in dimensoes if d in DIMENSOES]
+    metricas = [m for m in metricas if m in METRICAS]
+    inicio = pd.Timestamp(inicio).normalize() if inicio is not None else None
+    fim = pd.Timestamp(fim).normalize() if fim is not None else None
+
+    chave = (granularidade, tuple(dims), tuple(metricas), inicio, fim, history_dir, versao_historico(history_dir))
+    if chave in _cache:
+        return _cache[chave].copy()
+
+    inicio_consulta = time.perf_counter()
+    colunas = list(dict.fromkeys(['Data', 'Código Status', 'Valor Saída (R$)', 'Diferença (R$)'] + dims))
+    # Análises gravadas antes dos códigos de status: derivados dos rótulos
+    colunas_legado = list(dict.fromkeys(
+        [c for c in colunas if c != 'Código Status'] + ['Status', 'Tipo de Divergência', 'Observações']
+    ))
+    parciais = []
+    vistos = np.array([], dtype=np.uint64)  # itens já contados por análises mais recentes
+    analises = _analises_no_intervalo(inicio, fim, history_dir)
+    for analysis_id in analises:
+        caminho = historico_store.caminho_dados(analysis_id, history_dir)
+        if not os.path.exists(caminho):
+            continue
+        disponiveis = set(pq.read_schema(caminho).names)
+        colunas_arquivo = colunas if 'Código Status' in disponiveis else colunas_legado
+        if not set(colunas_arquivo) <= disponiveis:
+            print(f"⚠️ Análise {analysis_id} sem as colunas da consulta, ignorada")
+            continue
+        colunas_arquivo = list(dict.fromkeys(colunas_arquivo + [c for c in COLUNAS_ITEM if c in disponiveis]))
+        parcial, fps = _agregar_arquivo(caminho, colunas_arquivo, vistos, inicio, fim, dims,
+                                        GRANULARIDADES[granularidade], metricas)
+        vistos = np.union1d(vistos, fps)
+        if parcial is not None:
+            parciais.append(parcial)
+
+    if parciais:
+        resultado = pd.concat(parciais).groupby(level=list(range(1 + len(dims))), dropna=False).sum().reset_index()
+        resultado = resultado.sort_values(['periodo'] + dims, ignore_index=True)
+    else:
+        resultado = pd.DataFrame(columns=['periodo'] + dims + metricas)
+
+    print(f"   Tendências: {len(resultado)} linhas de {len(analises)} análise(s) em {time.perf_counter() - inicio_consulta:.2f}s")
+    if len(_cache) >= MAX_CACHE:
+        _cache.pop(next(iter(_cache)))
+    _cache[chave] = resultado
+    return resultado.copy()
@@ -0,0 +1,155 @@
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# --- Histórico de Análises (Parquet + Catálogo SQLite) ---
+# Cada análise fica num Parquet comprimido ({id}_dados.parquet) com os tipos
+# preservados. Metadados e stats de todas as análises ficam num único catálogo
+# SQLite, então listar o histórico é uma consulta só.
+# Históricos antigos (CSV + JSON) são importados na primeira abertura do catálogo.
+
+HISTORY_DIR = "historico_analises"
+CATALOGO_NOME = "catalogo.sqlite"
+COMPRESSAO = "zstd"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analises (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    data_formatada TEXT,
+    arquivo_saida TEXT,
+    arquivo_entrada TEXT,
+    total_itens INTEGER,
+    periodo_inicio TEXT,
+    periodo_fim TEXT,
+    stats TEXT
+)
+"""
+
+def _dir(history_dir=None):
+    history_dir = history_dir or HISTORY_DIR
+    os.makedirs(history_dir, exist_ok=True)
+    return history_dir
+
+def caminho_dados(analysis_id, history_dir=None):
+    return os.path.join(_dir(history_dir), f"{analysis_id}_dados.parquet")
+
+def _conectar(history_dir=None):
+    history_dir = _dir(history_dir)
+    caminho = os.path.join(history_dir, CATALOGO_NOME)
+    novo = not os.path.exists(caminho)
+    conn = sqlite3.connect(caminho, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute(_SCHEMA)
+    if novo:
+        _importar_legado(conn, history_dir)
+    return conn
+
+def _periodo(df):
+    if 'Data' not in df.columns:
+        return None, None
+    datas = pd.to_datetime(df['Data'], errors='coerce')
+    if datas.notna().any():
+        return datas.min().isoformat(), datas.max().isoformat()
+    return None, None
+
+def _inserir(conn, metadata, df):
+    inicio, fim = _periodo(df)
+    conn.execute(
+        "INSERT OR REPLACE INTO analises VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            metadata['id'], metadata['timestamp'], metadata.get('data_formatada'),
+            metadata.get('arquivo_saida'), metadata.get('arquivo_entrada'),
+            int(metadata.get('total_itens', len(df))), inicio, fim,
+            json.dumps(metadata.get('stats', {}), ensure_ascii=False, default=str)
+        )
+    )
+
+def _gravar_parquet(df, caminho):
+    tmp = caminho + ".tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, compression=COMPRESSAO)
+    os.replace(tmp, caminho)
+
+def _importar_legado(conn, history_dir):
+    """Converte pares {id}_dados.csv + {id}_metadata.json do formato antigo (os originais são mantidos)."""
+    importados = 0
+    for nome in sorted(os.listdir(history_dir)):
+        if not nome.endswith("_metadata.json"):
+            continue
+        analysis_id = nome[:-len("_metadata.json")]
+        csv_path = os.path.join(history_dir, f"{analysis_id}_dados.csv")
+        if not os.path.exists(csv_path):
+            continue
+        try:
+            with open(os.path.join(history_dir, nome), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            df = pd.read_csv(csv_path, encoding='utf-8-sig')
+            for col in ('Data', 'Data Entrada', 'Data_Obj'):
+                if col in df.columns:
+                    df[col] = pd.to_datetime(df[col], errors='coerce')
+            _gravar_parquet(df, os.path.join(history_dir, f"{analysis_id}_dados.parquet"))
+            metadata.setdefault('id', analysis_id)
+            _inserir(conn, metadata, df)
+            importados += 1
+        except Exception as e:
+            print(f"⚠️ Histórico antigo {analysis_id} não importado: {e}")
+    if importados:
+        conn.commit()
+        print(f"   Histórico: {importados} análise(s) antiga(s) importada(s) para Parquet")
+
+def salvar_analise(df_resultado, stats, arquivo_saida, arquivo_entrada, history_dir=None):
+    """Grava a análise (Parquet) e registra no catálogo. Retorna o id."""
+    timestamp = datetime.now()
+    base_id = timestamp.strftime("%Y%m%d_%H%M%S")
+    with closing(_conectar(history_dir)) as conn:
+        # Duas análises no mesmo segundo (jobs paralelos) ganham sufixo
+        analysis_id, n = base_id, 1
+        while conn.execute("SELECT 1 FROM analises WHERE id = ?", (analysis_id,)).fetchone():
+            n += 1
+            analysis_id = f"{base_id}_{n}"
+        _gravar_parquet(df_resultado, caminho_dados(analysis_id, history_dir))
+        _inserir(conn, {
+            'id': analysis_id,
+            'timestamp': timestamp.isoformat(),
+            'data_formatada': timestamp.strftime("%d/%m/%Y %H:%M:%S"),
+            'arquivo_saida': arquivo_saida,
+            'arquivo_entrada': arquivo_entrada,
+            'total_itens': len(df_resultado),
+            'stats': stats
+        }, df_resultado)
+        conn.commit()
+    return analysis_id
+
+def _linha_para_metadata(linha):
+    metadata = dict(linha)
+    metadata['stats'] = json.loads(metadata['stats']) if metadata['stats'] else {}
+    return metadata
+
+def listar_analises(history_dir=None):
+    """Metadados de todas as análises, da mais recente para a mais antiga (uma consulta)."""
+    with closing(_conectar(history_dir)) as conn:
+        linhas = conn.execute("SELECT * FROM analises ORDER BY timestamp DESC, id DESC").fetchall()
+    return [_linha_para_metadata(l) for l in linhas]
+
+def carregar_analise(analysis_id, history_dir=None, colunas=None):
+    """(df, metadata) com as colunas tipadas do Parquet, ou (None, None) se não existir."""
+    with closing(_conectar(history_dir)) as conn:
+        linha = conn.execute("SELECT * FROM analises WHERE id = ?", (analysis_id,)).fetchone()
+    caminho = caminho_dados(analysis_id, history_dir)
+    if linha is None or not os.path.exists(caminho):
+        return None, None
+    df = pq.read_table(caminho, columns=colunas, memory_map=True).to_pandas()
+    return df, _linha_para_metadata(linha)
+
+def remover_analise(analysis_id, history_dir=None):
+    with closing(_conectar(history_dir)) as conn:
+        conn.execute("DELETE FROM analises WHERE id = ?", (analysis_id,))
+        conn.commit()
+    caminho = caminho_dados(analysis_id, history_dir)
+    if os.path.exists(caminho):
+        os.remove(caminho)
@@ -0,0 +1,115 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import analise_core
+
+# --- Execução de Análises em Segundo Plano ---
+# O Streamlit reexecuta o script a cada interação; se a análise roda dentro do
+# script, um clique pode reiniciá-la e a sessão fica travada até o fim. Aqui a
+# análise vira um job num pool de workers: a sessão guarda só o id e consulta
+# o progresso a cada rerun. Os jobs ficam no processo do servidor (um gerenciador
+# compartilhado entre as sessões), então sobrevivem aos reruns.
+
+ESTADOS_FINAIS = ('concluido', 'erro', 'cancelado')
+
+# Mesma exceção do motor: o job é interrompido tanto pelo progress_callback quanto pelo token do analisar_itens
+AnaliseCancelada = analise_core.AnaliseCancelada
+
+class Job:
+    def __init__(self, descricao):
+        self.id = uuid.uuid4().hex[:12]
+        self.descricao = descricao
+        self.estado = 'na_fila'
+        self.progresso = 0.0
+        self.mensagem = "Na fila..."
+        self.criado_em = datetime.now()
+        self.iniciado_em = None
+        self.finalizado_em = None
+        self.resultado = None
+        self.erro = None
+        self.cancelamento = threading.Event()
+
+    @property
+    def finalizado(self):
+        return self.estado in ESTADOS_FINAIS
+
+    def progress_callback(self, p, msg):
+        """Mesmo contrato do analisar_itens (fração 0-1, mensagem). Interrompe o job se foi cancelado."""
+        if self.cancelamento.is_set():
+            raise AnaliseCancelada()
+        self.progresso = p
+        self.mensagem = msg
+
+class GerenciadorJobs:
+    """Pool de workers com fila, progresso, cancelamento e retenção dos resultados."""
+
+    def __init__(self, max_workers=2, retencao_s=2 * 3600, max_jobs=50):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analise")
+        self.retencao_s = retencao_s
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def submeter(self, funcao, *args, descricao="", **kwargs):
+        """
+        Enfileira funcao(*args, progress_callback=..., **kwargs) e retorna o id do job.
+        O retorno da função fica em job.resultado.
+        """
+        job = Job(descricao)
+        with self._lock:
+            self._limpar()
+            self.jobs[job.id] = job
+        self.executor.submit(self._executar, job, funcao, args, kwargs)
+        return job.id
+
+    def _executar(self, job, funcao, args, kwargs):
+        if job.cancelamento.is_set():
+            job.estado, job.mensagem = 'cancelado', "Cancelado antes de iniciar"
+            job.finalizado_em = datetime.now()
+            return
+        job.estado, job.mensagem = 'executando', "Iniciando..."
+        job.iniciado_em = datetime.now()
+        inicio = time.perf_counter()
+        try:
+            job.resultado = funcao(*args, progress_callback=job.progress_callback, **kwargs)
+            job.estado, job.progresso, job.mensagem = 'concluido', 1.0, "Concluído!"
+        except AnaliseCancelada:
+            job.estado, job.mensagem = 'cancelado', "Cancelado pelo usuário"
+        except Exception as e:
+            job.estado, job.erro, job.mensagem = 'erro', str(e), f"Erro: {e}"
+        finally:
+            job.finalizado_em = datetime.now()
+            print(f"   Job {job.id} ({job.descricao}): {job.estado} em {time.perf_counter() - inicio:.1f}s")
+
+    def obter(self, job_id):
+        """Retorna o Job ou None se não existir (ou já tiver expirado)."""
+        with self._lock:
+            self._limpar()
+            return self.jobs.get(job_id)
+
+    def cancelar(self, job_id):
+        job = self.obter(job_id)
+        if job is not None and not job.finalizado:
+            job.cancelamento.set()
+            job.mensagem = "Cancelando..."
+
+    def posicao_na_fila(self, job_id):
+        """Quantos jobs na fila foram criados antes deste (0 = próximo a rodar)."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.estado != 'na_fila':
+                return 0
+            return sum(1 for j in self.jobs.values() if j.estado == 'na_fila' and j.criado_em < job.criado_em)
+
+    def _limpar(self):
+        """Remove jobs finalizados além da retenção (e os mais antigos se passar de max_jobs)."""
+        agora = datetime.now()
+        finalizados = sorted(
+            (j for j in self.jobs.values() if j.finalizado), key=lambda j: j.finalizado_em
+        )
+        for job in finalizados:
+            expirado = (agora - job.finalizado_em).total_seconds() > self.retencao_s
+            if expirado or len(self.jobs) > self.max_jobs:
+                del self.jobs[job.id]
@@ -0,0 +1,75 @@
+import os
+import time
+from contextlib import contextmanager
+
+# --- Instrumentação do Pipeline de Análise ---
+
+class MetricasAnalise:
+    """Acumula tempo, linhas de entrada/saída e contadores por etapa do pipeline.
+
+    Chamadas repetidas da mesma etapa (ex: preparar_dataframe por arquivo) são somadas.
+    """
+
+    def __init__(self):
+        self.etapas = {}
+
+    def _etapa(self, nome):
+        if nome not in self.etapas:
+            self.etapas[nome] = {'tempo_s': 0.0, 'linhas_entrada': 0, 'linhas_saida': 0}
+        return self.etapas[nome]
+
+    @contextmanager
+    def medir(self, nome, linhas_entrada=0):
+        """Context manager que soma o tempo de parede do bloco à etapa."""
+        etapa = self._etapa(nome)
+        etapa['linhas_entrada'] += linhas_entrada
+        inicio = time.perf_counter()
+        try:
+            yield etapa
+        finally:
+            etapa['tempo_s'] += time.perf_counter() - inicio
+
+    def adicionar_tempo(self, nome, segundos):
+        self._etapa(nome)['tempo_s'] += segundos
+
+    def contar(self, nome, contador, n=1):
+        etapa = self._etapa(nome)
+        etapa[contador] = etapa.get(contador, 0) + n
+
+    def resumo(self):
+        """Retorna um dict serializável em JSON: {etapa: {tempo_s, linhas_entrada, linhas_saida, ...}}."""
+        return {
+            nome: {k: (round(v, 6) if isinstance(v, float) else v) for k, v in etapa.items()}
+            for nome, etapa in self.etapas.items()
+        }
+
+# --- Tempos de Render do Dashboard ---
+# Uma linha por execução de fragmento por sessão: em produção só polui o log, então
+# só é impressa com ANALISE_TEMPOS_RENDER=1 no ambiente (diagnóstico de lentidão).
+
+def tempos_render_ativos():
+    return os.environ.get("ANALISE_TEMPOS_RENDER", "").strip().lower() in ("1", "true", "sim")
+
+class TemposRender:
+    """Cronômetro por seção de um fragmento do dashboard; `fim()` loga tudo numa linha (se ativado).
+
+    Uso: tempos = TemposRender("Dashboard"); <seção>; tempos.marcar("KPIs"); ...; tempos.fim()
+    """
+
+    def __init__(self, fragmento):
+        self.fragmento = fragmento
+        self.secoes = []
+        self.inicio = self._ultimo = time.perf_counter()
+
+    def marcar(self, secao):
+        """Fecha a seção que terminou agora (tempo desde a marcação anterior)."""
+        agora = time.perf_counter()
+        self.secoes.append((secao, agora - self._ultimo))
+        self._ultimo = agora
+
+    def fim(self):
+        total = time.perf_counter() - self.inicio
+        if tempos_render_ativos():
+            partes = " | ".join(f"{secao} {s * 1000:.1f} ms" for secao, s in self.secoes)
+            print(f"   ⏱️ Render {self.fragmento}: {partes} | total {total * 1000:.1f} ms")
+        return dict(self.secoes, total=total)
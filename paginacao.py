@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+# --- Paginação da Tabela Detalhada ---
+# O dashboard não manda mais o df_filtered inteiro para o navegador: busca,
+# ordenação e fatiamento são feitos aqui, no servidor, e só a página visível
+# vai para o st.dataframe. O conjunto completo continua disponível pelos
+# downloads (exportacao).
+
+TAMANHOS_PAGINA = [25, 50, 100, 250]
+
+# Colunas cuja ordenação usa outra coluna (ex: 'Data' já formatada como texto no analise_3.0)
+CHAVES_ORDEM = {'Data': 'Data_Obj'}
+
+def _colunas_texto(df):
+    return [
+        c for c in df.columns
+        if pd.api.types.is_object_dtype(df[c]) or pd.api.types.is_string_dtype(df[c])
+        or isinstance(df[c].dtype, pd.CategoricalDtype)
+    ]
+
+def buscar(df, texto):
+    """Linhas com `texto` (sem diferenciar maiúsculas) em qualquer coluna de texto."""
+    texto = (texto or "").strip()
+    if not texto or df.empty:
+        return df
+    mask = np.zeros(len(df), dtype=bool)
+    for coluna in _colunas_texto(df):
+        mask = mask | df[coluna].astype(str).str.contains(texto, case=False, regex=False, na=False).to_numpy()
+    return df[mask]
+
+def ordenar(df, coluna, crescente=True):
+    """Ordena pelo valor da coluna (nulos no fim). Coluna inexistente mantém a ordem atual."""
+    if not coluna or coluna not in df.columns:
+        return df
+    chave = CHAVES_ORDEM.get(coluna, coluna)
+    if chave not in df.columns:
+        chave = coluna
+    serie = df[chave]
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(str)
+    ordem = serie.reset_index(drop=True).sort_values(ascending=crescente, kind='stable', na_position='last').index
+    return df.iloc[ordem.to_numpy()]
+
+def pagina(df, numero=1, tamanho=TAMANHOS_PAGINA[0], busca="", coluna_ordem=None, crescente=True):
+    """
+    (linhas da página, total de linhas após a busca, total de páginas).
+    `numero` começa em 1 e é limitado ao total de páginas.
+    """
+    df = ordenar(buscar(df, busca), coluna_ordem, crescente)
+    total = len(df)
+    total_paginas = max(1, -(-total // tamanho))
+    numero = min(max(1, int(numero)), total_paginas)
+    inicio = (numero - 1) * tamanho
+    return df.iloc[inicio:inicio + tamanho], total, total_paginas
@@ -0,0 +1 @@
+"""Harness de regressão (golden output) do matcher: prova equivalência entre variantes do motor."""
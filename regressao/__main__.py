@@ -0,0 +1,31 @@
+import argparse
+import sys
+from regressao import harness, historico
+
+# Uso (na raiz do projeto):
+#   python -m regressao                          -> todas as variantes x todas as fixtures + histórico
+#   python -m regressao --variantes incremental_dia_seguinte
+#   python -m regressao --atualizar              -> regrava o esperado (mudança de regra intencional)
+#   python -m regressao --gerar-fixtures         -> regera as planilhas de entrada sintéticas
+
+def main():
+    parser = argparse.ArgumentParser(description="Regressão golden-output do matcher")
+    parser.add_argument('--variantes', nargs='+', choices=list(harness.VARIANTES))
+    parser.add_argument('--fixtures', nargs='+', choices=list(harness.FIXTURES))
+    parser.add_argument('--atualizar', action='store_true', help="Regrava o resultado esperado")
+    parser.add_argument('--gerar-fixtures', action='store_true', help="Regera as planilhas de entrada")
+    args = parser.parse_args()
+
+    if args.gerar_fixtures:
+        harness.gerar_fixtures()
+        args.atualizar = True
+
+    resumo = harness.executar(args.variantes, args.fixtures, atualizar=args.atualizar)
+    if not args.variantes and not args.fixtures:
+        resumo.update(historico.executar())
+    falhas = sum(1 for n in resumo.values() if n)
+    print(f"\n{len(resumo) - falhas}/{len(resumo)} combinações idênticas ao esperado.")
+    return 1 if falhas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
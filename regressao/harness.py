@@ -0,0 +1,182 @@
+import io
+import numbers
+import os
+import pandas as pd
+import analise_core
+import analise_incremental
+
+# --- Harness de Regressão (Golden Output) ---
+# Cada fixture tem as planilhas de entrada (saída/entrada, formato de exportação, dados
+# sintéticos/anonimizados) e o resultado esperado, no mesmo formato do
+# teste_correcao_resultado.csv. Toda variante do motor precisa reproduzir o esperado.
+
+REGRESSAO_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(REGRESSAO_DIR, "fixtures")
+RESULTADOS_DIR = os.path.join(REGRESSAO_DIR, "resultados")
+
+# Parâmetros usados para gerar as fixtures (benchmark.gerador_sintetico)
+FIXTURES = {
+    'base_300': {'n_linhas': 300, 'seed': 1},
+    'base_800': {'n_linhas': 800, 'seed': 7},
+    'casa_portugal': {'n_linhas': 400, 'seed': 3, 'taxa_cp': 0.35},
+    'sem_documento': {'n_linhas': 400, 'seed': 5, 'perfil': {'taxa_sem_documento': 0.05}},
+}
+
+# Colunas comparadas linha a linha
+COLUNAS_COMPARADAS = [
+    "Status", "Produto (Entrada)", "Espécie", "Valor Entrada (R$)", "Qtd Entrada",
+    "Diferença (R$)", "Diferença Qtd", "Tipo de Divergência"
+]
+
+# --- Variantes do motor ---
+
+def _variante_completo(df_saida, df_entrada):
+    df_resultado, _ = analise_core.analisar_itens(df_saida, df_entrada)
+    return df_resultado
+
+def _variante_incremental_sem_ledger(df_saida, df_entrada):
+    df_resultado, _, _ = analise_incremental.analisar_incremental(df_saida, df_entrada, None)
+    return df_resultado
+
+def _variante_incremental_dia_seguinte(df_saida, df_entrada):
+    # "Ontem" viu só os primeiros 70% de cada planilha; "hoje" recebe tudo
+    ontem_s = df_saida.iloc[:int(len(df_saida) * 0.7)]
+    ontem_e = df_entrada.iloc[:int(len(df_entrada) * 0.7)]
+    _, _, ledger = analise_incremental.analisar_incremental(ontem_s, ontem_e, None)
+    df_resultado, _, _ = analise_incremental.analisar_incremental(df_saida, df_entrada, ledger)
+    return df_resultado
+
+def _variante_incremental_especie(df_saida, df_entrada):
+    # "Ontem" tinha a espécie errada em parte das linhas (só a espécie); "hoje" vem corrigida
+    ontem_s, ontem_e = df_saida.copy(), df_entrada.copy()
+    ontem_s.loc[ontem_s.index[::7], 'especie'] = "ESPECIE ANTERIOR"
+    ontem_e.loc[ontem_e.index[::7], 'especie'] = "ESPECIE ANTERIOR"
+    _, _, ledger = analise_incremental.analisar_incremental(ontem_s, ontem_e, None)
+    df_resultado, _, _ = analise_incremental.analisar_incremental(df_saida, df_entrada, ledger)
+    return df_resultado
+
+VARIANTES = {
+    'completo': _variante_completo,
+    'incremental_sem_ledger': _variante_incremental_sem_ledger,
+    'incremental_dia_seguinte': _variante_incremental_dia_seguinte,
+    'incremental_especie': _variante_incremental_especie,
+}
+
+# --- Fixtures ---
+
+def _caminhos(nome):
+    return (
+        os.path.join(FIXTURES_DIR, f"{nome}_saida.csv"),
+        os.path.join(FIXTURES_DIR, f"{nome}_entrada.csv"),
+        os.path.join(FIXTURES_DIR, f"{nome}_esperado.csv"),
+    )
+
+def gerar_fixtures():
+    """(Re)gera as planilhas de entrada das fixtures a partir do gerador sintético."""
+    from benchmark import gerador_sintetico
+    perfil_base = gerador_sintetico.carregar_perfil()
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for nome, params in FIXTURES.items():
+        params = dict(params)
+        perfil = dict(perfil_base, **params.pop('perfil', {}))
+        df_saida, df_entrada = gerador_sintetico.gerar_dataframes(perfil=perfil, **params)
+        caminho_s, caminho_e, _ = _caminhos(nome)
+        df_saida.to_csv(caminho_s, index=False, encoding='utf-8-sig')
+        df_entrada.to_csv(caminho_e, index=False, encoding='utf-8-sig')
+        print(f"   Fixture {nome}: {len(df_saida)} saídas, {len(df_entrada)} entradas")
+
+def carregar_entradas(nome):
+    """Lê as planilhas da fixture e aplica preparar_dataframe (igual ao fluxo diário)."""
+    caminho_s, caminho_e, _ = _caminhos(nome)
+    frames = []
+    for caminho in (caminho_s, caminho_e):
+        df = pd.read_csv(caminho, encoding='utf-8-sig', dtype={'Documento': str, 'Hora': str})
+        df['Documento'] = df['Documento'].fillna('')
+        frames.append(analise_core.preparar_dataframe(df))
+    return frames[0], frames[1]
+
+def _normalizar(df_resultado):
+    """Passa o resultado pelo mesmo round-trip CSV do esperado, para comparar tipos iguais."""
+    buffer = io.StringIO()
+    df_resultado.to_csv(buffer, index=False)
+    buffer.seek(0)
+    return pd.read_csv(buffer, dtype={'Documento': str})
+
+def salvar_esperado(nome, df_resultado):
+    _, _, caminho_esperado = _caminhos(nome)
+    df_resultado.to_csv(caminho_esperado, index=False, encoding='utf-8-sig')
+
+def carregar_esperado(nome):
+    _, _, caminho_esperado = _caminhos(nome)
+    return pd.read_csv(caminho_esperado, encoding='utf-8-sig', dtype={'Documento': str})
+
+# --- Diff ---
+
+def _com_chave(df):
+    """Chave estável por linha: linhas de saída pelo item enviado, órfãs pelo item recebido."""
+    df = df.copy()
+    orfa = df['Produto (Saída)'] == '-'
+    df['_tipo'] = orfa.map({True: 'E', False: 'S'})
+    df['_produto'] = df['Produto (Saída)'].where(~orfa, df['Produto (Entrada)'])
+    df['_qtd'] = df['Qtd Saída'].where(~orfa, df['Qtd Entrada']).round(4)
+    df['_valor'] = df['Valor Saída (R$)'].where(~orfa, df['Valor Entrada (R$)']).round(2)
+    df['_documento'] = df['Documento'].fillna('')
+    chave = ['_tipo', '_documento', '_produto', '_qtd', '_valor']
+    df['_ocorrencia'] = df.groupby(chave, dropna=False).cumcount()
+    return df, chave + ['_ocorrencia']
+
+def _iguais(a, b):
+    if pd.isna(a) and pd.isna(b):
+        return True
+    if isinstance(a, numbers.Number) and isinstance(b, numbers.Number):
+        return abs(a - b) < 1e-6
+    return a == b
+
+def diff_resultados(esperado, obtido):
+    """Diff linha a linha. Retorna DataFrame (chave, coluna, esperado, obtido); vazio = equivalente."""
+    esperado, chave = _com_chave(esperado)
+    obtido, _ = _com_chave(_normalizar(obtido))
+    juntos = esperado.merge(obtido, on=chave, how='outer', suffixes=('_esperado', '_obtido'), indicator=True)
+
+    diferencas = []
+    for _, linha in juntos.iterrows():
+        id_linha = {
+            'tipo': linha['_tipo'], 'documento': linha['_documento'], 'produto': linha['_produto'],
+            'quantidade': linha['_qtd'], 'valor': linha['_valor'], 'ocorrencia': linha['_ocorrencia'],
+        }
+        if linha['_merge'] != 'both':
+            falta = 'ausente no obtido' if linha['_merge'] == 'left_only' else 'ausente no esperado'
+            diferencas.append({**id_linha, 'coluna': '(linha)', 'esperado': falta, 'obtido': falta})
+            continue
+        for col in COLUNAS_COMPARADAS:
+            v_esp, v_obt = linha[f"{col}_esperado"], linha[f"{col}_obtido"]
+            if not _iguais(v_esp, v_obt):
+                diferencas.append({**id_linha, 'coluna': col, 'esperado': v_esp, 'obtido': v_obt})
+    return pd.DataFrame(diferencas, columns=[
+        'tipo', 'documento', 'produto', 'quantidade', 'valor', 'ocorrencia', 'coluna', 'esperado', 'obtido'
+    ])
+
+def executar(variantes=None, fixtures=None, atualizar=False):
+    """Roda cada variante sobre cada fixture. Retorna {(fixture, variante): n_diferencas}."""
+    variantes = variantes or list(VARIANTES)
+    fixtures = fixtures or list(FIXTURES)
+    resumo = {}
+    for nome in fixtures:
+        if atualizar:
+            df_saida, df_entrada = carregar_entradas(nome)
+            salvar_esperado(nome, _variante_completo(df_saida, df_entrada))
+            print(f"   Esperado de {nome} regravado com a variante 'completo'")
+        esperado = carregar_esperado(nome)
+        for variante in variantes:
+            df_saida, df_entrada = carregar_entradas(nome)
+            obtido = VARIANTES[variante](df_saida, df_entrada)
+            diff = diff_resultados(esperado, obtido)
+            resumo[(nome, variante)] = len(diff)
+            if len(diff):
+                os.makedirs(RESULTADOS_DIR, exist_ok=True)
+                caminho = os.path.join(RESULTADOS_DIR, f"diff_{nome}_{variante}.csv")
+                diff.to_csv(caminho, index=False, encoding='utf-8-sig')
+                print(f"❌ {nome} / {variante}: {len(diff)} diferença(s) -> {caminho}")
+            else:
+                print(f"✅ {nome} / {variante}: idêntico ao esperado")
+    return resumo
@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+import analise_core
+import historico_consultas
+import historico_store
+from regressao import harness
+
+# --- Regressão das Consultas sobre o Histórico ---
+# Análises que se sobrepõem não podem contar o mesmo item duas vezes nem apagar os
+# itens que a análise mais nova não trouxe. Cenário: uma análise completa (fixture
+# base_300) e, depois, uma análise parcial do mesmo período só com uma unidade de
+# destino, com a Diferença (R$) alterada. As tendências precisam manter todas as
+# unidades com a contagem da completa e a unidade reprocessada com os valores novos.
+
+def _por_unidade(df, metrica):
+    return df.groupby('Unidade Destino')[metrica].sum().sort_index()
+
+def verificar_analise_parcial(fixture='base_300'):
+    """Lista de falhas (vazia se as tendências batem com o esperado)."""
+    df_saida, df_entrada = harness.carregar_entradas(fixture)
+    df_completo = harness.VARIANTES['completo'](df_saida, df_entrada)
+    unidade = df_completo['Unidade Destino'].value_counts().index[0]
+    df_parcial = df_completo[df_completo['Unidade Destino'] == unidade].copy()
+    df_parcial['Diferença (R$)'] = df_parcial['Diferença (R$)'] * 2
+
+    history_dir = tempfile.mkdtemp(prefix="regressao_historico_")
+    try:
+        historico_store.salvar_analise(df_completo, {}, "completa", "completa", history_dir=history_dir)
+        historico_store.salvar_analise(df_parcial, {}, "parcial", "parcial", history_dir=history_dir)
+        obtido = historico_consultas.consultar(
+            'dia', ['Unidade Destino'], ['itens', 'valor_divergente'], history_dir=history_dir
+        )
+    finally:
+        shutil.rmtree(history_dir, ignore_errors=True)
+
+    df_esperado = analise_core.adicionar_codigos_status(df_completo.copy())
+    df_esperado.loc[df_parcial.index, 'Diferença (R$)'] = df_parcial['Diferença (R$)']
+    nao_conforme = df_esperado['Código Status'].isin(analise_core.STATUS_NAO_CONFORMES)
+    df_esperado['valor_divergente'] = df_esperado['Diferença (R$)'].abs().where(nao_conforme, 0).fillna(0)
+    df_esperado['itens'] = 1
+    df_esperado['Unidade Destino'] = df_esperado['Unidade Destino'].astype(str)
+
+    falhas = []
+    itens_obtidos, itens_esperados = _por_unidade(obtido, 'itens'), _por_unidade(df_esperado, 'itens')
+    if not itens_obtidos.equals(itens_esperados):
+        falhas.append(f"itens por unidade: esperado {itens_esperados.to_dict()}, obtido {itens_obtidos.to_dict()}")
+    valor_obtido = _por_unidade(obtido, 'valor_divergente').round(2)
+    valor_esperado = _por_unidade(df_esperado, 'valor_divergente').round(2)
+    if not valor_obtido.equals(valor_esperado.reindex(valor_obtido.index)):
+        falhas.append(f"valor divergente por unidade: esperado {valor_esperado.to_dict()}, obtido {valor_obtido.to_dict()}")
+    return falhas
+
+def executar():
+    """Roda os cenários do histórico. Retorna {cenário: n_falhas}."""
+    falhas = verificar_analise_parcial()
+    for falha in falhas:
+        print(f"❌ historico / analise_parcial: {falha}")
+    if not falhas:
+        print("✅ historico / analise_parcial: tendências batem com a análise completa + parcial")
+    return {('historico', 'analise_parcial'): len(falhas)}
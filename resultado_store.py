@@ -0,0 +1,96 @@
+import json
+import os
+from datetime import date, datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+import cubo_resultado
+
+# --- Armazenamento do Resultado Diário (Parquet + JSON) ---
+# O resultado fica em Parquet (colunar, lido sob demanda e via memory-map) e os
+# metadados num JSON ao lado, que pode ser consultado sem abrir o resultado.
+# O cubo diário (ver cubo_resultado) é gerado e gravado junto, num Parquet próprio,
+# e as tabelas de dimensão dos filtros (status, unidades, espécies, período) vão
+# nos metadados. As colunas de unidade são gravadas como categóricas, com as
+# categorias da tabela de unidades.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "dados")
+RESULT_FILE = os.path.join(DATA_DIR, "resultado_diario.parquet")
+METADATA_FILE = os.path.join(DATA_DIR, "resultado_diario_metadata.json")
+STORE_VERSAO = 1
+
+def caminho_cubo(caminho=RESULT_FILE):
+    """Arquivo do cubo que acompanha um resultado (resultado_diario.parquet -> resultado_diario_cubo.parquet)."""
+    return os.path.splitext(caminho)[0] + "_cubo.parquet"
+
+def salvar_resultado(df_resultado, metadata, caminho=RESULT_FILE, caminho_metadata=METADATA_FILE):
+    """
+    Grava o resultado e o cubo em Parquet e os metadados no JSON. Cada arquivo é trocado
+    atomicamente (os.replace), mas não o conjunto: o Parquet do resultado vai por último.
+    """
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    df_cubo = cubo_resultado.construir_cubo(df_resultado)
+    dimensoes = cubo_resultado.dimensoes(df_cubo)
+    tabela = pa.Table.from_pandas(
+        cubo_resultado.codificar_unidades(df_resultado, dimensoes['unidades']), preserve_index=False
+    )
+    cubo = pa.Table.from_pandas(df_cubo, preserve_index=False)
+
+    meta = dict(metadata)
+    if isinstance(meta.get('data_processamento'), datetime):
+        meta['data_processamento'] = meta['data_processamento'].isoformat()
+    meta['versao'] = STORE_VERSAO
+    meta['linhas'] = len(df_resultado)
+    meta['colunas'] = list(df_resultado.columns)
+    meta['dimensoes'] = dimensoes
+    meta['dimensoes_unidade'] = cubo_resultado.dimensoes_por_unidade(df_cubo)
+
+    tmp, tmp_meta = caminho + ".tmp", caminho_metadata + ".tmp"
+    tmp_cubo = caminho_cubo(caminho) + ".tmp"
+    pq.write_table(tabela, tmp)
+    pq.write_table(cubo, tmp_cubo)
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+    # Resultado por último: os dashboards guardam cubo e dimensões em cache pela chave
+    # (caminho, mtime) do resultado, então quando o mtime novo aparece o cubo e os
+    # metadados novos já estão no lugar (uma leitura no meio da troca não fixa no cache
+    # a versão antiga deles sob a chave nova)
+    os.replace(tmp_cubo, caminho_cubo(caminho))
+    os.replace(tmp_meta, caminho_metadata)
+    os.replace(tmp, caminho)
+
+def carregar_metadata(caminho_metadata=METADATA_FILE):
+    """Lê só o JSON de metadados (data_processamento volta como datetime). None se não existir."""
+    if not os.path.exists(caminho_metadata):
+        return None
+    with open(caminho_metadata, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('versao') != STORE_VERSAO:
+        return None
+    meta['data_processamento'] = datetime.fromisoformat(meta['data_processamento'])
+    return meta
+
+def carregar_resultado(colunas=None, caminho=RESULT_FILE):
+    """Carrega o resultado (memory-mapped). Com `colunas`, só essas colunas são lidas do disco."""
+    tabela = pq.read_table(caminho, columns=colunas, memory_map=True)
+    return tabela.to_pandas()
+
+def carregar_cubo(caminho=RESULT_FILE):
+    """Cubo do resultado em `caminho`, ou None se não existir (resultado gravado antes do cubo)."""
+    caminho = caminho_cubo(caminho)
+    if not os.path.exists(caminho):
+        return None
+    return pq.read_table(caminho, memory_map=True).to_pandas()
+
+def carregar_dimensoes(unidade=None, caminho_metadata=METADATA_FILE):
+    """Tabelas de dimensão do resultado (ou do recorte da unidade de destino). None se o resultado for anterior a elas."""
+    meta = carregar_metadata(caminho_metadata)
+    if meta is None or 'dimensoes' not in meta:
+        return None
+    if unidade:
+        vazias = {'status': [], 'unidades': [], 'especies': [], 'data_min': None, 'data_max': None}
+        dimensoes = meta['dimensoes_unidade'].get(unidade, vazias)
+    else:
+        dimensoes = meta['dimensoes']
+    # Datas vêm do JSON em ISO
+    return {**dimensoes, **{k: date.fromisoformat(dimensoes[k]) if dimensoes[k] else None for k in ('data_min', 'data_max')}}
@@ -1,66 +1,177 @@
+import json
+import os
 import time
-from datetime import datetime
-import auto_analise
+from datetime import datetime, timedelta
+import worker_analise
 import download_gmail
 import sys
 
+# --- Agendador do Robô (por prazos, com registro de execuções) ---
+# Em vez de consultar o relógio a cada 10s e comparar "HH:MM", o agendador calcula
+# o próximo prazo (horário de uma tarefa, nova tentativa ou heartbeat) e dorme até
+# ele. Cada execução vai para um registro em dados/ (JSONL): ao reiniciar, a última
+# ocorrência de cada tarefa que não consta no registro é executada na hora, então
+# um minuto perdido (download longo, pausa, serviço fora do ar) não perde o dia.
+# O processamento de um dia depende do download do mesmo dia ter dado certo; se o
+# download esgotar as tentativas, o processamento do dia é registrado como pulado.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "dados")
+LEDGER_FILE = os.path.join(DATA_DIR, "agendador_execucoes.jsonl")
+
+TAREFAS = [
+    {'nome': 'download', 'horario': (6, 30), 'descricao': "Download de Arquivos (Gmail)", 'depende_de': None},
+    {'nome': 'processamento', 'horario': (7, 0), 'descricao': "Processamento e Atualização do Dashboard", 'depende_de': 'download'},
+]
+MAX_TENTATIVAS = 3
+INTERVALO_TENTATIVA = timedelta(minutes=30)
+HEARTBEAT = timedelta(hours=6)  # sono máximo: acorda ao menos a cada 6h para dar sinal de vida
+
+# --- Registro de Execuções ---
+
+def carregar_ledger(caminho=LEDGER_FILE):
+    """Execuções registradas (uma por linha); linhas ilegíveis são ignoradas."""
+    execucoes = []
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    execucoes.append(json.loads(linha))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return execucoes
+
+def registrar_execucao(registro, caminho=LEDGER_FILE):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def estado_tarefa(ledger, nome, data_referencia):
+    """Situação da tarefa no dia: sucesso, tentativas, fim da última tentativa e se foi pulada/esgotada."""
+    execucoes = [e for e in ledger if e['tarefa'] == nome and e['data_referencia'] == data_referencia.isoformat()]
+    sucesso = any(e['sucesso'] for e in execucoes)
+    tentativas = sum(1 for e in execucoes if not e.get('pulada'))
+    return {
+        'sucesso': sucesso,
+        'tentativas': tentativas,
+        'ultimo_fim': datetime.fromisoformat(execucoes[-1]['fim']) if execucoes else None,
+        'encerrada': sucesso or tentativas >= MAX_TENTATIVAS or any(e.get('pulada') for e in execucoes),
+    }
+
+# --- Prazos ---
+
+def prazo(tarefa, dia):
+    hora, minuto = tarefa['horario']
+    return datetime(dia.year, dia.month, dia.day, hora, minuto)
+
+def ocorrencia_atual(tarefa, agora):
+    """Dia da ocorrência mais recente cujo horário já passou (hoje ou ontem)."""
+    hoje = agora.date()
+    return hoje if agora >= prazo(tarefa, hoje) else hoje - timedelta(days=1)
+
+def tarefa_pendente(tarefa, agora, ledger):
+    """
+    (data_referencia, None) se a tarefa deve rodar agora; (data_referencia, motivo) se deve
+    ser registrada como pulada; None se não há nada a fazer.
+    """
+    dia = ocorrencia_atual(tarefa, agora)
+    estado = estado_tarefa(ledger, tarefa['nome'], dia)
+    if estado['encerrada']:
+        return None
+    if estado['ultimo_fim'] is not None and agora < estado['ultimo_fim'] + INTERVALO_TENTATIVA:
+        return None  # aguardando a próxima tentativa
+    if tarefa['depende_de']:
+        dependencia = estado_tarefa(ledger, tarefa['depende_de'], dia)
+        if not dependencia['sucesso']:
+            if dependencia['encerrada']:
+                return dia, f"{tarefa['depende_de']} de {dia.strftime('%d/%m')} não concluiu"
+            return None  # aguardando a dependência
+    return dia, None
+
+def proximo_prazo(agora, ledger):
+    """Próximo instante em que há algo a fazer: horário de uma tarefa, nova tentativa ou heartbeat."""
+    candidatos = [agora + HEARTBEAT]
+    for tarefa in TAREFAS:
+        hoje = prazo(tarefa, agora.date())
+        candidatos.append(hoje if hoje > agora else hoje + timedelta(days=1))
+        estado = estado_tarefa(ledger, tarefa['nome'], ocorrencia_atual(tarefa, agora))
+        if not estado['encerrada'] and estado['ultimo_fim'] is not None:
+            candidatos.append(estado['ultimo_fim'] + INTERVALO_TENTATIVA)
+    return min(c for c in candidatos if c > agora)
+
+# --- Tarefas ---
+
+def executar_download():
+    sucesso = download_gmail.download_daily_attachments()
+    print("✅ Download concluído." if sucesso else "❌ Download sem arquivos ou com falha.")
+    return bool(sucesso)
+
+def executar_processamento():
+    # Executa fluxo sem baixar (o download do dia já concluiu) no worker residente
+    # (ou aqui, se ele não estiver rodando); se o dashboard já estiver rodando
+    # uma atualização, aguarda e reaproveita o resultado
+    sucesso, _ = worker_analise.executar_fluxo(baixar_email=False, incremental=worker_analise.INCREMENTAL)
+    print("✅ Processamento concluído." if sucesso else "❌ Processamento falhou.")
+    return bool(sucesso)
+
+EXECUTORES = {'download': executar_download, 'processamento': executar_processamento}
+
+def executar_pendentes(agora=None):
+    """Roda, na ordem de TAREFAS, tudo o que está pendente (inclusive ocorrências perdidas). Retorna quantas rodaram."""
+    executadas = 0
+    for tarefa in TAREFAS:
+        ledger = carregar_ledger()  # relido a cada tarefa: a anterior pode ter liberado a dependência
+        agora_tarefa = agora or datetime.now()
+        pendente = tarefa_pendente(tarefa, agora_tarefa, ledger)
+        if pendente is None:
+            continue
+        dia, motivo_pulo = pendente
+        registro = {'tarefa': tarefa['nome'], 'data_referencia': dia.isoformat(), 'inicio': datetime.now().isoformat()}
+        if motivo_pulo:
+            print(f"⏭️ {tarefa['descricao']} de {dia.strftime('%d/%m')} pulado: {motivo_pulo}")
+            registrar_execucao({**registro, 'fim': datetime.now().isoformat(), 'sucesso': False, 'pulada': True, 'motivo': motivo_pulo})
+            continue
+
+        atrasada = agora_tarefa - prazo(tarefa, dia) > timedelta(minutes=5)
+        tentativa = estado_tarefa(ledger, tarefa['nome'], dia)['tentativas'] + 1
+        hora, minuto = tarefa['horario']
+        print(f"\n⏰ [{hora:02d}:{minuto:02d}] Iniciando {tarefa['descricao']} de {dia.strftime('%d/%m')}"
+              f" (tentativa {tentativa}/{MAX_TENTATIVAS}{', recuperando execução perdida' if atrasada else ''})...")
+        try:
+            sucesso = EXECUTORES[tarefa['nome']]()
+            motivo = None
+        except Exception as e:
+            print(f"❌ Erro em {tarefa['nome']}: {e}")
+            sucesso, motivo = False, str(e)
+        registrar_execucao({
+            **registro, 'fim': datetime.now().isoformat(), 'sucesso': sucesso,
+            'tentativa': tentativa, 'recuperacao': atrasada, 'motivo': motivo
+        })
+        executadas += 1
+    return executadas
+
 def run_scheduler():
     print("🕒 Serviço de Agendamento Iniciado")
     print("📅 Tarefas agendadas:")
-    print("   - 06:30: Download de Arquivos (Gmail)")
-    print("   - 07:00: Processamento e Atualização do Dashboard")
+    for tarefa in TAREFAS:
+        hora, minuto = tarefa['horario']
+        dependencia = f" (após {tarefa['depende_de']})" if tarefa['depende_de'] else ""
+        print(f"   - {hora:02d}:{minuto:02d}: {tarefa['descricao']}{dependencia}")
+    print(f"📒 Registro de execuções: {LEDGER_FILE}")
     print("---------------------------------------------------")
-    
-    # Estado da execução diária
-    last_run_date = datetime.now().date()
-    # Se iniciou depois do horário, assume que não fez ainda (ou deixa para o dia seguinte? Melhor deixar para dia seguinte para evitar duplicidade acidental, ou manual)
-    # Resetando flags para o dia ATUAL
-    download_done = False
-    process_done = False
-    
+
     while True:
-        now = datetime.now()
-        current_time = now.strftime("%H:%M")
-        today_date = now.date()
-        
-        # Vira o dia
-        if today_date != last_run_date:
-            print(f"🌙 Virada de dia detectada: {last_run_date} -> {today_date}")
-            last_run_date = today_date
-            download_done = False
-            process_done = False
-        
-        # Tarefa 1: Download (06:30)
-        if current_time == "06:30" and not download_done:
-            print(f"\n⏰ [06:30] Iniciando Download...")
-            try:
-                download_gmail.download_daily_attachments()
-                print("✅ Download concluído (ou tentado).")
-            except Exception as e:
-                print(f"❌ Erro no download: {e}")
-            
-            download_done = True
-            time.sleep(60) # Evita reexecução no mesmo minuto
-            
-        # Tarefa 2: Processamento (07:00)
-        if current_time == "07:00" and not process_done:
-            print(f"\n⏰ [07:00] Iniciando Análise Diária...")
-            try:
-                # Executa fluxo sem baixar (pois já baixou as 06:30)
-                auto_analise.executar_fluxo_diario(baixar_email=False)
-                print("✅ Processamento concluído.")
-            except Exception as e:
-                print(f"❌ Erro no processamento: {e}")
-                
-            process_done = True
-            time.sleep(60)
-            
-        # Feedback de status (heartbeat a cada hora)
-        if now.minute == 0 and now.second < 5:
-            print(f"💓 Serviço ativo: {now.strftime('%d/%m %H:%M')}")
-            time.sleep(5)
-            
-        time.sleep(10)
+        executar_pendentes()
+        agora = datetime.now()
+        proximo = proximo_prazo(agora, carregar_ledger())
+        print(f"💓 Serviço ativo: {agora.strftime('%d/%m %H:%M')} | próximo despertar: {proximo.strftime('%d/%m %H:%M')}")
+        # Dorme até o prazo; o relógio de parede é reconferido ao acordar (suspensão,
+        # ajuste de hora), e o que tiver ficado para trás entra como recuperação
+        time.sleep(max(1.0, (proximo - datetime.now()).total_seconds()))
 
 if __name__ == "__main__":
     try:
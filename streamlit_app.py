@@ -1,14 +1,18 @@
 import streamlit as st
 import pandas as pd
-import io
 import re
-import json
 from difflib import SequenceMatcher
 from datetime import datetime, timedelta
-from pathlib import Path
-import altair as alt
-import plotly.express as px
-import plotly.graph_objects as go
+import analise_core
+import cubo_resultado
+import exportacao
+import filtros_resultado
+import graficos_cache
+import paginacao
+import historico_consultas
+import historico_store
+import jobs_analise
+import metricas_analise
 
 # Configuração da página
 st.set_page_config(
@@ -651,11 +655,12 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_bar=No
     }
     
     total_items = len(df_saida)
+    # Atualiza a barra no máximo a cada 250ms, com linhas/s e ETA
+    progresso = analise_core.ReporterProgresso(lambda p, msg: progress_bar.progress(p, text=msg), total_items) if progress_bar else None
     
-    for idx_s, row_s in df_saida.iterrows():
-        if progress_bar and idx_s % 20 == 0:  # Atualiza a cada 20 itens
-            progress = 0.05 + (idx_s / total_items) * 0.9
-            progress_bar.progress(progress, text=f"Analisando {idx_s + 1}/{total_items}")
+    for i, (idx_s, row_s) in enumerate(df_saida.iterrows()):
+        if progresso:
+            progresso.linha(i)
 
         doc_num = row_s['doc_num']
         produto_s = row_s['ds_produto']
@@ -691,7 +696,7 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_bar=No
                 data_s, row_s['unidade_origem'], row_s['unidade_destino'], doc_num, produto_s, row_e['ds_produto'],
                 row_s.get('especie', ''), valor_s, valor_e, diferenca_valor, 
                 qtd_s, qtd_e, diferenca_qtd,
-                status, tipo_div, "⭐⭐⭐ Excelente", obs, comp_info
+                status, tipo_div, analise_core.STATUS_CONFORME, 0, "⭐⭐⭐ Excelente", obs, comp_info
             ])
             continue # Pula processamento normal
         
@@ -970,7 +975,8 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_bar=No
                     data_s, row_s['unidade_origem'], row_s['unidade_destino'], doc_num, produto_s, "-",
                     row_s.get('especie', ''), valor_s, None, None, 
                     qtd_s, None, None,
-                    "❌ Não Conforme", "Item não encontrado (quantidade incompatível)", "-", 
+                    "❌ Não Conforme", "Item não encontrado (quantidade incompatível)",
+                    analise_core.STATUS_NAO_CONFORME, analise_core.DIV_NAO_ENCONTRADO, "-", 
                     f"Match rejeitado: Qtd muito divergente (Saída:{qtd_s} vs Entrada:{qtd_e})", "-"
                 ])
                 continue  # Pula para próximo item
@@ -1020,17 +1026,21 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_bar=No
                 # Quantidade diferente: usa tolerância fixa de R$ 10
                 conforme_valor = abs(diferenca_valor) <= 10
             
+            flags_div = 0
             if conforme_valor and conforme_qtd:
                 status = "✅ Conforme"
+                codigo_status = analise_core.STATUS_CONFORME
                 tipo_div = "-"
                 stats['conformes'] += 1
             else:
                 status = "⚠️ Não Conforme"
+                codigo_status = analise_core.STATUS_NAO_CONFORME
                 stats['nao_conformes'] += 1
                 
                 tipos_div = []
                 if not conforme_valor:
                     stats['valor_divergente'] += 1
+                    flags_div |= analise_core.DIV_VALOR
                     if perc_diff_valor > 50:
                         tipos_div.append("Valor muito divergente (>50%)")
                     elif perc_diff_valor > 20:
@@ -1040,6 +1050,7 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_bar=No
                 
                 if not conforme_qtd:
                     stats['qtd_divergente'] += 1
+                    flags_div |= analise_core.DIV_QTD
                     tipos_div.append(f"Divergência Qtd ({diferenca_qtd:+g})")
                 
                 tipo_div = " | ".join(tipos_div)
@@ -1051,7 +1062,7 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_bar=No
                 data_s, row_s['unidade_origem'], row_s['unidade_destino'], doc_num, produto_s, row_e['ds_produto'],
                 row_s.get('especie', ''), valor_s, valor_e, diferenca_valor, 
                 qtd_s, qtd_e, diferenca_qtd,
-                status, tipo_div, qualidade_match, obs, comp_info
+                status, tipo_div, codigo_status, flags_div, qualidade_match, obs, comp_info
             ])
         else:
             stats['nao_encontrados'] += 1
@@ -1069,7 +1080,8 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_bar=No
                 data_s, row_s['unidade_origem'], row_s['unidade_destino'], doc_num, produto_s, "-",
                 row_s.get('especie', ''), valor_s, None, None, 
                 qtd_s, None, None,
-                "❌ Não Conforme", motivo, "-", "Sem correspondência encontrada", "-"
+                "❌ Não Conforme", motivo, analise_core.STATUS_NAO_CONFORME, analise_core.DIV_NAO_ENCONTRADO,
+                "-", "Sem correspondência encontrada", "-"
             ])
     
     if progress_bar:
@@ -1095,7 +1107,8 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_bar=No
             doc_num_e, "-", produto_e, row_e.get('especie', ''),
             None, float(row_e['valor_total']), None, 
             None, qtd_e, None,
-            "❌ Não Conforme", "Item recebido sem saída correspondente", "-",
+            "❌ Não Conforme", "Item recebido sem saída correspondente",
+            analise_core.STATUS_ORFA, analise_core.DIV_NAO_ENCONTRADO, "-",
             "Entrada órfã", "-"
         ])
     
@@ -1104,58 +1117,24 @@ def analisar_itens(df_saida, df_entrada, limiar_similaridade=65, progress_bar=No
         "Produto (Saída)", "Produto (Entrada)", "Espécie", 
         "Valor Saída (R$)", "Valor Entrada (R$)", "Diferença (R$)",
         "Qtd Saída", "Qtd Entrada", "Diferença Qtd",
-        "Status", "Tipo de Divergência", 
+        "Status", "Tipo de Divergência", "Código Status", "Flags Divergência",
         "Qualidade Match", "Observações", "Detalhes Produto"
     ])
+    df_resultado['Status'] = df_resultado['Status'].astype('category')
+    df_resultado[analise_core.COLUNAS_CODIGOS] = df_resultado[analise_core.COLUNAS_CODIGOS].astype('int8')
     
     if progress_bar:
         progress_bar.progress(1.0, text="Concluído!")
     
     return df_resultado, stats
 
-def gerar_excel_bytes(df):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name="Análise Completa")
-        df[df['Status'].str.contains('Não Conforme', na=False)].to_excel(writer, index=False, sheet_name="Não Conformes")
-        df[df['Status'].str.contains('Conforme', na=False) & ~df['Status'].str.contains('Não', na=False)].to_excel(writer, index=False, sheet_name="Conformes")
-    return output.getvalue()
-
 # --- Funções de Histórico ---
-
-def get_history_dir():
-    """Retorna o diretório de histórico, criando se não existir."""
-    history_dir = Path("historico_analises")
-    history_dir.mkdir(exist_ok=True)
-    return history_dir
+# Backend em historico_store: Parquet por análise + catálogo SQLite
 
 def save_analysis_to_history(df_resultado, stats, file_saida_name, file_entrada_name):
     """Salva uma análise no histórico."""
     try:
-        history_dir = get_history_dir()
-        timestamp = datetime.now()
-        analysis_id = timestamp.strftime("%Y%m%d_%H%M%S")
-        
-        # Salva o DataFrame como CSV (mais leve que Excel)
-        csv_path = history_dir / f"{analysis_id}_dados.csv"
-        df_resultado.to_csv(csv_path, index=False, encoding='utf-8-sig')
-        
-        # Salva metadados
-        metadata = {
-            'id': analysis_id,
-            'timestamp': timestamp.isoformat(),
-            'data_formatada': timestamp.strftime("%d/%m/%Y %H:%M:%S"),
-            'arquivo_saida': file_saida_name,
-            'arquivo_entrada': file_entrada_name,
-            'total_itens': len(df_resultado),
-            'stats': stats
-        }
-        
-        metadata_path = history_dir / f"{analysis_id}_metadata.json"
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
-        
-        return analysis_id
+        return historico_store.salvar_analise(df_resultado, stats, file_saida_name, file_entrada_name)
     except Exception as e:
         st.error(f"Erro ao salvar histórico: {e}")
         return None
@@ -1163,39 +1142,15 @@ def save_analysis_to_history(df_resultado, stats, file_saida_name, file_entrada_
 def load_history_list():
     """Carrega lista de análises do histórico."""
     try:
-        history_dir = get_history_dir()
-        metadata_files = sorted(history_dir.glob("*_metadata.json"), reverse=True)
-        
-        history_list = []
-        for metadata_file in metadata_files:
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-                history_list.append(metadata)
-        
-        return history_list
+        return historico_store.listar_analises()
     except Exception as e:
         st.error(f"Erro ao carregar histórico: {e}")
         return []
 
 def load_analysis_from_history(analysis_id):
-    """Carrega uma análise específica do histórico."""
+    """Carrega uma análise específica do histórico (colunas já tipadas)."""
     try:
-        history_dir = get_history_dir()
-        csv_path = history_dir / f"{analysis_id}_dados.csv"
-        metadata_path = history_dir / f"{analysis_id}_metadata.json"
-        
-        if csv_path.exists() and metadata_path.exists():
-            df = pd.read_csv(csv_path, encoding='utf-8-sig')
-            # Converte coluna de data de volta para datetime
-            if 'Data' in df.columns:
-                df['Data'] = pd.to_datetime(df['Data'], errors='coerce')
-            
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            
-            return df, metadata
-        else:
-            return None, None
+        return historico_store.carregar_analise(analysis_id)
     except Exception as e:
         st.error(f"Erro ao carregar análise: {e}")
         return None, None
@@ -1203,27 +1158,77 @@ def load_analysis_from_history(analysis_id):
 def delete_analysis_from_history(analysis_id):
     """Remove uma análise do histórico."""
     try:
-        history_dir = get_history_dir()
-        csv_path = history_dir / f"{analysis_id}_dados.csv"
-        metadata_path = history_dir / f"{analysis_id}_metadata.json"
-        
-        if csv_path.exists():
-            csv_path.unlink()
-        if metadata_path.exists():
-            metadata_path.unlink()
-        
+        historico_store.remover_analise(analysis_id)
         return True
     except Exception as e:
         st.error(f"Erro ao deletar análise: {e}")
         return False
 
+# --- Jobs de Análise (Segundo Plano) ---
+
+@st.cache_resource
+def obter_gerenciador_jobs():
+    """Gerenciador único por processo, compartilhado entre as sessões."""
+    return jobs_analise.GerenciadorJobs(max_workers=2)
+
+class _BarraProgressoJob:
+    """Adapta o progress_callback do job à interface progress(p, text=...) usada pelo analisar_itens."""
+    def __init__(self, progress_callback):
+        self.progress_callback = progress_callback
+
+    def progress(self, p, text=""):
+        self.progress_callback(p, text)
+
+def executar_analise_job(df_saida, df_entrada, limiar, nome_saida, nome_entrada, progress_callback=None):
+    """Corpo do job: análise + cubo diário + gravação no histórico. Roda fora da thread do script."""
+    df_res, stats = analisar_itens(df_saida, df_entrada, limiar, _BarraProgressoJob(progress_callback))
+    analysis_id = save_analysis_to_history(df_res, stats, nome_saida, nome_entrada)
+    cubo = cubo_resultado.construir_cubo(df_res)
+    dimensoes = cubo_resultado.dimensoes(cubo)
+    return {
+        'df_resultado': cubo_resultado.codificar_unidades(df_res, dimensoes['unidades']),
+        'cubo': cubo,
+        'dimensoes': dimensoes,
+        'stats': stats,
+        'analysis_id': analysis_id,
+        'metadata': {
+            'arquivo_saida': nome_saida,
+            'arquivo_entrada': nome_entrada,
+            'data_formatada': datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
+            'data_analise': datetime.now().date()
+        }
+    }
+
+# --- Estado da Sessão ---
+if 'df_resultado' not in st.session_state:
+    st.session_state.df_resultado = None
+if 'cubo' not in st.session_state:
+    st.session_state.cubo = None
+if 'dimensoes' not in st.session_state:
+    st.session_state.dimensoes = None  # tabelas de dimensão dos filtros (cubo_resultado.dimensoes)
+if 'indice_datas' not in st.session_state:
+    st.session_state.indice_datas = None  # índice ordenado das datas para o filtro de período (filtros_resultado)
+if 'resultado_versao' not in st.session_state:
+    st.session_state.resultado_versao = None  # id do job que gerou o resultado (chave do cache de exportação)
+if 'current_metadata' not in st.session_state:
+    st.session_state.current_metadata = None
+if 'job_id' not in st.session_state:
+    st.session_state.job_id = None
+
 # --- Interface Streamlit ---
 
 col_logo, col_title, col_opts = st.columns([1, 4, 1])
 
 with col_opts:
     if st.button("🔄 Reiniciar", use_container_width=True, type="secondary", help="Limpa a análise e anexo atual"):
+        if st.session_state.get('job_id'):
+            obter_gerenciador_jobs().cancelar(st.session_state.job_id)
+        st.session_state.job_id = None
         st.session_state.df_resultado = None
+        st.session_state.cubo = None
+        st.session_state.dimensoes = None
+        st.session_state.indice_datas = None
+        st.session_state.resultado_versao = None
         st.session_state.current_metadata = None
         st.rerun()
 
@@ -1275,11 +1280,6 @@ with st.expander("📁 Upload e Configurações da Análise", expanded=expander_
 
 
 # --- Lógica de Processamento ---
-if 'df_resultado' not in st.session_state:
-    st.session_state.df_resultado = None
-if 'current_metadata' not in st.session_state:
-    st.session_state.current_metadata = None
-
 if processar and uploaded_files:
     with st.spinner("Processando arquivos..."):
         # Classifica todos os arquivos em Saída ou Entrada
@@ -1398,34 +1398,328 @@ if processar and uploaded_files:
         if 'valor_total' in df_entrada.columns:
             df_entrada['valor_total'] = df_entrada['valor_total'].apply(normalizar_valor_numerico)
         
-        # Processa
-        progress_bar = st.progress(0, text="Iniciando...")
-        df_res, stats = analisar_itens(df_saida, df_entrada, limiar, progress_bar)
-        progress_bar.empty()
-        
-        # Salva no histórico
-        analysis_id = save_analysis_to_history(df_res, stats, nome_saida, nome_entrada)
-        if analysis_id:
-            st.toast("Análise salva no histórico!")
-        
-        st.session_state.df_resultado = df_res
-        st.session_state.current_metadata = {
-            'arquivo_saida': nome_saida,
-            'arquivo_entrada': nome_entrada,
-            'data_formatada': datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        }
-        st.toast("✅ Análise concluída!", icon="✅")
+        # Processa em segundo plano (a sessão só acompanha o job)
+        if st.session_state.job_id:
+            obter_gerenciador_jobs().cancelar(st.session_state.job_id)
+        st.session_state.job_id = obter_gerenciador_jobs().submeter(
+            executar_analise_job, df_saida, df_entrada, limiar, nome_saida, nome_entrada,
+            descricao=f"{nome_saida} x {nome_entrada}"
+        )
+
+# --- Acompanhamento do Job ---
+# Enquanto o job roda, só o painel de progresso é reexecutado (fragmento a cada 1s);
+# quando ele termina, a página inteira roda de novo para aplicar o resultado.
+
+@st.fragment(run_every=1)
+def painel_job():
+    gerenciador = obter_gerenciador_jobs()
+    job = gerenciador.obter(st.session_state.job_id) if st.session_state.job_id else None
+    if job is None or job.finalizado:
+        st.rerun()
+    if job.estado == 'na_fila':
+        st.info(f"⏳ Análise na fila ({gerenciador.posicao_na_fila(job.id)} à frente)...")
+    st.progress(min(max(job.progresso, 0.0), 1.0), text=job.mensagem)
+    if st.button("⛔ Cancelar Análise"):
+        gerenciador.cancelar(job.id)
+
+if st.session_state.job_id:
+    gerenciador = obter_gerenciador_jobs()
+    job = gerenciador.obter(st.session_state.job_id)
+    
+    if job is None:
+        st.session_state.job_id = None
+        st.warning("A análise em segundo plano expirou. Processe os arquivos novamente.")
+    elif not job.finalizado:
+        painel_job()
+    else:
+        st.session_state.job_id = None
+        if job.estado == 'concluido':
+            if job.resultado['analysis_id']:
+                st.toast("Análise salva no histórico!")
+            st.session_state.df_resultado = job.resultado['df_resultado']
+            st.session_state.cubo = job.resultado['cubo']
+            st.session_state.dimensoes = job.resultado['dimensoes']
+            st.session_state.indice_datas = None
+            st.session_state.resultado_versao = job.id
+            st.session_state.current_metadata = job.resultado['metadata']
+            st.toast("✅ Análise concluída!", icon="✅")
+        elif job.estado == 'cancelado':
+            st.warning("Análise cancelada.")
+        else:
+            st.error(f"❌ Erro na análise: {job.erro}")
 
 # --- Dashboard ---
-if st.session_state.df_resultado is not None:
+# O painel roda como fragmento (st.fragment): mudar um filtro reexecuta só o painel,
+# sem repetir uploads, acompanhamento do job e CSS; busca e paginação da tabela
+# reexecutam só a tabela, e as Tendências do Histórico são outro fragmento.
+# Posições filtradas e cubo filtrado ficam em cache por versão do resultado + filtros.
+
+def filtrar_cubo(cubo, status_filter, unidade_filter, date_range):
+    return cubo_resultado.filtrar(
+        cubo, status=list(status_filter), unidades=list(unidade_filter),
+        data_inicio=date_range[0] if len(date_range) == 2 else None,
+        data_fim=date_range[1] if len(date_range) == 2 else None
+    )
+
+# `versao` (id do job) identifica o resultado; argumentos com "_" não entram no hash do cache
+@st.cache_data(max_entries=64, show_spinner=False)
+def posicoes_filtradas(versao, _df, _indice, status_filter, unidade_filter, date_range):
+    return filtros_resultado.filtrar_posicoes(_df, _indice, status_filter, unidade_filter, date_range)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cubo_filtrado_cache(versao, _cubo, status_filter, unidade_filter, date_range):
+    return filtrar_cubo(_cubo, status_filter, unidade_filter, date_range)
+
+# --- Figuras do Dashboard ---
+# Montadas via graficos_cache: rerun com os mesmos agregados e cores reaproveita o JSON da figura.
+# O Plotly é importado só aqui (e nas tendências), quando há gráfico para montar: a tela
+# de upload abre sem carregá-lo.
+
+def figura_status(status_counts, chart_text_color, chart_grid_color):
+    import plotly.graph_objects as go
+    # Gráfico de rosca com Plotly - texto otimizado
+    fig_status = go.Figure(data=[go.Pie(
+        labels=status_counts.index,
+        values=status_counts.values,
+        hole=0.6,
+        marker=dict(
+            colors=['#00C853', '#FF6B6B', '#FFA726'],
+            line=dict(color='white', width=3)
+        ),
+        textposition='outside',
+        textinfo='label+percent',
+        textfont=dict(size=13, family="Arial", color=chart_text_color),
+        insidetextorientation='radial',
+        pull=[0.05, 0.05, 0.05],  # Separa levemente as fatias
+        hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
+    )])
+
+    fig_status.update_layout(
+        showlegend=False,  # Remove legenda duplicada
+        height=380,
+        margin=dict(t=10, b=10, l=10, r=10),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Arial", size=13, color=chart_text_color)
+    )
+    return fig_status
+
+def figura_divergencias(div_counts, chart_text_color, chart_grid_color):
+    import plotly.graph_objects as go
+    fig_div = go.Figure(data=[go.Bar(
+        x=div_counts.values,
+        y=div_counts.index,
+        orientation='h',
+        marker=dict(
+            color=div_counts.values,
+            colorscale='Reds',
+            line=dict(color='white', width=1)
+        ),
+        text=div_counts.values,
+        textposition='outside',
+        textfont=dict(color=chart_text_color),
+        hovertemplate='<b>%{y}</b><br>Quantidade: %{x}<extra></extra>'
+    )])
+
+    # Calcula limite do eixo X com folga para o texto
+    max_val = div_counts.values.max()
+
+    fig_div.update_layout(
+        height=350,
+        margin=dict(t=20, b=20, l=20, r=50),  # Margem direita aumentada
+        xaxis_title="Quantidade",
+        yaxis_title="",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Arial", size=12, color=chart_text_color),
+        xaxis=dict(
+            showgrid=True, 
+            gridcolor=chart_grid_color, 
+            title_font=dict(color=chart_text_color), 
+            tickfont=dict(color=chart_text_color),
+            range=[0, max_val * 1.2]  # 20% de folga
+        ),
+        yaxis=dict(showgrid=False, tickfont=dict(color=chart_text_color))
+    )
+    return fig_div
+
+def figura_temporal(temporal, chart_text_color, chart_grid_color):
+    import plotly.express as px
+    fig_temporal = px.line(
+        temporal,
+        x='Data_Agrupada',
+        y='Quantidade',
+        color='Status',
+        markers=True,
+        color_discrete_map={
+            '✅ Conforme': '#00C853',
+            '⚠️ Não Conforme': '#FF6B6B',
+            '❌ Não Conforme': '#FFA726'
+        }
+    )
+
+    fig_temporal.update_layout(
+        height=350,
+        margin=dict(t=20, b=60, l=20, r=20),
+        xaxis_title="Data",
+        yaxis_title="Quantidade",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Arial", size=12, color=chart_text_color),
+        hovermode='x unified',
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=-0.4,
+            xanchor="center",
+            x=0.5,
+            font=dict(color=chart_text_color)
+        ),
+        xaxis=dict(
+            tickangle=-45,  # Rotaciona labels
+            tickmode='auto',
+            nticks=10,  # Limita número de ticks
+            tickfont=dict(size=10, color=chart_text_color),
+            title_font=dict(color=chart_text_color),
+            gridcolor=chart_grid_color
+        ),
+        yaxis=dict(
+            tickfont=dict(color=chart_text_color),
+            title_font=dict(color=chart_text_color),
+            gridcolor=chart_grid_color
+        )
+    )
+    return fig_temporal
+
+def figura_hospitais(hospitais_div, chart_text_color, chart_grid_color):
+    import plotly.graph_objects as go
+    fig_hosp = go.Figure(data=[go.Bar(
+        x=hospitais_div.values,
+        y=hospitais_div.index,
+        orientation='h',
+        marker=dict(
+            color='#E87722',
+            line=dict(color='white', width=1)
+        ),
+        text=hospitais_div.values,
+        textposition='outside',
+        textfont=dict(color=chart_text_color),
+        hovertemplate='<b>%{y}</b><br>Divergências: %{x}<extra></extra>'
+    )])
+
+    # Calcula limite do eixo X com folga
+    max_val_hosp = hospitais_div.values.max()
+
+    fig_hosp.update_layout(
+        height=350,
+        margin=dict(t=20, b=20, l=20, r=50),  # Margem direita aumentada
+        xaxis_title="Quantidade de Divergências",
+        yaxis_title="",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Arial", size=12, color=chart_text_color),
+        xaxis=dict(
+            showgrid=True, 
+            gridcolor=chart_grid_color, 
+            title_font=dict(color=chart_text_color), 
+            tickfont=dict(color=chart_text_color),
+            range=[0, max_val_hosp * 1.2]  # 20% de folga
+        ),
+        yaxis=dict(showgrid=False, tickfont=dict(color=chart_text_color))
+    )
+    return fig_hosp
+
+@st.fragment
+def tabela_detalhada(df_filtered, chave_download):
+    """Tabela paginada + downloads; busca e paginação reexecutam só este fragmento."""
+    tempos = metricas_analise.TemposRender("tabela")
+    st.subheader("Detalhamento dos Dados")
+    
+    # Só a página visível vai para o navegador (busca/ordenação no servidor, ver paginacao)
+    colunas_ordem = [c for c in df_filtered.columns if c != 'Data_Obj' and c not in analise_core.COLUNAS_CODIGOS]
+    col_busca, col_ordem, col_sentido, col_tamanho = st.columns([3, 2, 1, 1])
+    with col_busca:
+        busca_detalhe = st.text_input("🔎 Buscar na tabela", key="busca_detalhe", placeholder="Documento, produto, unidade...")
+    with col_ordem:
+        ordem_detalhe = st.selectbox("Ordenar por", colunas_ordem, key="ordem_detalhe")
+    with col_sentido:
+        crescente_detalhe = st.radio("Ordem", ["Crescente", "Decrescente"], key="sentido_detalhe") == "Crescente"
+    with col_tamanho:
+        tamanho_detalhe = st.selectbox("Linhas por página", paginacao.TAMANHOS_PAGINA, index=1, key="tamanho_detalhe")
+    
+    df_pagina, total_detalhe, paginas_detalhe = paginacao.pagina(
+        df_filtered, st.session_state.get('pagina_detalhe', 1), tamanho_detalhe,
+        busca_detalhe, ordem_detalhe, crescente_detalhe
+    )
+    # Filtro/busca novos podem encolher o total: a página volta para dentro do limite antes do widget
+    if st.session_state.get('pagina_detalhe', 1) > paginas_detalhe:
+        st.session_state.pagina_detalhe = paginas_detalhe
+    
+    st.dataframe(
+        df_pagina,
+        use_container_width=True,
+        column_config={
+            "Data": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+            "Valor Saída (R$)": st.column_config.NumberColumn("Valor Saída", format="R$ %.2f"),
+            "Valor Entrada (R$)": st.column_config.NumberColumn("Valor Entrada", format="R$ %.2f"),
+            "Diferença (R$)": st.column_config.NumberColumn("Diferença", format="R$ %.2f"),
+            "Status": st.column_config.TextColumn("Status"),
+            "Código Status": None,  # códigos internos ficam ocultos
+            "Flags Divergência": None,
+        },
+        hide_index=True
+    )
+    col_pagina, col_info = st.columns([1, 3])
+    with col_pagina:
+        st.number_input("Página", min_value=1, max_value=paginas_detalhe, step=1, key="pagina_detalhe")
+    with col_info:
+        inicio_pagina = (st.session_state.pagina_detalhe - 1) * tamanho_detalhe
+        st.caption(
+            f"Linhas {min(inicio_pagina + 1, total_detalhe)}–{inicio_pagina + len(df_pagina)} de {total_detalhe} "
+            f"(página {st.session_state.pagina_detalhe} de {paginas_detalhe}). "
+            "Os downloads abaixo trazem todas as linhas filtradas."
+        )
+    
+    tempos.marcar("página")
+    
+    data_analise = (st.session_state.current_metadata or {}).get('data_analise')
+    col_xlsx, col_parquet, col_arrow, col_csv = st.columns(4)
+    with col_xlsx:
+        st.download_button(
+            label="Baixar Dados Filtrados (Excel)",
+            data=exportacao.download(df_filtered, chave_download),
+            file_name="analise_dashboard.xlsx",
+            mime=exportacao.MIMES['xlsx'],
+            type="primary"
+        )
+    # Formatos colunares para BI / sistemas externos (esquema tipado fixo, ver exportacao.ESQUEMA)
+    for coluna, formato, rotulo in ((col_parquet, 'parquet', "Parquet"), (col_arrow, 'arrow', "Arrow IPC"), (col_csv, 'csv.gz', "CSV (gzip)")):
+        with coluna:
+            st.download_button(
+                label=f"Baixar {rotulo}",
+                data=exportacao.download(df_filtered, chave_download, formato, data_analise),
+                file_name=f"analise_dashboard{exportacao.FORMATOS[formato]}",
+                mime=exportacao.MIMES[formato],
+                key=f"download_{formato}"
+            )
+    tempos.marcar("downloads")
+    tempos.fim()
+
+@st.fragment
+def painel_dashboard():
+    tempos = metricas_analise.TemposRender("dashboard")
     df = st.session_state.df_resultado
+    if st.session_state.cubo is None:
+        st.session_state.cubo = cubo_resultado.construir_cubo(df)
+    if st.session_state.dimensoes is None:
+        st.session_state.dimensoes = cubo_resultado.dimensoes(st.session_state.cubo)
+    dimensoes = st.session_state.dimensoes
     
-    # Mostra informações da análise atual
     # Mostra informações do período apurado
-    min_date_apurado = df['Data'].min()
-    max_date_apurado = df['Data'].max()
+    min_date_apurado = dimensoes['data_min']
+    max_date_apurado = dimensoes['data_max']
     
-    if pd.notna(min_date_apurado) and pd.notna(max_date_apurado):
+    if min_date_apurado is not None and max_date_apurado is not None:
         periodo_str = f"{min_date_apurado.strftime('%d/%m/%Y')} até {max_date_apurado.strftime('%d/%m/%Y')}"
     else:
         periodo_str = "-"
@@ -1437,40 +1731,38 @@ if st.session_state.df_resultado is not None:
         c_filt1, c_filt2, c_filt3 = st.columns(3)
         with c_filt1:
             # Filtro de Status
-            status_options = df['Status'].unique()
+            status_options = dimensoes['status']
             status_filter = st.multiselect("Status", status_options, default=status_options)
         
         with c_filt2:
             # Filtro de Unidade
-            unidades = sorted(list(set(df['Unidade Origem'].unique()) | set(df['Unidade Destino'].unique())))
+            unidades = dimensoes['unidades']
             unidade_filter = st.multiselect("Unidade (Origem/Destino)", unidades)
             
         with c_filt3:
             # Filtro de Data
-            min_date = df['Data'].min()
-            max_date = df['Data'].max()
-            date_range = st.date_input("Período", [min_date, max_date])
+            date_range = st.date_input("Período", [min_date_apurado, max_date_apurado] if min_date_apurado is not None else [])
     
     # Aplica Filtros
-    df_filtered = df[df['Status'].isin(status_filter)]
-    
-    if unidade_filter:
-        df_filtered = df_filtered[
-            df_filtered['Unidade Origem'].isin(unidade_filter) | 
-            df_filtered['Unidade Destino'].isin(unidade_filter)
-        ]
-        
-    if len(date_range) == 2:
-        df_filtered = df_filtered[
-            (df_filtered['Data'].dt.date >= date_range[0]) & 
-            (df_filtered['Data'].dt.date <= date_range[1])
-        ]
+    # KPIs e gráficos saem do cubo diário (mesmos filtros); df_filtered só alimenta tabela e exportação
+    if st.session_state.indice_datas is None:
+        st.session_state.indice_datas = filtros_resultado.indice_datas(df['Data'])
+    filtros = (tuple(status_filter), tuple(unidade_filter), tuple(date_range))
+    if st.session_state.resultado_versao is not None:
+        posicoes = posicoes_filtradas(st.session_state.resultado_versao, df, st.session_state.indice_datas, *filtros)
+        cubo_filtrado = cubo_filtrado_cache(st.session_state.resultado_versao, st.session_state.cubo, *filtros)
+    else:
+        posicoes = filtros_resultado.filtrar_posicoes(df, st.session_state.indice_datas, *filtros)
+        cubo_filtrado = filtrar_cubo(st.session_state.cubo, *filtros)
+    df_filtered = df.take(posicoes)
+    indicadores = cubo_resultado.indicadores(cubo_filtrado)
+    tempos.marcar("filtros")
     
     # --- Balanço Financeiro do Período ---
     st.markdown("### Balanço Financeiro do Período")
     
-    total_saida_periodo = df_filtered['Valor Saída (R$)'].sum()
-    total_entrada_periodo = df_filtered['Valor Entrada (R$)'].sum()
+    total_saida_periodo = indicadores['valor_saida']
+    total_entrada_periodo = indicadores['valor_entrada']
     diff_financeira_periodo = total_saida_periodo - total_entrada_periodo
     
     col_balanco1, col_balanco2, col_balanco3 = st.columns(3)
@@ -1495,58 +1787,27 @@ if st.session_state.df_resultado is not None:
             delta_color="inverse",
             help="Balanço Líquido: Total Saída - Total Entrada. Indica se 'sobrou' ou 'faltou' valor no total geral."
         )
+    tempos.marcar("balanço")
     
     st.divider()
 
     # --- KPIs Premium ---
     st.markdown("### Indicadores Principais")
     
-    # CSS para valores divergentes em vermelho (ambos os temas) e ajuste de fonte
-    st.markdown("""
-        <style>
-        /* Ajuste de tamanho de fonte para caber 5 colunas */
-        [data-testid="stMetricValue"] {
-            font-size: 22px !important;
-        }
-        
-        /* KPI Não Conformes - texto vermelho - mais específico */
-        div[data-testid="stMetric"]:nth-of-type(3) [data-testid="stMetricValue"],
-        div[data-testid="stMetric"]:nth-of-type(3) [data-testid="stMetricValue"] div,
-        div[data-testid="stMetric"]:nth-of-type(3) [data-testid="stMetricValue"] * {
-            color: #FF4444 !important;
-        }
-        /* KPI Valor Divergente - texto vermelho - mais específico */
-        div[data-testid="stMetric"]:nth-of-type(4) [data-testid="stMetricValue"],
-        div[data-testid="stMetric"]:nth-of-type(4) [data-testid="stMetricValue"] div,
-        div[data-testid="stMetric"]:nth-of-type(4) [data-testid="stMetricValue"] * {
-            color: #FF4444 !important;
-        }
-        /* KPI Divergência Qtd - texto vermelho - mais específico */
-        div[data-testid="stMetric"]:nth-of-type(5) [data-testid="stMetricValue"],
-        div[data-testid="stMetric"]:nth-of-type(5) [data-testid="stMetricValue"] div,
-        div[data-testid="stMetric"]:nth-of-type(5) [data-testid="stMetricValue"] * {
-            color: #FF4444 !important;
-        }
-        </style>
-    """, unsafe_allow_html=True)
-    
     # Ajusta largura das colunas para dar mais espaço ao Valor Divergente
     kpi1, kpi2, kpi3, kpi4, kpi5 = st.columns([1, 1, 1, 1.3, 1])
     
-    total_analisado = len(df_filtered)
+    total_analisado = indicadores['total_itens']
     
-    total_conforme = len(df_filtered[df_filtered['Status'].str.contains('Conforme') & ~df_filtered['Status'].str.contains('Não')])
-    total_nao_conforme = len(df_filtered[df_filtered['Status'].str.contains('Não Conforme')])
+    total_conforme = indicadores['conformes']
+    total_nao_conforme = indicadores['nao_conformes']
     
     # Cálculos de divergência
-    valor_divergente = df_filtered[df_filtered['Status'].str.contains('Não Conforme')]['Diferença (R$)'].abs().sum()
+    valor_divergente = indicadores['valor_divergente']
     
-    # Conta itens com divergência de quantidade (excluindo não encontrados/nulos)
+    # Itens com divergência de quantidade (excluindo não encontrados/nulos)
     # Considera divergência se 'Diferença Qtd' não é nulo e é diferente de 0
-    qtd_divergente_count = len(df_filtered[
-        (df_filtered['Diferença Qtd'].notna()) & 
-        (df_filtered['Diferença Qtd'] != 0)
-    ])
+    qtd_divergente_count = indicadores['qtd_divergente']
     
     # Calcula percentuais
     perc_conforme = (total_conforme / total_analisado * 100) if total_analisado > 0 else 0
@@ -1615,10 +1876,12 @@ if st.session_state.df_resultado is not None:
                          delta=f"+{total_sobra:.0f} unidades", delta_color="off")
             with col_res3:
                 st.metric("Divergência Total", f"{abs(total_falta) + total_sobra:.0f} unidades")
+    tempos.marcar("indicadores")
     
     # Define cor do texto dos gráficos (sempre claro)
     chart_text_color = '#001A72'
     chart_grid_color = 'rgba(128,128,128,0.2)'
+    tema_graficos = dict(chart_text_color=chart_text_color, chart_grid_color=chart_grid_color)
 
     # --- Gráficos Premium ---
     col_chart1, col_chart2 = st.columns(2)
@@ -1627,82 +1890,24 @@ if st.session_state.df_resultado is not None:
         st.markdown("#### Distribuição de Status")
         
         # Conta status
-        status_counts = df_filtered['Status'].value_counts()
-        
-        # Gráfico de rosca com Plotly - texto otimizado
-        fig_status = go.Figure(data=[go.Pie(
-            labels=status_counts.index,
-            values=status_counts.values,
-            hole=0.6,
-            marker=dict(
-                colors=['#00C853', '#FF6B6B', '#FFA726'],
-                line=dict(color='white', width=3)
-            ),
-            textposition='outside',
-            textinfo='label+percent',
-            textfont=dict(size=13, family="Arial", color=chart_text_color),
-            insidetextorientation='radial',
-            pull=[0.05, 0.05, 0.05],  # Separa levemente as fatias
-            hovertemplate='<b>%{label}</b><br>Quantidade: %{value}<br>Percentual: %{percent}<extra></extra>'
-        )])
+        status_counts = cubo_resultado.contagem_por(cubo_filtrado, 'Status')
         
-        fig_status.update_layout(
-            showlegend=False,  # Remove legenda duplicada
-            height=380,
-            margin=dict(t=10, b=10, l=10, r=10),
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(family="Arial", size=13, color=chart_text_color)
-        )
+        fig_status = graficos_cache.figura('status', figura_status, status_counts, **tema_graficos)
         
         st.plotly_chart(fig_status, use_container_width=True)
         
     with col_chart2:
         st.markdown("#### Top 5 Divergências")
         
-        df_div = df_filtered[df_filtered['Status'].str.contains('Não Conforme')]
-        if not df_div.empty:
-            div_counts = df_div['Tipo de Divergência'].value_counts().head(5)
+        div_counts = cubo_resultado.contagem_por(cubo_filtrado, 'Tipo de Divergência', analise_core.STATUS_NAO_CONFORMES).head(5)
+        if not div_counts.empty:
             
-            fig_div = go.Figure(data=[go.Bar(
-                x=div_counts.values,
-                y=div_counts.index,
-                orientation='h',
-                marker=dict(
-                    color=div_counts.values,
-                    colorscale='Reds',
-                    line=dict(color='white', width=1)
-                ),
-                text=div_counts.values,
-                textposition='outside',
-                textfont=dict(color=chart_text_color),
-                hovertemplate='<b>%{y}</b><br>Quantidade: %{x}<extra></extra>'
-            )])
-            
-            # Calcula limite do eixo X com folga para o texto
-            max_val = div_counts.values.max()
-            
-            fig_div.update_layout(
-                height=350,
-                margin=dict(t=20, b=20, l=20, r=50),  # Margem direita aumentada
-                xaxis_title="Quantidade",
-                yaxis_title="",
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font=dict(family="Arial", size=12, color=chart_text_color),
-                xaxis=dict(
-                    showgrid=True, 
-                    gridcolor=chart_grid_color, 
-                    title_font=dict(color=chart_text_color), 
-                    tickfont=dict(color=chart_text_color),
-                    range=[0, max_val * 1.2]  # 20% de folga
-                ),
-                yaxis=dict(showgrid=False, tickfont=dict(color=chart_text_color))
-            )
+            fig_div = graficos_cache.figura('divergencias', figura_divergencias, div_counts, **tema_graficos)
             
             st.plotly_chart(fig_div, use_container_width=True)
         else:
             st.info("Nenhuma divergência encontrada!")
+    tempos.marcar("gráficos status/divergências")
     
     # --- Linha 2: Análise Temporal e Hospitais ---
     col_chart3, col_chart4 = st.columns(2)
@@ -1710,133 +1915,136 @@ if st.session_state.df_resultado is not None:
     with col_chart3:
         st.markdown("#### Evolução Temporal")
         
-        # Agrupa por data
-        df_temp = df_filtered.copy()
-        df_temp['Data_Agrupada'] = pd.to_datetime(df_temp['Data']).dt.date
-        temporal = df_temp.groupby(['Data_Agrupada', 'Status']).size().reset_index(name='Quantidade')
-        
-        fig_temporal = px.line(
-            temporal,
-            x='Data_Agrupada',
-            y='Quantidade',
-            color='Status',
-            markers=True,
-            color_discrete_map={
-                '✅ Conforme': '#00C853',
-                '⚠️ Não Conforme': '#FF6B6B',
-                '❌ Não Conforme': '#FFA726'
-            }
-        )
+        # Itens por dia e status
+        temporal = cubo_resultado.evolucao_temporal(cubo_filtrado).rename(columns={'dia': 'Data_Agrupada'})
         
-        fig_temporal.update_layout(
-            height=350,
-            margin=dict(t=20, b=60, l=20, r=20),
-            xaxis_title="Data",
-            yaxis_title="Quantidade",
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(family="Arial", size=12, color=chart_text_color),
-            hovermode='x unified',
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=-0.4,
-                xanchor="center",
-                x=0.5,
-                font=dict(color=chart_text_color)
-            ),
-            xaxis=dict(
-                tickangle=-45,  # Rotaciona labels
-                tickmode='auto',
-                nticks=10,  # Limita número de ticks
-                tickfont=dict(size=10, color=chart_text_color),
-                title_font=dict(color=chart_text_color),
-                gridcolor=chart_grid_color
-            ),
-            yaxis=dict(
-                tickfont=dict(color=chart_text_color),
-                title_font=dict(color=chart_text_color),
-                gridcolor=chart_grid_color
-            )
-        )
+        fig_temporal = graficos_cache.figura('temporal', figura_temporal, temporal, **tema_graficos)
         
         st.plotly_chart(fig_temporal, use_container_width=True)
     
     with col_chart4:
         st.markdown("#### Top 5 Hospitais (Divergências)")
         
-        df_div = df_filtered[df_filtered['Status'].str.contains('Não Conforme')]
-        if not df_div.empty:
-            # Combina origem e destino
-            hospitais_div = pd.concat([
-                df_div['Unidade Origem'].value_counts(),
-                df_div['Unidade Destino'].value_counts()
-            ]).groupby(level=0).sum().sort_values(ascending=False).head(5)
-            
-            fig_hosp = go.Figure(data=[go.Bar(
-                x=hospitais_div.values,
-                y=hospitais_div.index,
-                orientation='h',
-                marker=dict(
-                    color='#E87722',
-                    line=dict(color='white', width=1)
-                ),
-                text=hospitais_div.values,
-                textposition='outside',
-                textfont=dict(color=chart_text_color),
-                hovertemplate='<b>%{y}</b><br>Divergências: %{x}<extra></extra>'
-            )])
-            
-            # Calcula limite do eixo X com folga
-            max_val_hosp = hospitais_div.values.max()
+        # Combina origem e destino
+        hospitais_div = cubo_resultado.top_unidades(
+            cubo_filtrado, analise_core.STATUS_NAO_CONFORMES, ('Unidade Origem', 'Unidade Destino')
+        )
+        if not hospitais_div.empty:
             
-            fig_hosp.update_layout(
-                height=350,
-                margin=dict(t=20, b=20, l=20, r=50),  # Margem direita aumentada
-                xaxis_title="Quantidade de Divergências",
-                yaxis_title="",
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font=dict(family="Arial", size=12, color=chart_text_color),
-                xaxis=dict(
-                    showgrid=True, 
-                    gridcolor=chart_grid_color, 
-                    title_font=dict(color=chart_text_color), 
-                    tickfont=dict(color=chart_text_color),
-                    range=[0, max_val_hosp * 1.2]  # 20% de folga
-                ),
-                yaxis=dict(showgrid=False, tickfont=dict(color=chart_text_color))
-            )
+            fig_hosp = graficos_cache.figura('hospitais', figura_hospitais, hospitais_div, **tema_graficos)
             
             st.plotly_chart(fig_hosp, use_container_width=True)
         else:
             st.info("Nenhuma divergência por hospital!")
+    tempos.marcar("gráficos temporal/hospitais")
     
     st.divider()
 
     # --- Tabela Detalhada ---
-    st.subheader("Detalhamento dos Dados")
-    
-    st.dataframe(
-        df_filtered,
-        use_container_width=True,
-        column_config={
-            "Data": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
-            "Valor Saída (R$)": st.column_config.NumberColumn("Valor Saída", format="R$ %.2f"),
-            "Valor Entrada (R$)": st.column_config.NumberColumn("Valor Entrada", format="R$ %.2f"),
-            "Diferença (R$)": st.column_config.NumberColumn("Diferença", format="R$ %.2f"),
-            "Status": st.column_config.TextColumn("Status"),
-        },
-        hide_index=True
-    )
-    
-    # Download
-    excel_data = gerar_excel_bytes(df_filtered)
-    st.download_button(
-        label="Baixar Dados Filtrados (Excel)",
-        data=excel_data,
-        file_name="analise_dashboard.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        type="primary"
+    # Download: os arquivos só são gerados no clique e ficam em cache por versão do resultado + filtros
+    chave_download = exportacao.chave_exportacao(
+        st.session_state.resultado_versao,
+        status=sorted(map(str, status_filter)), unidades=sorted(unidade_filter),
+        periodo=[str(d) for d in date_range]
     )
+    tabela_detalhada(df_filtered, chave_download)
+    tempos.fim()
+
+if st.session_state.df_resultado is not None:
+    # CSS para valores divergentes em vermelho (ambos os temas) e ajuste de fonte
+    # (fora do fragmento: é injetado só nas execuções completas)
+    st.markdown("""
+        <style>
+        /* Ajuste de tamanho de fonte para caber 5 colunas */
+        [data-testid="stMetricValue"] {
+            font-size: 22px !important;
+        }
+        
+        /* KPI Não Conformes - texto vermelho - mais específico */
+        div[data-testid="stMetric"]:nth-of-type(3) [data-testid="stMetricValue"],
+        div[data-testid="stMetric"]:nth-of-type(3) [data-testid="stMetricValue"] div,
+        div[data-testid="stMetric"]:nth-of-type(3) [data-testid="stMetricValue"] * {
+            color: #FF4444 !important;
+        }
+        /* KPI Valor Divergente - texto vermelho - mais específico */
+        div[data-testid="stMetric"]:nth-of-type(4) [data-testid="stMetricValue"],
+        div[data-testid="stMetric"]:nth-of-type(4) [data-testid="stMetricValue"] div,
+        div[data-testid="stMetric"]:nth-of-type(4) [data-testid="stMetricValue"] * {
+            color: #FF4444 !important;
+        }
+        /* KPI Divergência Qtd - texto vermelho - mais específico */
+        div[data-testid="stMetric"]:nth-of-type(5) [data-testid="stMetricValue"],
+        div[data-testid="stMetric"]:nth-of-type(5) [data-testid="stMetricValue"] div,
+        div[data-testid="stMetric"]:nth-of-type(5) [data-testid="stMetricValue"] * {
+            color: #FF4444 !important;
+        }
+        </style>
+    """, unsafe_allow_html=True)
+    painel_dashboard()
+
+# --- Tendências do Histórico ---
+# Consulta sobre todas as análises salvas (não só a atual); ver historico_consultas.
+# Fragmento próprio: os controles daqui não reexecutam o painel e vice-versa.
+@st.fragment
+def tendencias_historico():
+    tempos = metricas_analise.TemposRender("tendências")
+    with st.expander("📈 Tendências do Histórico", expanded=False):
+        col_gran, col_dims, col_met = st.columns([1, 2, 1])
+        with col_gran:
+            granularidade = st.selectbox(
+                "Agrupar por", list(historico_consultas.GRANULARIDADES), index=1,
+                format_func={'dia': "Dia", 'semana': "Semana", 'mes': "Mês"}.get
+            )
+        with col_dims:
+            dimensoes_tend = st.multiselect(
+                "Dimensões", historico_consultas.DIMENSOES, default=['Unidade Origem', 'Unidade Destino']
+            )
+        with col_met:
+            metrica_tend = st.selectbox(
+                "Métrica", list(historico_consultas.METRICAS), index=2,
+                format_func=historico_consultas.METRICAS.get
+            )
+        hoje = datetime.now().date()
+        periodo_tend = st.date_input("Período (data dos itens)", value=(hoje - timedelta(days=180), hoje), format="DD/MM/YYYY")
+
+        if isinstance(periodo_tend, (list, tuple)) and len(periodo_tend) == 2:
+            df_tend = historico_consultas.consultar(
+                granularidade, dimensoes_tend, [metrica_tend], periodo_tend[0], periodo_tend[1]
+            )
+
+            if df_tend.empty:
+                st.info("Nenhuma análise do histórico cobre esse período.")
+            else:
+                # Uma série por combinação de dimensões; no gráfico só as 10 maiores
+                if dimensoes_tend:
+                    df_tend['Série'] = df_tend[dimensoes_tend].astype(str).agg(" → ".join, axis=1)
+                    maiores = df_tend.groupby('Série')[metrica_tend].sum().nlargest(10).index
+                    df_graf = df_tend[df_tend['Série'].isin(maiores)]
+                else:
+                    df_graf = df_tend
+                import plotly.express as px
+                fig_tend = px.line(
+                    df_graf, x='periodo', y=metrica_tend,
+                    color='Série' if dimensoes_tend else None, markers=True
+                )
+                fig_tend.update_layout(
+                    height=400,
+                    margin=dict(t=20, b=20, l=20, r=20),
+                    xaxis_title="Período",
+                    yaxis_title=historico_consultas.METRICAS[metrica_tend],
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    hovermode='x unified'
+                )
+                st.plotly_chart(fig_tend, use_container_width=True)
+                st.dataframe(
+                    df_tend.drop(columns=['Série'], errors='ignore'),
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={"periodo": st.column_config.DateColumn("Período", format="DD/MM/YYYY")}
+                )
+    tempos.marcar("consulta e gráfico")
+    tempos.fim()
 
+st.divider()
+tendencias_historico()
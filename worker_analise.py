@@ -0,0 +1,274 @@
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from multiprocessing.connection import Client, Listener
+
+# --- Worker de Análise (Processo Residente) ---
+# Cada execução agendada e cada atualização pedida pelo dashboard pagava a importação
+# de pandas/pyarrow/analise_core e recalculava os componentes dos produtos do zero.
+# Este worker fica rodando em segundo plano com tudo importado e com os caches do
+# analise_core quentes, e recebe os jobs por um socket local (Unix socket; named
+# pipe no Windows) autenticado por uma chave gravada em dados/.
+# Os clientes (analise_3.0, scheduler_service) chamam executar_fluxo: se o worker
+# não estiver no ar, o mesmo trabalho roda no próprio processo, como antes.
+# Uso: python worker_analise.py   (INICIAR_ROBO.bat / serviço do sistema)
+#
+# Protocolo (objetos pickle pela Connection):
+#   cliente -> worker: ('tarefa', nome, args, kwargs)
+#   worker -> cliente: ('log', linha) | ('progresso', p, msg) | ('aguardando', status)
+#                      | ('resultado', valor) | ('erro', tipo, mensagem)
+# Se o cliente desconectar no meio (servidor do Streamlit reiniciado, janela do
+# agendador fechada), o job continua até o fim só com o log no console.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "dados")
+CHAVE_FILE = os.path.join(DATA_DIR, "worker_analise.key")
+if sys.platform == 'win32':
+    ENDERECO, FAMILIA = r'\\.\pipe\analise_worker', 'AF_PIPE'
+else:
+    ENDERECO, FAMILIA = os.path.join(DATA_DIR, "worker_analise.sock"), 'AF_UNIX'
+
+MAX_JOBS = 2  # análises simultâneas; os demais pedidos esperam na fila
+# Fluxo diário incremental (ledger do analise_incremental): só as linhas novas passam pelo
+# matcher. ANALISE_INCREMENTAL=0 no ambiente volta para a análise completa a cada execução.
+INCREMENTAL = os.environ.get("ANALISE_INCREMENTAL", "1").strip().lower() not in ("0", "false", "nao", "não")
+
+class WorkerIndisponivel(Exception):
+    """O worker não está rodando (ou não aceitou a conexão)."""
+
+class ErroWorker(Exception):
+    """A tarefa falhou dentro do worker."""
+
+# --- Cliente ---
+
+def _ler_chave():
+    try:
+        with open(CHAVE_FILE, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def conectar():
+    """Connection autenticada com o worker ou WorkerIndisponivel."""
+    chave = _ler_chave()
+    if not chave or (FAMILIA == 'AF_UNIX' and not os.path.exists(ENDERECO)):
+        raise WorkerIndisponivel("Worker de análise não está rodando")
+    try:
+        return Client(ENDERECO, family=FAMILIA, authkey=chave)
+    except Exception as e:
+        raise WorkerIndisponivel(f"Worker de análise não respondeu: {e}")
+
+def submeter(tarefa, *args, progress_callback=None, ao_aguardar=None, **kwargs):
+    """
+    Roda a tarefa no worker e devolve o retorno dela. As linhas impressas pelo job são
+    repetidas aqui (print), o progresso vai para progress_callback(p, msg) e o status de
+    uma execução de outra sessão para ao_aguardar(status).
+    """
+    conn = conectar()
+    try:
+        conn.send(('tarefa', tarefa, args, kwargs))
+        while True:
+            msg = conn.recv()
+            if msg[0] == 'log':
+                print(msg[1])
+            elif msg[0] == 'progresso':
+                if progress_callback:
+                    progress_callback(msg[1], msg[2])
+            elif msg[0] == 'aguardando':
+                if ao_aguardar:
+                    ao_aguardar(msg[1])
+            elif msg[0] == 'resultado':
+                return msg[1]
+            else:
+                raise ErroWorker(f"{msg[1]}: {msg[2]}")
+    except (EOFError, OSError) as e:
+        raise ErroWorker(f"Conexão com o worker perdida: {e}")
+    finally:
+        conn.close()
+
+def disponivel():
+    """True se o worker está no ar e respondendo."""
+    try:
+        submeter('ping')
+        return True
+    except (WorkerIndisponivel, ErroWorker):
+        return False
+
+def executar_fluxo(baixar_email=True, incremental=False, ao_aguardar=None, progress_callback=None):
+    """execucao_unica.executar_fluxo_unico no worker (ou aqui, se ele não estiver rodando). Retorna (sucesso, executou_aqui)."""
+    try:
+        return submeter(
+            'fluxo_diario', baixar_email=baixar_email, incremental=incremental,
+            ao_aguardar=ao_aguardar, progress_callback=progress_callback
+        )
+    except WorkerIndisponivel:
+        import execucao_unica
+        return execucao_unica.executar_fluxo_unico(
+            baixar_email=baixar_email, incremental=incremental,
+            ao_aguardar=ao_aguardar, progress_callback=progress_callback
+        )
+
+# --- Worker ---
+
+class _SaidaPorThread:
+    """sys.stdout que, além do console, manda o que cada job imprime para o cliente dele."""
+
+    def __init__(self, original):
+        self.original = original
+        self.local = threading.local()
+
+    def write(self, s):
+        self.original.write(s)
+        destino = getattr(self.local, 'destino', None)
+        if destino is not None:
+            try:
+                destino(s)
+            except (OSError, EOFError):
+                # Cliente desconectou: o job segue, com log só no console
+                self.local.destino = None
+        return len(s)
+
+    def flush(self):
+        self.original.flush()
+
+class Worker:
+    def __init__(self, max_jobs=MAX_JOBS):
+        self.vagas = threading.Semaphore(max_jobs)
+        self.iniciado_em = datetime.now()
+        self.jobs_executados = 0
+        self.saida = _SaidaPorThread(sys.stdout)
+        self.tarefas = {
+            'ping': self._ping,
+            'fluxo_diario': self._fluxo_diario,
+        }
+
+    def aquecer(self):
+        """Importa o motor e extrai os componentes dos produtos do último resultado gravado."""
+        inicio = time.perf_counter()
+        import analise_core
+        import execucao_unica  # noqa: F401 (auto_analise, download_gmail, resultado_store)
+        import resultado_store
+        df = None
+        if os.path.exists(resultado_store.RESULT_FILE):
+            try:
+                df = resultado_store.carregar_resultado(colunas=['Produto (Saída)', 'Produto (Entrada)'])
+            except Exception as e:
+                print(f"   ⚠️ Resultado anterior ilegível, cache começa vazio: {e}")
+        if df is not None:
+            for coluna in df.columns:
+                for descricao in df[coluna].dropna().astype(str).unique():
+                    if descricao != '-':
+                        analise_core.componentes_produto(descricao)
+        print(f"🔥 Worker aquecido em {time.perf_counter() - inicio:.1f}s | caches: {analise_core.tamanho_caches()}")
+
+    # Tarefas: recebem (avisar, *args, **kwargs); avisar(msg) manda progresso/status ao cliente
+
+    def _ping(self, avisar):
+        import analise_core
+        return {
+            'pid': os.getpid(), 'iniciado_em': self.iniciado_em.isoformat(),
+            'jobs_executados': self.jobs_executados, 'caches': analise_core.tamanho_caches()
+        }
+
+    def _fluxo_diario(self, avisar, baixar_email=True, incremental=False):
+        import execucao_unica
+        return execucao_unica.executar_fluxo_unico(
+            baixar_email=baixar_email, incremental=incremental,
+            ao_aguardar=lambda status: avisar(('aguardando', status)),
+            progress_callback=lambda p, msg: avisar(('progresso', p, msg))
+        )
+
+    def _atender(self, conn):
+        try:
+            _, nome, args, kwargs = conn.recv()
+        except (EOFError, OSError, ValueError, TypeError):
+            conn.close()
+            return
+        lock_envio = threading.Lock()
+
+        def enviar(msg):
+            with lock_envio:
+                conn.send(msg)
+
+        cliente_ativo = [True]
+        def avisar(msg):
+            if not cliente_ativo[0]:
+                return
+            try:
+                enviar(msg)
+            except (OSError, EOFError):
+                cliente_ativo[0] = False  # cliente desconectou: o job segue sem ele
+
+        buffer = ['']
+        def log(s):
+            buffer[0] += s
+            *linhas, buffer[0] = buffer[0].split("\n")
+            for linha in linhas:
+                enviar(('log', linha))
+
+        try:
+            tarefa = self.tarefas.get(nome)
+            if tarefa is None:
+                raise ValueError(f"Tarefa desconhecida: {nome}")
+            if nome == 'ping':
+                enviar(('resultado', tarefa(avisar)))
+                return
+            with self.vagas:
+                inicio = time.perf_counter()
+                self.saida.local.destino = log
+                try:
+                    resultado = tarefa(avisar, *args, **kwargs)
+                finally:
+                    self.saida.local.destino = None
+                    self.jobs_executados += 1
+                    print(f"   Worker: {nome} em {time.perf_counter() - inicio:.1f}s")
+            enviar(('resultado', resultado))
+        except (EOFError, OSError, BrokenPipeError):
+            print(f"   ⚠️ Worker: cliente desconectou durante '{nome}'")
+        except Exception as e:
+            traceback.print_exc()
+            try:
+                enviar(('erro', type(e).__name__, str(e)))
+            except (EOFError, OSError):
+                pass
+        finally:
+            conn.close()
+
+    def servir(self):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        if disponivel():
+            print("⚠️ Já existe um worker de análise rodando.")
+            return
+        if FAMILIA == 'AF_UNIX' and os.path.exists(ENDERECO):
+            os.remove(ENDERECO)  # socket de um worker que morreu
+        chave = os.urandom(32)
+        tmp = CHAVE_FILE + ".tmp"
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+            f.write(chave)
+        os.replace(tmp, CHAVE_FILE)
+
+        sys.stdout = self.saida
+        self.aquecer()
+        try:
+            with Listener(ENDERECO, family=FAMILIA, authkey=chave) as listener:
+                print(f"🟢 Worker de análise ouvindo em {ENDERECO} (pid {os.getpid()})")
+                while True:
+                    try:
+                        conn = listener.accept()
+                    except Exception as e:  # cliente com chave errada, conexão abortada...
+                        print(f"   ⚠️ Worker: conexão recusada: {e}")
+                        continue
+                    threading.Thread(target=self._atender, args=(conn,), daemon=True, name="worker-job").start()
+        finally:
+            sys.stdout = self.saida.original
+            if os.path.exists(CHAVE_FILE):
+                os.remove(CHAVE_FILE)
+
+if __name__ == "__main__":
+    try:
+        Worker().servir()
+    except KeyboardInterrupt:
+        print("\n🛑 Worker interrompido pelo usuário.")